@@ -0,0 +1,362 @@
+# Python Standard Library imports
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Local Imports
+from ua_scrapers_ref import *
+from ot_benchmark import make_ot_page
+from ot_calendar import BID_CALENDAR
+from ot_scraper_engine import RateScheduler, extract_ot_list, OT_DF_FORMAT, OT_MAX_IN_FLIGHT
+
+# Local stand-in for the CCS open time (and pairing info, reserve availability) pages, to load-test the scraper's concurrency, retries and rate limits
+# without going near CCS. Serves synthetic pages (see ot_benchmark.make_ot_page) per selBase/selEquip/selPos,
+# with injectable latency, error pages and throttling.
+#
+#   python ccs_standin.py --port 8765 --latency 0.5 --error-rate 0.05 --max-rps 2
+#   CCS_BASE_URL=http://127.0.0.1:8765/CCS python -m ot_scraper_engine APR2025 --skey <any 41 characters>
+#
+# or run a load test against a stand-in started in the same process:
+#
+#   python ccs_standin.py --load-test APR2025 --error-rate 0.1 --max-in-flight 8 --rate 5 --max-rate 20
+
+# CONSTANTS
+
+STANDIN_PORT = 8765
+
+# What CCS sends back when something goes wrong, the scraper retries on 'error occurred'
+STANDIN_ERROR_PAGE = ('<html><body><table><tr><td>An error occurred while processing your request.</td></tr>'
+                      '</table></body></html>')
+
+# Page for a plain GET of a form page, with the tokens the session manager harvests
+STANDIN_FORM_PAGE = ('<html><body><form method="post"><input type="hidden" name="__VIEWSTATE" value="{viewstate}">'
+                     '<input type="hidden" name="__VIEWSTATEGENERATOR" value="STANDIN"></form></body></html>')
+
+# Form pages, served on GET and POST
+STANDIN_PAGES = ('/ccs/opentime.aspx', '/ccs/pairinginfo.aspx', '/ccs/upa23.aspx')
+
+# Reverse lookups of the CCS form codes
+_BASE_FOR_CODE = {code: base for base, code in BASES_FOR_OT.items()}
+_EQUIP_FOR_CODE = {code: equip for equip, code in EQUIP_FOR_OT.items()}
+
+
+def make_pi_page(number, date, seed=0):
+    # Synthetic Pairing Info page: a legs table and the pay block, like the pairing details on the open time page
+    rng = random.Random(f'{seed}-{number}-{date}')
+    legs = ''.join(f'<tr><td>{leg + 1}</td><td>{rng.randint(100, 2999)}</td><td>EWR</td><td>ORD</td>'
+                   f'<td>{rng.randint(1, 5)}{rng.randint(0, 59):02d}</td></tr>' for leg in range(rng.randint(2, 8)))
+    dur = lambda low, high: f'{rng.randint(low, high)}{rng.randint(0, 59):02d}'
+    return ('<html><body><form><table><tr><td>Pairing Info</td></tr></table>'
+            f'<table class="legs"><tr><th>Leg</th><th>Flight</th><th>Dep</th><th>Arr</th><th>Block</th></tr>{legs}'
+            '</table><table class="pay"><tr><td>Block</td><td>TAFB</td><td>DHD</td><td>Duty</td><td>Credit</td>'
+            f'<td>Pay Time</td></tr><tr><td>{dur(5, 25)}</td><td>{dur(20, 99)}</td><td></td><td>{dur(8, 40)}</td>'
+            f'<td>{dur(5, 30)}</td><td>{dur(5, 30)}</td></tr></table></form></body></html>')
+
+
+def make_rsv_page(cat, date, seed=0):
+    # Synthetic RSV Availability page for a category and day
+    available = random.Random(f'{seed}-{cat}-{date}').randint(0, 12)
+    return ('<html><body><form><table><tr><td>RSV Availability</td></tr></table>'
+            '<table class="rsv"><tr><th>Date</th><th>Base</th><th>Equipment</th><th>Position</th><th>Available</th>'
+            f'</tr><tr><td>{date}</td><td>{cat[0]}</td><td>{cat[1]}</td><td>{cat[2]}</td><td>{available}</td></tr>'
+            '</table></form></body></html>')
+
+
+class StandinConfig:
+    """Behaviour of the stand-in server
+
+    latency: fixed seconds added to every POST, latency_tail: mean of an extra exponential delay (long tail),
+    error_rate: share of POSTs answered with an error page, max_rps: requests per second served before
+    throttling (0 = unlimited), throttle_status: 200 sends an error page when throttled (like CCS), 503 sends
+    a 503, pairings: (min, max) pairings per category per 30 days, no_records_rate: share of categories with no open time,
+    viewstate_ttl: seconds a __VIEWSTATE stays valid, POSTs with another one get an error page (0 = any is accepted),
+    churn: chance a category's open time changes each time its page is asked for (0 = pages never change)
+    """
+
+    def __init__(self, latency=0.0, latency_tail=0.0, error_rate=0.0, max_rps=0.0, throttle_status=200,
+                 pairings=(0, 200), no_records_rate=0.1, seed=0, viewstate_ttl=0.0, churn=0.0):
+        self.latency = latency
+        self.latency_tail = latency_tail
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self.throttle_status = throttle_status
+        self.pairings = pairings
+        self.no_records_rate = no_records_rate
+        self.seed = seed
+        self.viewstate_ttl = viewstate_ttl
+        self.churn = churn
+
+
+class CCSStandin(ThreadingHTTPServer):
+    """Threaded HTTP server answering like CCS opentime.aspx, under <base_url> = http://host:port/CCS
+    GET /stats returns the request counters as JSON
+    """
+
+    daemon_threads = True
+
+    def __init__(self, config=None, host='127.0.0.1', port=STANDIN_PORT):
+        super().__init__((host, port), _StandinHandler)
+        self.config = config or StandinConfig()
+        self.stats = {'connections': 0, 'get': 0, 'post': 0, 'pages': 0, 'no records': 0, 'errors': 0,
+                      'throttled': 0, 'stale viewstate': 0}
+        self._lock = threading.Lock()
+        self._rng = random.Random(self.config.seed)
+        self._pages = {}
+        self._versions = {}  # Category -> how many times its open time changed (churn)
+        # Token bucket for throttling
+        self._tokens = max(1.0, self.config.max_rps)
+        self._last_refill = time.monotonic()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/CCS'
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def throttled(self):
+        # Takes a token if there is one, True if the request is over the rate limit
+        if not self.config.max_rps:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            burst = max(1.0, self.config.max_rps)
+            self._tokens = min(burst, self._tokens + (now - self._last_refill) * self.config.max_rps)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return False
+            return True
+
+    def viewstate(self):
+        # The __VIEWSTATE handed out right now, a new one every viewstate_ttl seconds
+        if not self.config.viewstate_ttl:
+            return 'standin'
+        return f'standin-{int(time.time() / self.config.viewstate_ttl)}'
+
+    def roll(self):
+        # Shared random draw for latency and error injection
+        with self._lock:
+            return self._rng.random(), self._rng.expovariate(1.0)
+
+    def page(self, base, equip, pos, start, end, per_page=499):
+        # Same page for the same category and dates, generated once. A category has a fixed density of pairings
+        # (pairings per 30 days), so shorter date ranges list fewer of them, and no more than per_page are shown
+        with self._lock:
+            version = self._versions.get((base, equip, pos), 0)
+            if self.config.churn and self._rng.random() < self.config.churn:
+                version = self._versions[(base, equip, pos)] = version + 1
+            key = (base, equip, pos, start, end, per_page, version)
+            raw_html = self._pages.get(key)
+        if raw_html is None:
+            rng = random.Random(f'{self.config.seed}-{base}{equip}{pos}')
+            n = 0 if rng.random() < self.config.no_records_rate else rng.randint(*self.config.pairings)
+            first, last = (datetime.strptime(d, '%d%m%y').date() for d in (start, end))
+            n = min(per_page, round(n * ((last - first).days + 1) / 30))
+            seed = random.Random(f'{self.config.seed}-{base}{equip}{pos}-{start}-{end}-{version}').randrange(2**32)
+            raw_html = make_ot_page(n, (start, end), seed=seed)
+            with self._lock:
+                self._pages[key] = raw_html
+        return raw_html
+
+
+class _StandinHandler(BaseHTTPRequestHandler):
+
+    # Keep-alive, like CCS: a client can send all its requests over a few connections
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.count('connections')
+
+    def log_message(self, format, *args):
+        # Keep the console quiet
+        pass
+
+    def _send(self, status, body, content_type='text/html; charset=utf-8'):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/stats':
+            with self.server._lock:
+                stats = dict(self.server.stats)
+            self._send(200, json.dumps(stats), 'application/json')
+        elif path.lower() in STANDIN_PAGES:
+            self.server.count('get')
+            self._send(200, STANDIN_FORM_PAGE.format(viewstate=self.server.viewstate()))
+        else:
+            self._send(404, 'Not found')
+
+    def do_POST(self):
+        server = self.server
+        config = server.config
+        path = urlsplit(self.path).path.lower()
+        if path not in STANDIN_PAGES:
+            self._send(404, 'Not found')
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+        server.count('post')
+
+        if server.throttled():
+            server.count('throttled')
+            if config.throttle_status == 503:
+                self._send(503, 'Service Unavailable')
+            else:
+                self._send(200, STANDIN_ERROR_PAGE)
+            return
+
+        error_draw, tail_draw = server.roll()
+        time.sleep(config.latency + config.latency_tail * tail_draw)
+
+        if error_draw < config.error_rate:
+            server.count('errors')
+            self._send(200, STANDIN_ERROR_PAGE)
+            return
+
+        if config.viewstate_ttl and form.get('__VIEWSTATE') != server.viewstate():
+            server.count('stale viewstate')
+            self._send(200, STANDIN_ERROR_PAGE)
+            return
+
+        if path == '/ccs/pairinginfo.aspx':
+            server.count('pages')
+            self._send(200, make_pi_page(form.get('ctl01$mHolder$txtPairingNumber'),
+                                         form.get('ctl01$mHolder$txtDate'), config.seed))
+            return
+
+        if path == '/ccs/upa23.aspx':
+            server.count('pages')
+            cat = (form.get('BaseCombo1'), form.get('EquipmentCombo1'), form.get('PositionCombo1'))
+            self._send(200, make_rsv_page(cat, form.get('ctl01$mHolder$txtDate'), config.seed))
+            return
+
+        try:
+            base = _BASE_FOR_CODE[form['selBase']]
+            equip = _EQUIP_FOR_CODE[form['selEquip']]
+            raw_html = server.page(base, equip, form['selPos'], form['txtStartDate'], form['txtEndDate'],
+                                   int(form.get('txtNumPerPage', 499)))
+        except (KeyError, ValueError):
+            server.count('errors')
+            self._send(200, STANDIN_ERROR_PAGE)
+            return
+
+        server.count('no records' if 'No Records' in raw_html else 'pages')
+        self._send(200, raw_html)
+
+
+def start_standin(config=None, host='127.0.0.1', port=0):
+    # Starts a stand-in server on a background thread (port 0 picks a free one), call shutdown() when done
+    server = CCSStandin(config, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def load_test(base_url, cats, bid_month, max_in_flight=OT_MAX_IN_FLIGHT, scheduler=None, skey='standin'):
+    """Scrapes cats from base_url the way iter_ot_lists does, timing every category
+    Returns throughput, outcome counts, category latency percentiles (seconds, including rate waits, backoff and
+    retries) and where the scheduler's rate ended up
+    """
+    scheduler = scheduler or RateScheduler()
+
+    def timed(cat):
+        start = time.perf_counter()
+        ot = extract_ot_list(skey, cat, bid_month, scheduler, base_url=base_url)
+        return time.perf_counter() - start, ot
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+        results = list(pool.map(timed, cats))
+    elapsed = time.perf_counter() - start
+
+    latencies = [r[0] for r in results]
+    frames = [r[1] for r in results]
+    errors = sum(1 for ot in frames if ot.empty and not set(OT_DF_FORMAT).issubset(ot.columns))
+    rows = sum(len(ot) for ot in frames)
+    sched = scheduler.snapshot()
+    return {
+        'categories': len(cats),
+        'rows': rows,
+        'errors': errors,
+        'seconds': elapsed,
+        'categories/min': len(cats) / elapsed * 60,
+        'rows/s': rows / elapsed,
+        'latency p50': statistics.median(latencies),
+        'latency p95': _percentile(latencies, 95),
+        'latency p99': _percentile(latencies, 99),
+        'latency max': max(latencies),
+        'outcomes': sched['outcomes'],
+        'requests': sched['requests'],
+        'final rate': sched['rate'],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the CCS open time page')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=STANDIN_PORT)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every page')
+    parser.add_argument('--latency-tail', type=float, default=0.0, help='Mean of an extra exponential delay')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with an error page')
+    parser.add_argument('--max-rps', type=float, default=0.0, help='Requests per second before throttling (0 = off)')
+    parser.add_argument('--throttle-status', type=int, default=200, choices=(200, 503),
+                        help='200 answers throttled requests with an error page, 503 with a 503')
+    parser.add_argument('--pairings', type=int, nargs=2, default=(0, 200), metavar=('MIN', 'MAX'),
+                        help='Pairings per category')
+    parser.add_argument('--no-records-rate', type=float, default=0.1, help='Share of categories with no open time')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--viewstate-ttl', type=float, default=0.0,
+                        help='Seconds a __VIEWSTATE stays valid, stale ones get an error page (0 = off)')
+    parser.add_argument('--churn', type=float, default=0.0,
+                        help="Chance a category's open time changes each time it is asked for (for ot_watch)")
+    parser.add_argument('--load-test', metavar='BID_MONTH', choices=BID_CALENDAR.names(),
+                        help='Start the stand-in in process and scrape every category of BID_MONTH against it')
+    parser.add_argument('--max-in-flight', type=int, default=OT_MAX_IN_FLIGHT, help='Load test: categories at once')
+    parser.add_argument('--rate', type=float, help='Load test: requests per second to start at')
+    parser.add_argument('--max-rate', type=float, help='Load test: requests per second the rate can adapt up to')
+    args = parser.parse_args()
+
+    config = StandinConfig(args.latency, args.latency_tail, args.error_rate, args.max_rps, args.throttle_status,
+                           tuple(args.pairings), args.no_records_rate, args.seed, args.viewstate_ttl,
+                           args.churn)
+
+    if args.load_test:
+        server = start_standin(config, args.host, 0)
+        scheduler = RateScheduler()
+        if args.max_rate is not None:
+            scheduler.max_rate = args.max_rate
+        if args.rate is not None:
+            scheduler.rate = min(args.rate, scheduler.max_rate)
+        try:
+            report = load_test(server.base_url, ALL_CATS, args.load_test, args.max_in_flight, scheduler)
+        finally:
+            server.shutdown()
+        report['server'] = server.stats
+        print(json.dumps(report, indent=2))
+    else:
+        server = CCSStandin(config, args.host, args.port)
+        print(f'CCS stand-in serving on {server.base_url}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
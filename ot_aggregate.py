@@ -0,0 +1,56 @@
+# Third Party Imports
+import numpy as np
+import pandas as pd
+
+# Local Imports
+from ot_durations import mins_to_durs
+
+# Rolls the open time list up into a cube of trip counts and pay minutes, so every view (totals
+# table, charts, scripts) reads a slice of one precomputed aggregate instead of regrouping trips.
+
+# CONSTANTS
+
+# Dimensions of the cube, in index order. Base/Fleet/Seat are the parts of an ALL_CATS tuple
+CUBE_DIMS = ['Base', 'Fleet', 'Seat', 'Category', 'Pairing Date', 'Days']
+
+# Measures kept for every cell
+CUBE_MEASURES = ['Trip Count', 'Pay Minutes']
+
+# Category strings are base (3) + fleet (3) + seat (2), e.g. EWR737FO
+_CAT_PARTS = {'Base': slice(0, 3), 'Fleet': slice(3, 6), 'Seat': slice(6, None)}
+
+
+def build_ot_cube(ot):
+    """Takes a DataFrame of OT (with pay minutes, full or compact schema) and returns the cube: one row per populated
+    (Base, Fleet, Seat, Category, Pairing Date, Days) cell with Trip Count and Pay Minutes, computed in one groupby
+    """
+    if ot.empty:
+        index = pd.MultiIndex.from_arrays([[]] * len(CUBE_DIMS), names=CUBE_DIMS)
+        return pd.DataFrame({m: pd.Series(dtype='int64') for m in CUBE_MEASURES}, index=index)
+
+    # Split categories once per distinct category rather than once per trip
+    cats = ot['Category'].astype('category')
+    codes = cats.cat.codes.to_numpy()
+    keys = {dim: pd.Series(np.asarray(cats.cat.categories.str[part], dtype=object)[codes], index=ot.index)
+            for dim, part in _CAT_PARTS.items()}
+    keys['Category'] = ot['Category']
+    keys['Pairing Date'] = ot['Pairing Date']
+    keys['Days'] = ot['Days']
+
+    cube = ot['Pay Minutes'].groupby([keys[d].rename(d) for d in CUBE_DIMS], sort=True,
+                                     observed=True).agg(['size', 'sum'])
+    cube.columns = CUBE_MEASURES
+    return cube.astype('int64')
+
+
+def rollup(cube, by=None):
+    """Sums the cube over every dimension not in by (a dimension name or list of them)
+    With by=None returns the grand total as a one row DataFrame.
+    Adds a Total Credit (h:mm) column next to the measures
+    """
+    if by is None:
+        totals = cube.sum().to_frame('Total').T
+    else:
+        totals = cube.groupby(level=by, sort=True, observed=True).sum()
+    totals.insert(1, 'Total Credit', mins_to_durs(totals['Pay Minutes']).to_numpy())
+    return totals
@@ -0,0 +1,266 @@
+# Python Standard Library imports
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Third Party Imports
+import numpy as np
+import pandas as pd
+
+# Local Imports
+from ot_scraper_engine import *
+
+# Offline benchmarks for the open time scraper. Pages are synthetic opentime.aspx responses with the layout
+# the parsers expect, so nothing here goes to CCS. Run: python ot_benchmark.py [--json results.json]
+
+# CONSTANTS
+
+# Seed for every random choice, so each run benchmarks the same pages and values
+BENCH_SEED = 1234
+
+# Bid month the synthetic pages are generated for
+BENCH_BID_MONTH = 'APR2025'
+
+# Pairing counts parsed per page (up to the 499 per page limit)
+BENCH_PAGE_SIZES = (50, 200, 499)
+
+# Share of pairings with deadhead pay
+BENCH_DHD_RATIO = 0.3
+
+# Values per duration conversion run
+BENCH_DURATION_VALUES = 100_000
+
+# HELPER FUNCTIONS
+
+
+def _ccs_dur(rng, low_hours, high_hours):
+    # Random duration in CCS HHHMM format
+    return f'{rng.randint(low_hours, high_hours)}{rng.randint(0, 59):02d}'
+
+
+def _filler_tables():
+    # The 9 tables CCS puts ahead of the pairing list (menus, search criteria, empty clipboard)
+    tables = [
+        '<table><tr><td><a href="Main.aspx">Main</a></td><td><a href="Logoff2.aspx">Log Off</a></td></tr></table>',
+        '<table><tr><td>Trip Shopping</td></tr></table>',
+        '<table><tr><td>Start Date</td><td><input name="txtStartDate"></td></tr>'
+        '<tr><td>End Date</td><td><input name="txtEndDate"></td></tr></table>',
+        '<table><tr><td>Base</td><td><select name="selBase"></select></td></tr></table>',
+        '<table><tr><td>Equipment</td><td><select name="selEquip"></select></td></tr></table>',
+        '<table><tr><td>Position</td><td><select name="selPos"></select></td></tr></table>',
+        '<table><tr><td>Sort</td><td><select name="selSort"></select></td></tr></table>',
+        '<table><tr><th>myPairings</th></tr><tr><td>Clipboard is empty</td></tr></table>',
+        '<table><tr><td>Page 1 of 1</td></tr></table>',
+    ]
+    return tables
+
+
+def make_ot_page(n_pairings, date_range=BID_CALENDAR.ddmmyy(BENCH_BID_MONTH), dhd_ratio=BENCH_DHD_RATIO,
+                 seed=BENCH_SEED):
+    """Returns a synthetic opentime.aspx response with n_pairings open pairings starting in date_range (DDMMYY dates)
+    Same layout extract_ot_list expects: 9 leading tables, the pairing list as the 10th table, then one
+    detail table per pairing with a nested pay block (deadhead pay on dhd_ratio of them)
+    """
+    if n_pairings == 0:
+        return '<html><body><table><tr><td>No Records Found</td></tr></table></body></html>'
+
+    rng = random.Random(seed)
+    start, end = (datetime.strptime(d, '%d%m%y').date() for d in date_range)
+    month_days = (end - start).days + 1
+
+    parts = ['<html><head><title>Open Time</title></head><body><form>']
+    parts.extend(_filler_tables())
+
+    pairings = []
+    for i in range(n_pairings):
+        day = start + timedelta(days=rng.randrange(month_days))
+        pairings.append((f'{rng.randint(1000, 9999)}', day.strftime('%d%m%y'), rng.randint(1, 5)))
+
+    # Pairing list
+    parts.append('<table class="pairings"><tr><td>Select</td><td>Pairing Number</td><td>Pairing Date</td>'
+                 '<td>Days</td><td>Report</td><td>Release</td></tr>')
+    for number, date, days in pairings:
+        parts.append(f'<tr><td><input type="checkbox"></td><td>{number}</td><td>{date}</td><td>{days}</td>'
+                     f'<td>{rng.randint(4, 20):02d}{rng.randint(0, 59):02d}</td>'
+                     f'<td>{rng.randint(4, 23):02d}{rng.randint(0, 59):02d}</td></tr>')
+    parts.append('</table>')
+
+    # Pairing details, each with its pay block
+    for number, date, days in pairings:
+        dhd = _ccs_dur(rng, 0, 6) if rng.random() < dhd_ratio else ''
+        parts.append(f'<table class="detail"><tr><td>{number} {date}</td></tr>')
+        for leg in range(days * 2):
+            parts.append(f'<tr><td>{leg + 1}</td><td>{rng.randint(100, 2999)}</td><td>EWR</td><td>ORD</td>'
+                         f'<td>{_ccs_dur(rng, 1, 5)}</td></tr>')
+        parts.append('<tr><td><table class="pay"><tr><td>Block</td><td>TAFB</td><td>DHD</td><td>Duty</td>'
+                     '<td>Credit</td><td>Pay Time</td></tr>'
+                     f'<tr><td>{_ccs_dur(rng, 5, 25)}</td><td>{_ccs_dur(rng, 20, 99)}</td><td>{dhd}</td>'
+                     f'<td>{_ccs_dur(rng, 8, 40)}</td><td>{_ccs_dur(rng, 5, 30)}</td>'
+                     f'<td>{_ccs_dur(rng, 5, 30)}</td></tr></table></td></tr></table>')
+
+    parts.append('</form></body></html>')
+    return ''.join(parts)
+
+
+def make_ot_frame(n_trips, seed=BENCH_SEED):
+    # Synthetic open time list spread over every category in ALL_CATS
+    rng = np.random.default_rng(seed)
+    start = BID_CALENDAR.dates(BENCH_BID_MONTH)[0]
+    cats = np.array([f'{b}{e}{s}' for b, e, s in ALL_CATS])
+    dates = pd.Series(np.datetime64(start) + rng.integers(0, 30, n_trips).astype('timedelta64[D]'))
+    days = rng.integers(1, 6, n_trips)
+    pay = rng.integers(300, 2400, n_trips)
+    ot = pd.DataFrame({
+        'Pairing Number': rng.integers(1000, 9999, n_trips).astype(str),
+        'Category': cats[rng.integers(0, len(cats), n_trips)],
+        'Pairing Date': dates.dt.date,
+        'Pairing End Date': end_dates(dates, days).dt.date,
+        'Days': days,
+        'Pay Time': mins_to_durs(pay),
+        'Pay Minutes': pay,
+    })
+    return ot[OT_DF_FORMAT]
+
+
+def time_it(func, repeat, number=1):
+    """Runs func number times per sample, repeat samples after one warm-up call
+    Returns per-call seconds: median, min and max of the samples
+    """
+    func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return {'median': statistics.median(samples), 'min': min(samples), 'max': max(samples)}
+
+# BENCHMARKS
+
+
+def bench_parsing(repeat):
+    results = {}
+    cat = ALL_CATS[0]
+    for n in BENCH_PAGE_SIZES:
+        raw_html = make_ot_page(n)
+        results[f'parse lxml {n} pairings'] = time_it(lambda: parse_ot_html(raw_html, cat), repeat)
+        results[f'parse read_html {n} pairings'] = time_it(lambda: parse_ot_html_read_html(raw_html, cat), repeat)
+    return results
+
+
+def bench_durations(repeat):
+    rng = random.Random(BENCH_SEED)
+    ccs = pd.Series([_ccs_dur(rng, 0, 40) for _ in range(BENCH_DURATION_VALUES)])
+    mins, _ = ccs_to_mins(ccs)
+    dates = pd.Series([f'{rng.randint(1, 28):02d}0425' for _ in range(BENCH_DURATION_VALUES)])
+    days = pd.Series(rng.choices(range(1, 6), k=BENCH_DURATION_VALUES))
+
+    n = BENCH_DURATION_VALUES
+    return {
+        f'ccs_to_mins {n} values': time_it(lambda: ccs_to_mins(ccs), repeat),
+        f'scalar str_to_dur+dur_to_mins {n} values': time_it(
+            lambda: [dur_to_mins(str_to_dur(v)) for v in ccs], repeat),
+        f'mins_to_durs {n} values': time_it(lambda: mins_to_durs(mins), repeat),
+        f'scalar mins_to_dur {n} values': time_it(lambda: [mins_to_dur(m) for m in mins], repeat),
+        f'ddmmyy_to_dates + end_dates {n} values': time_it(
+            lambda: end_dates(ddmmyy_to_dates(dates)[0], days), repeat),
+    }
+
+
+def bench_totals(repeat):
+    ot = make_ot_frame(50_000)
+    compact = compact_ot(ot)
+    return {'calculate_ot_totals 50000 trips': time_it(lambda: calculate_ot_totals(ot), repeat),
+            'calculate_ot_totals 50000 trips (compact)': time_it(lambda: calculate_ot_totals(compact), repeat)}
+
+
+def bench_scrape(repeat, pairings_per_cat=200):
+    """End-to-end path of process_ot (without the Streamlit rendering): every category in ALL_CATS fetched
+    through extract_ot_lists from a replay-only cache of synthetic pages, concatenated and totalled
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = HtmlCache(cache_dir, replay_only=True)
+        dates = BID_CALENDAR.ddmmyy(BENCH_BID_MONTH)
+        for i, cat in enumerate(ALL_CATS):
+            cache.put(cat, dates, ot_payload(cat, dates), make_ot_page(pairings_per_cat, seed=BENCH_SEED + i))
+
+        def scrape():
+            ot = concat_ot(extract_ot_lists('', ALL_CATS, BENCH_BID_MONTH, cache=cache).values())
+            calculate_ot_totals(ot)
+
+        results[f'scrape {len(ALL_CATS)} categories x {pairings_per_cat} pairings (replay)'] = time_it(scrape, repeat)
+
+        # Same replay with parsing in worker processes (started before timing, as a long run would)
+        with ParsePool() as parse_pool:
+            def scrape_pipelined():
+                ot = concat_ot(extract_ot_lists('', ALL_CATS, BENCH_BID_MONTH, cache=cache,
+                                                parse_pool=parse_pool).values())
+                calculate_ot_totals(ot)
+
+            scrape_pipelined()
+            results[f'scrape {len(ALL_CATS)} categories x {pairings_per_cat} pairings (replay, '
+                    f'{parse_pool.workers} parse processes)'] = time_it(scrape_pipelined, repeat)
+    return results
+
+
+BENCHMARKS = {
+    'parse': bench_parsing,
+    'durations': bench_durations,
+    'totals': bench_totals,
+    'scrape': bench_scrape,
+}
+
+
+def run_benchmarks(names=None, repeat=5):
+    # Returns {benchmark: {median, min, max}} for the selected groups (all by default)
+    results = {}
+    for name in names or BENCHMARKS:
+        # Keep any stray prints out of the timings' output
+        with contextlib.redirect_stdout(io.StringIO()):
+            results.update(BENCHMARKS[name](repeat))
+    return results
+
+
+def format_results(results, baseline=None):
+    # Table of median/min per benchmark, with the change against a baseline run if given
+    width = max(len(name) for name in results)
+    lines = [f'{"benchmark":<{width}}  {"median ms":>10}  {"min ms":>10}' + ('  vs baseline' if baseline else '')]
+    for name, r in results.items():
+        line = f'{name:<{width}}  {r["median"] * 1000:>10.2f}  {r["min"] * 1000:>10.2f}'
+        if baseline and name in baseline:
+            line += f'  {baseline[name]["median"] / r["median"]:>6.2f}x'
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the open time scraper')
+    parser.add_argument('groups', nargs='*', metavar='GROUP',
+                        help=f'Benchmark groups: {", ".join(BENCHMARKS)} (default all)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed samples per benchmark')
+    parser.add_argument('--json', help='Save the results to this file')
+    parser.add_argument('--baseline', help='Results file of an earlier run to compare against')
+    args = parser.parse_args()
+    if unknown := set(args.groups) - set(BENCHMARKS):
+        parser.error(f'Unknown benchmark groups: {", ".join(sorted(unknown))}')
+
+    results = run_benchmarks(args.groups, args.repeat)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    print(format_results(results, baseline))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': platform.python_version(), 'pandas': pd.__version__,
+                       'repeat': args.repeat, 'results': results}, f, indent=2)
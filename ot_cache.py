@@ -0,0 +1,92 @@
+# Python Standard Library imports
+import gzip
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+# CONSTANTS
+
+# Where raw CCS responses are kept, and how long (seconds) they stay fresh
+OT_CACHE_DIR = Path('.ot_cache')
+OT_CACHE_TTL = 15 * 60
+
+# Payload fields that change from session to session without changing the page asked for
+VOLATILE_PAYLOAD_KEYS = ('__VIEWSTATE', '__VIEWSTATEGENERATOR', '__EVENTVALIDATION')
+
+
+class CacheMissError(LookupError):
+    """Raised in replay only mode when a page isn't in the cache"""
+
+
+def payload_hash(payload):
+    # Stable hash of a request payload, leaving out the volatile ASP.NET tokens
+    stable = {k: v for k, v in payload.items() if k not in VOLATILE_PAYLOAD_KEYS}
+    return hashlib.sha256(json.dumps(stable, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class HtmlCache:
+    """On-disk cache of raw CCS responses, gzip compressed.
+
+    Entries are keyed by (category tuple, (start, end) date range, request payload hash) and laid out as
+    <cache_dir>/<category>/<start>-<end>-<hash>.html.gz (other pages use their own key tuple in place of the category), so the cache doubles as a corpus of pages to re-parse.
+    Entries older than ttl seconds are ignored (ttl=None keeps them forever).
+    In replay only mode the cache never lets a request through: every entry is served regardless of age,
+    and a miss raises CacheMissError.
+    """
+
+    def __init__(self, cache_dir=OT_CACHE_DIR, ttl=OT_CACHE_TTL, replay_only=False):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.replay_only = replay_only
+
+    def path(self, cat, date_range, payload):
+        # File an entry lives in
+        category = ''.join(str(c) for c in cat)
+        name = f'{date_range[0]}-{date_range[1]}-{payload_hash(payload)[:16]}.html.gz'
+        return self.cache_dir / category / name
+
+    def _fresh(self, path):
+        if self.replay_only or self.ttl is None:
+            return True
+        return (time.time() - path.stat().st_mtime) <= self.ttl
+
+    def has(self, cat, date_range, payload):
+        path = self.path(cat, date_range, payload)
+        return path.exists() and self._fresh(path)
+
+    def get(self, cat, date_range, payload):
+        # Returns the cached html, or None if there is no fresh entry
+        path = self.path(cat, date_range, payload)
+        try:
+            if not self._fresh(path):
+                return None
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                return f.read()
+        except (OSError, EOFError):
+            # Missing or truncated entry
+            return None
+
+    def lookup(self, cat, date_range, payload):
+        # The one read to decide whether a page is fetched: the cached html, or None to fetch it. In replay only
+        # mode a miss raises CacheMissError instead. has() then get() can disagree if the entry goes stale between
+        # them, so callers take pacing and session from this single result
+        raw_html = self.get(cat, date_range, payload)
+        if raw_html is None and self.replay_only:
+            raise CacheMissError(f"{''.join(str(c) for c in cat)} {date_range[0]}-{date_range[1]} is not in the cache")
+        return raw_html
+
+    def put(self, cat, date_range, payload, raw_html):
+        path = self.path(cat, date_range, payload)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file then swap it in, so concurrent readers never see half an entry
+        tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            f.write(raw_html)
+        os.replace(tmp, path)
+
+    def clear(self):
+        # Removes every entry
+        for path in self.cache_dir.glob('*/*.html.gz'):
+            path.unlink(missing_ok=True)
@@ -0,0 +1,144 @@
+# Python Standard Library imports
+from datetime import date, datetime, timedelta
+
+# Third Party Imports
+import numpy as np
+import pandas as pd
+
+# Local Imports
+from ua_scrapers_ref import BID_MONTHS
+
+# Bid month calendar. Boundaries are generated from a start-day rule per month instead of being typed in, with
+# BID_MONTHS (or any other dict of DDMMYY tuples) applied on top as overrides. The months are kept as sorted
+# start/end arrays (and a pandas IntervalIndex), so a whole column of dates maps to bid months in one searchsorted.
+
+# CONSTANTS
+
+# Start of each bid month as (months relative to the calendar month it is named for, day). A month ends the day
+# before the next one starts, so February takes the leap day. Taken from the BID_MONTHS dates and the bid periods
+# listed in the CCS payloads (JUL2024-DEC2024). MAY and JUN are inferred from the days left between APR and JUL:
+# check them against CCS and add overrides if they differ
+BID_MONTH_RULES = {
+    1: (-1, 30),   # JAN: Dec 30
+    2: (-1, 30),   # FEB: Jan 30
+    3: (0, 2),     # MAR: Mar 2
+    4: (0, 1),     # APR: Apr 1
+    5: (0, 1),     # MAY: May 1 (inferred)
+    6: (-1, 31),   # JUN: May 31 (inferred)
+    7: (-1, 30),   # JUL: Jun 30
+    8: (-1, 30),   # AUG: Jul 30
+    9: (-1, 29),   # SEP: Aug 29
+    10: (-1, 29),  # OCT: Sep 29
+    11: (-1, 30),  # NOV: Oct 30
+    12: (-1, 30),  # DEC: Nov 30
+}
+
+BID_MONTH_NAMES = ('JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC')
+
+# Years the default calendar covers: from the first override through next year
+CALENDAR_YEARS_AHEAD = 1
+
+# HELPER FUNCTIONS
+
+
+def _month_start(year, month, rules):
+    # First day of bid month (year, month) under the rules
+    delta, day = rules[month]
+    y, m = divmod(year * 12 + month - 1 + delta, 12)
+    return date(y, m + 1, day)
+
+
+def bid_month_name(year, month):
+    return f'{BID_MONTH_NAMES[month - 1]}{year}'
+
+
+def _parse_name(name):
+    # 'APR2025' -> (2025, 4)
+    return int(name[3:]), BID_MONTH_NAMES.index(name[:3]) + 1
+
+
+class BidCalendar:
+    """Bid months from first_year through last_year, generated from rules with overrides on top
+
+    overrides: {name: (start, end)} in DDMMYY (like BID_MONTHS). Overrides replace the generated month of the same
+    name, and may add months outside the generated years
+    """
+
+    def __init__(self, first_year, last_year, rules=BID_MONTH_RULES, overrides=None):
+        months = {}
+        for year in range(first_year, last_year + 1):
+            for month in range(1, 13):
+                start = _month_start(year, month, rules)
+                end = _month_start(year + month // 12, month % 12 + 1, rules) - timedelta(days=1)
+                months[bid_month_name(year, month)] = (start, end)
+        for name, (start, end) in (overrides or {}).items():
+            months[name] = (datetime.strptime(start, '%d%m%y').date(), datetime.strptime(end, '%d%m%y').date())
+
+        ordered = sorted(months.items(), key=lambda m: m[1][0])
+        self._names = np.array([name for name, _ in ordered], dtype=object)
+        self._starts = np.array([start for _, (start, _) in ordered], dtype='datetime64[D]')
+        self._ends = np.array([end for _, (_, end) in ordered], dtype='datetime64[D]')
+        if (self._starts[1:] <= self._ends[:-1]).any():
+            raise ValueError('Bid months overlap, check the rules and overrides')
+        self._months = dict(months)
+        self.index = pd.IntervalIndex.from_arrays(pd.to_datetime(self._starts), pd.to_datetime(self._ends),
+                                                  closed='both', name='Bid Month')
+
+    def __contains__(self, name):
+        return name in self._months
+
+    def __len__(self):
+        return len(self._names)
+
+    def names(self, start=None, end=None):
+        """Bid month names in date order, optionally only those that end on or after start and begin on or
+        before end (datetime.date)
+        """
+        keep = np.ones(len(self._names), dtype=bool)
+        if start is not None:
+            keep &= self._ends >= np.datetime64(start, 'D')
+        if end is not None:
+            keep &= self._starts <= np.datetime64(end, 'D')
+        return list(self._names[keep])
+
+    def upcoming(self, today=None, count=3):
+        # The current bid month and the count - 1 after it
+        today = today or date.today()
+        return self.names(start=today)[:count]
+
+    def dates(self, name):
+        # (start, end) of a bid month as datetime.date, KeyError if the calendar doesn't have it
+        return self._months[name]
+
+    def ddmmyy(self, name):
+        # (start, end) of a bid month in CCS DDMMYY format, like a BID_MONTHS entry
+        return tuple(d.strftime('%d%m%y') for d in self.dates(name))
+
+    def days(self, name):
+        # Every day of a bid month, as datetime.date
+        start, end = self.dates(name)
+        return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+    def bid_month_of(self, dates):
+        """Bid month name of every date in dates (datetime.date objects, datetime64 or date strings) in one
+        vectorized lookup. Returns a Series of names, None where a date is outside the calendar
+        """
+        days = pd.to_datetime(pd.Series(dates, copy=False)).to_numpy(dtype='datetime64[D]')
+        i = np.searchsorted(self._starts, days, side='right') - 1
+        found = (i >= 0) & (days <= self._ends[np.clip(i, 0, None)])
+        names = np.where(found, self._names[np.clip(i, 0, None)], None)
+        index = dates.index if isinstance(dates, pd.Series) else None
+        return pd.Series(names, index=index, dtype=object, name='Bid Month')
+
+    def bid_month(self, d):
+        # Bid month of a single date, None if outside the calendar
+        return self.bid_month_of([d]).iloc[0]
+
+
+def default_calendar(overrides=BID_MONTHS, years_ahead=CALENDAR_YEARS_AHEAD):
+    # Calendar from the first override's year through years_ahead after this year
+    first = min([_parse_name(name)[0] for name in overrides] or [date.today().year])
+    return BidCalendar(first, max(first, date.today().year + years_ahead), overrides=overrides)
+
+
+BID_CALENDAR = default_calendar()
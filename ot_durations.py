@@ -0,0 +1,162 @@
+# Third Party Imports
+import numpy as np
+import pandas as pd
+
+# Conversions between CCS time/date formats and what we keep in the open time dataframe.
+# The scalar helpers work on one value (Streamlit calculator), the vectorized ones on whole
+# Series/arrays (scraping). Vectorized conversions return (values, invalid) where invalid is a
+# boolean Series marking values that couldn't be converted, nothing is printed.
+
+# Our durations are h:mm
+_DUR_RE = r'\d+:[0-5]\d'
+
+# SCALAR HELPERS
+
+
+def mins_to_dur(mins):
+    # Takes an int number of minutes and returns a duration string
+    try:
+        h = int(mins / 60)
+        m = int(mins % 60)
+    except:
+        print(f'Error with minutes format: {mins}')
+        return 'err'
+
+    h = str(h)
+    m = str(m)
+    if len(m) == 1:
+        # Single digit, append a 0
+        m = f'0{m}'
+    return (f'{h}:{m}')
+
+
+def dur_to_mins(d):
+    # Takes a time in hhh:mm format and returns the number of minutes
+    # Returns -1 if there was an error
+    d = d.replace(',', '') # Remove commas
+    try:
+        s = str.split(d, sep=':')
+        # Error checking for correct number after split (should be 2)
+        if len(s) != 2:
+            print(f'Error with duration format: {d}')
+            return -1
+        # Hours can be 1 or more digits, but mins has to be 2
+        if len(s[1]) != 2:
+            print(f'Error with duration format: {d}')
+            return -1
+
+        # These will throw an exception if they don't convert to int
+        h = int(s[0])
+        m = int(s[1])
+
+        # Minutes should be 0 to 59
+        if (m > 59):
+            print(f'Error with minutes format: {m}')
+            return -1
+    except:
+        print(f'Format error with {d}')
+        return -1
+
+    return m + (60*h)
+
+
+def str_to_dur(s):
+    # Takes a string s and returns it in hhh:mm format
+    # Might want to add some validation here
+
+    # Remove whitespaces, CCS leaves off leading zeros so pad to HMM (45 is 0:45)
+    s = s.strip().zfill(3)
+
+    # Hours is everything but the last two digits
+    h = s[:-2]
+
+    # Minutes is the last two, strip everything else
+    m = s[-2:]
+
+    return f'{h}:{m}'
+
+# VECTORIZED CONVERSIONS
+
+
+def _as_str_series(values):
+    # Strings without commas or surrounding whitespace, missing values kept as missing
+    s = pd.Series(values, copy=False)
+    return s.astype('string').str.replace(',', '', regex=False).str.strip()
+
+
+def ccs_to_mins(values, missing=None):
+    """CCS HHHMM duration strings to int minutes (same result as dur_to_mins(str_to_dur(v)))
+    Values shorter than HMM are minutes (CCS leaves off leading zeros, 45 is 0:45).
+    Missing values are invalid, unless missing is given in which case they take that value.
+    Returns (minutes, invalid), invalid minutes are -1
+    """
+    s = pd.Series(values, copy=False)
+    if s.empty:
+        return pd.Series(dtype='int64', index=s.index), pd.Series(dtype=bool, index=s.index)
+    na = s.isna().to_numpy()
+    text = np.asarray(s.fillna('').astype(str).to_numpy(), dtype=str)
+    text = np.char.strip(np.char.replace(text, ',', ''))
+
+    # All digits and short enough for an int64
+    length = np.char.str_len(text)
+    valid = np.char.isdigit(text) & (length >= 1) & (length <= 18) & ~na
+    hhhmm = np.where(valid, text, '0').astype('int64')
+    h, m = np.divmod(hhhmm, 100)
+    valid &= m <= 59
+    mins = np.where(valid, h * 60 + m, -1)
+
+    if missing is not None:
+        mins[na] = missing
+        valid |= na
+
+    return pd.Series(mins, index=s.index, dtype='int64'), pd.Series(~valid, index=s.index)
+
+
+def durs_to_mins(values):
+    """h:mm duration strings to int minutes (same result as dur_to_mins)
+    Returns (minutes, invalid), invalid minutes are -1
+    """
+    s = _as_str_series(values)
+    valid = s.str.fullmatch(_DUR_RE).fillna(False).astype(bool)
+    parts = s.where(valid).str.split(':', n=1, expand=True)
+    if parts.shape[1] < 2:
+        # Nothing valid at all
+        return pd.Series(-1, index=s.index, dtype='int64'), ~valid
+    mins = (pd.to_numeric(parts[0]) * 60 + pd.to_numeric(parts[1])).where(valid, -1)
+    return mins.astype('int64'), ~valid
+
+
+def mins_to_durs(mins):
+    """Int minutes to h:mm duration strings (same result as mins_to_dur)
+    """
+    mins = pd.Series(mins, copy=False)
+    if mins.empty:
+        return pd.Series(dtype=str, index=mins.index)
+    values = mins.to_numpy(dtype='int64')
+    # Hours truncate towards zero like int(mins / 60) does
+    h = np.trunc(values / 60).astype('int64')
+    durs = np.char.add(np.char.add(h.astype(str), ':'), np.char.zfill((values % 60).astype(str), 2))
+    return pd.Series(durs, index=mins.index, dtype=str)
+
+
+def ddmmyy_to_dates(values):
+    """CCS DDMMYY date strings to datetime64
+    Returns (dates, invalid), invalid dates are NaT
+    """
+    s = _as_str_series(values)
+    dates = pd.to_datetime(s, format='%d%m%y', errors='coerce')
+    return dates, dates.isna()
+
+
+def to_days(values):
+    """Day counts to ints
+    Returns (days, invalid), invalid days are 0
+    """
+    days = pd.to_numeric(pd.Series(values, copy=False), errors='coerce')
+    invalid = days.isna() | (days < 1) | (days != days.round())
+    return days.where(~invalid, 0).astype('int64'), invalid
+
+
+def end_dates(start, days):
+    # Pairing end date: start date + (days - 1)
+    return pd.Series(start, copy=False) + pd.to_timedelta(pd.Series(days, copy=False) - 1, unit='D')
@@ -0,0 +1,296 @@
+# Python Standard Library imports
+import argparse
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, time as dtime
+from pathlib import Path
+
+# Third Party Imports
+import numpy as np
+import pandas as pd
+
+# Local Imports
+from ua_scrapers_ref import ALL_CATS
+from ot_scraper_engine import OT_COMPACT_DTYPES, OT_COMPACT_FORMAT, _category_dtype, compact_ot
+
+# History of open time scrapes, so a category can be followed through a bid month without reloading old CSVs.
+# Every scrape is appended as a timestamped snapshot in Parquet, in a hive layout partitioned by bid month and base:
+#
+#   <root>/bid_month=APR2025/base=ORD/<snapshot>-<id>.parquet
+#   <root>/bid_month=APR2025/base=ORD/_snapshots.json    (snapshot times of each category in the partition)
+#
+# Rows carry First Seen and Last Seen (equal in a fresh snapshot). Loads go through pyarrow.dataset, so a filter on
+# bid month, base or category only opens the matching partitions and dates are pushed down to the row groups.
+# compact() merges each pairing's unchanged rows from consecutive snapshots into one, widening First/Last Seen.
+# Needs pyarrow. One writer at a time: appends and compactions from several processes aren't coordinated.
+
+# CONSTANTS
+
+HISTORY_DIR = Path('.ot_history')
+
+# Hive partition keys (directory names) and the columns they come back as
+HISTORY_PARTITIONS = ('bid_month', 'base')
+HISTORY_COLUMNS = {'bid_month': 'Bid Month', 'base': 'Base'}
+
+# Per partition manifest of snapshot times, ignored by pyarrow.dataset (leading underscore)
+HISTORY_MANIFEST = '_snapshots.json'
+
+# Columns added to the compact schema
+HISTORY_SEEN = ['First Seen', 'Last Seen']
+HISTORY_DTYPES = dict(OT_COMPACT_DTYPES, **{c: 'datetime64[ms]' for c in HISTORY_SEEN})
+
+# A row is unchanged between snapshots if all of these are
+HISTORY_ROW_KEY = OT_COMPACT_FORMAT
+
+# Base of each category string
+_BASE_OF = {f'{b}{e}{s}': b for b, e, s in ALL_CATS}
+
+# HELPER FUNCTIONS
+
+
+def _pyarrow():
+    # Optional dependency, only needed for the history store
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('The open time history needs pyarrow (pip install pyarrow)') from None
+    return pyarrow
+
+
+def _snapshot_time(taken=None):
+    # Snapshot timestamp, to the millisecond so back to back scrapes stay apart (naive UTC unless given)
+    taken = pd.Timestamp.now('UTC').tz_localize(None) if taken is None else pd.Timestamp(taken)
+    return taken.floor('ms')
+
+
+def _base_of(category):
+    return _BASE_OF.get(category, category[:3])
+
+
+def _day(d):
+    # datetime.date / string to a datetime for comparing with the stored timestamp[s] dates
+    d = pd.Timestamp(d)
+    return datetime.combine(d.date(), dtime())
+
+# MAIN FUNCTIONS
+
+
+class OTHistory:
+    """Append-only snapshot history of open time under root (see the layout above)
+
+    append() stores a scrape, load() reads rows back with filters pushed down to the files, series() gives the
+    trip count and pay of categories at every snapshot, and compact() merges unchanged rows across snapshots.
+    A category's snapshot times are kept in its partition's manifest, so a pairing missing from a snapshot that
+    covered its category counts as gone, while categories a scrape didn't cover are left alone
+    """
+
+    def __init__(self, root=HISTORY_DIR):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+    def _partition(self, bid_month, base):
+        return self.root / f'bid_month={bid_month}' / f'base={base}'
+
+    def _read_manifest(self, partition):
+        try:
+            with open(partition / HISTORY_MANIFEST) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_manifest(self, partition, manifest):
+        tmp = partition / f'{HISTORY_MANIFEST}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, partition / HISTORY_MANIFEST)
+
+    def snapshots(self, bid_month, category):
+        # Snapshot times of a category (sorted Timestamps)
+        manifest = self._read_manifest(self._partition(bid_month, _base_of(category)))
+        return [pd.Timestamp(t) for t in sorted(manifest.get(category, []))]
+
+    def append(self, ot, bid_month, taken=None, categories=None):
+        """Stores a scrape of bid_month (either schema) as one snapshot, returns its time
+        categories: the categories the scrape covered, default those in ot. Pass the ones that had no trips too
+        (not the ones that failed), so their pairings are known to be gone rather than not looked at
+        """
+        pa = _pyarrow()
+        taken = _snapshot_time(taken)
+        rows = compact_ot(ot) if not ot.empty else pd.DataFrame(columns=OT_COMPACT_FORMAT)
+        rows = rows.assign(Category=rows['Category'].astype(str), **{c: taken for c in HISTORY_SEEN})
+        if categories is None:
+            categories = rows['Category'].unique()
+        categories = sorted({''.join(c) if isinstance(c, tuple) else str(c) for c in categories})
+
+        name = f"{taken.strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}.parquet"
+        with self._lock:
+            for base in sorted({_base_of(c) for c in categories}):
+                partition = self._partition(bid_month, base)
+                partition.mkdir(parents=True, exist_ok=True)
+                covered = [c for c in categories if _base_of(c) == base]
+                part = rows[rows['Category'].isin(covered)]
+                if not part.empty:
+                    table = pa.Table.from_pandas(part.astype(HISTORY_DTYPES | {'Category': str}),
+                                                 preserve_index=False)
+                    pa.parquet.write_table(table, partition / name)
+                manifest = self._read_manifest(partition)
+                for c in covered:
+                    manifest[c] = sorted(set(manifest.get(c, [])) | {taken.isoformat()})
+                self._write_manifest(partition, manifest)
+        return taken
+
+    def _dataset(self):
+        pa = _pyarrow()
+        partitioning = pa.dataset.partitioning(pa.schema([(p, pa.string()) for p in HISTORY_PARTITIONS]),
+                                               flavor='hive')
+        return pa.dataset.dataset(self.root, format='parquet', partitioning=partitioning)
+
+    def load(self, bid_month=None, base=None, category=None, start=None, end=None, columns=None):
+        """Stored rows matching every given filter: bid month, base, category (one or a list) and pairings starting
+        between start and end (dates, inclusive). Partition filters decide which files are opened, the rest are
+        pushed down to the Parquet row groups. Returns the compact schema plus First Seen, Last Seen, Bid Month
+        and Base (or just columns)
+        """
+        pa = _pyarrow()
+        field = pa.dataset.field
+        if not self.root.exists():
+            return pd.DataFrame({c: pd.Series(dtype=t) for c, t in HISTORY_DTYPES.items()})
+
+        categories = [category] if isinstance(category, str) else category
+        bases = [base] if isinstance(base, str) else base
+        if categories and not bases:
+            # A category's base is its partition
+            bases = sorted({_base_of(c) for c in categories})
+
+        filters = []
+        if bid_month is not None:
+            filters.append(field('bid_month') == bid_month)
+        if bases:
+            filters.append(field('base').isin(bases))
+        if categories:
+            filters.append(field('Category').isin(categories))
+        if start is not None:
+            filters.append(field('Pairing Date') >= _day(start))
+        if end is not None:
+            filters.append(field('Pairing Date') <= _day(end))
+        expression = None
+        for f in filters:
+            expression = f if expression is None else expression & f
+
+        table = self._dataset().to_table(columns=columns, filter=expression)
+        rows = table.to_pandas().rename(columns=HISTORY_COLUMNS)
+        rows = rows.astype({c: t for c, t in HISTORY_DTYPES.items() if c in rows.columns and c != 'Category'})
+        if 'Category' in rows.columns:
+            rows['Category'] = rows['Category'].astype(str).astype(_category_dtype(rows['Category'].unique()))
+        for c in ('Bid Month', 'Base'):
+            if c in rows.columns:
+                rows[c] = rows[c].astype(str)
+        return rows
+
+    def series(self, bid_month, category):
+        """Trip Count and Pay Minutes of categories (one or a list) at each of their snapshots
+        Returns a frame indexed by (Category, Snapshot)
+        """
+        categories = [category] if isinstance(category, str) else list(category)
+        rows = self.load(bid_month, category=categories,
+                         columns=['Category', 'Pay Minutes'] + HISTORY_SEEN)
+        frames = []
+        for c in categories:
+            times = np.array(self.snapshots(bid_month, c), dtype='datetime64[ms]')
+            counts = np.zeros(len(times) + 1, dtype='int64')
+            pay = np.zeros(len(times) + 1, dtype='int64')
+            mine = rows[rows['Category'].astype(str) == c]
+            if len(times) and not mine.empty:
+                # Each row is in snapshots first..last: add it at first, take it off after last, then cumsum
+                first = np.searchsorted(times, mine['First Seen'].to_numpy(dtype='datetime64[ms]'), side='left')
+                after = np.searchsorted(times, mine['Last Seen'].to_numpy(dtype='datetime64[ms]'), side='right')
+                minutes = mine['Pay Minutes'].to_numpy(dtype='int64')
+                np.add.at(counts, first, 1)
+                np.add.at(counts, after, -1)
+                np.add.at(pay, first, minutes)
+                np.add.at(pay, after, -minutes)
+            frames.append(pd.DataFrame({'Category': c, 'Snapshot': times, 'Trip Count': counts.cumsum()[:-1],
+                                        'Pay Minutes': pay.cumsum()[:-1]}))
+        return pd.concat(frames, ignore_index=True).set_index(['Category', 'Snapshot'])
+
+    def compact(self, bid_month=None, base=None):
+        """Rewrites each matching partition as one file, merging the rows of a pairing that stayed unchanged
+        through consecutive snapshots of its category into one (First Seen of the first, Last Seen of the last).
+        A pairing that went away and came back keeps a row per stretch. Returns {partition: (rows before, after)}
+        """
+        pa = _pyarrow()
+        results = {}
+        with self._lock:
+            for partition in sorted(self.root.glob(f"bid_month={bid_month or '*'}/base={base or '*'}")):
+                files = sorted(partition.glob('*.parquet'))
+                if not files:
+                    continue
+                rows = pa.parquet.ParquetDataset(files).read().to_pandas()
+                merged = _merge_runs(rows, self._read_manifest(partition))
+                table = pa.Table.from_pandas(merged.astype(HISTORY_DTYPES | {'Category': str}), preserve_index=False)
+
+                # Write the compacted file under a name the dataset ignores, swap it in, then drop the old files
+                name = f"{merged['Last Seen'].max().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}.parquet"
+                tmp = partition / f'_{name}'
+                pa.parquet.write_table(table, tmp)
+                os.replace(tmp, partition / name)
+                for f in files:
+                    f.unlink()
+                results[str(partition.relative_to(self.root))] = (len(rows), len(merged))
+        return results
+
+
+def _merge_runs(rows, manifest):
+    # Merges rows of the same pairing (HISTORY_ROW_KEY) whose snapshot ranges touch or overlap in their
+    # category's snapshot list into one row
+    rows = rows.copy()
+    rows['Category'] = rows['Category'].astype(str)
+    first = np.empty(len(rows), dtype='int64')
+    last = np.empty(len(rows), dtype='int64')
+    for c, where in rows.groupby('Category').indices.items():
+        times = np.array(sorted(manifest.get(c, [])), dtype='datetime64[ms]')
+        first[where] = np.searchsorted(times, rows['First Seen'].to_numpy(dtype='datetime64[ms]')[where], side='left')
+        last[where] = np.searchsorted(times, rows['Last Seen'].to_numpy(dtype='datetime64[ms]')[where], side='left')
+    rows['_first'] = first
+    rows['_last'] = last
+
+    rows = rows.sort_values(HISTORY_ROW_KEY + ['_first'], ignore_index=True)
+    new_pairing = rows[HISTORY_ROW_KEY].ne(rows[HISTORY_ROW_KEY].shift()).any(axis=1)
+    pairing = new_pairing.cumsum()
+    # Furthest snapshot the pairing's earlier rows reached, a new stretch starts when a row begins past the next one
+    reach = rows.groupby(pairing)['_last'].cummax().groupby(pairing).shift()
+    stretch = (new_pairing | (rows['_first'] > reach + 1)).cumsum()
+    merged = rows.groupby(stretch, sort=False).agg(
+        {**{c: 'first' for c in HISTORY_ROW_KEY}, 'First Seen': 'min', 'Last Seen': 'max'})
+    return merged.reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Open time snapshot history')
+    parser.add_argument('--root', default=HISTORY_DIR, help='History directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help='Append a saved scrape (CSV/Parquet/Arrow) as a snapshot')
+    add.add_argument('bid_month')
+    add.add_argument('file')
+    add.add_argument('--taken', help='Snapshot time (default now, UTC)')
+    series = commands.add_parser('series', help='Trip count and pay of a category at every snapshot')
+    series.add_argument('bid_month')
+    series.add_argument('category', nargs='+')
+    compact = commands.add_parser('compact', help='Merge unchanged rows across snapshots')
+    compact.add_argument('--bid-month')
+    compact.add_argument('--base')
+    args = parser.parse_args()
+
+    history = OTHistory(args.root)
+    if args.command == 'add':
+        from ot_import import import_ot
+        print(history.append(import_ot(args.file), args.bid_month, args.taken))
+    elif args.command == 'series':
+        print(history.series(args.bid_month, args.category).to_string())
+    else:
+        for partition, (before, after) in history.compact(args.bid_month, args.base).items():
+            print(f'{partition}: {before} rows -> {after}')
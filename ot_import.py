@@ -0,0 +1,204 @@
+# Python Standard Library imports
+from pathlib import Path
+
+# Third Party Imports
+import numpy as np
+import pandas as pd
+
+# Local Imports
+from ot_durations import durs_to_mins, to_days
+from ot_scraper_engine import OT_COMPACT_DTYPES, OT_COMPACT_FORMAT, compact_fits, compact_ot
+
+# Loads open time files back into the app (or a script): CSV as downloaded from the app or written by the command
+# line scraper, Parquet and Arrow IPC (Feather v2). Every column is checked and converted in one vectorized pass,
+# and the problems found are reported per column rather than as one opaque failure. Parquet and Arrow files on
+# disk are memory-mapped, so a large history loads without being copied in first. Parquet/Arrow need pyarrow.
+
+# CONSTANTS
+
+IMPORT_FORMATS = ('csv', 'parquet', 'arrow')
+
+# File suffixes and leading magic bytes of each format
+_SUFFIXES = {'.csv': 'csv', '.txt': 'csv', '.parquet': 'parquet', '.pq': 'parquet',
+             '.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow'}
+_MAGIC = ((b'PAR1', 'parquet'), (b'ARROW1', 'arrow'))
+
+# Dates in CSV files are ISO (what to_csv writes for datetime.date and datetime64 columns)
+IMPORT_DATE_FORMAT = '%Y-%m-%d'
+
+# Bad values quoted per column in an error report
+IMPORT_EXAMPLES = 3
+
+
+class OTImportError(ValueError):
+    """Raised when an open time file can't be imported. errors maps a column (or 'file') to what is wrong with it"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(f'{column}: {problem}' for column, problem in errors.items()))
+
+# HELPER FUNCTIONS
+
+
+def _name(source):
+    # File name of a path or an uploaded file (Streamlit's UploadedFile has .name)
+    return str(getattr(source, 'name', source))
+
+
+def detect_format(source):
+    # 'csv', 'parquet' or 'arrow' from the file suffix, or failing that the first bytes of the file
+    suffix = Path(_name(source)).suffix.lower()
+    if suffix in _SUFFIXES:
+        return _SUFFIXES[suffix]
+    if hasattr(source, 'read'):
+        position = source.tell()
+        head = source.read(8)
+        source.seek(position)
+    else:
+        with open(source, 'rb') as f:
+            head = f.read(8)
+    for magic, file_format in _MAGIC:
+        if head.startswith(magic):
+            return file_format
+    return 'csv'
+
+
+def _arrow_source(source, memory_map):
+    # pyarrow input for a path (memory-mapped) or a file object (wrapping its bytes without a copy)
+    import pyarrow as pa
+    if hasattr(source, 'read'):
+        data = source.getvalue() if hasattr(source, 'getvalue') else source.read()
+        return pa.BufferReader(data)
+    return pa.memory_map(str(source)) if memory_map else pa.OSFile(str(source))
+
+
+def read_ot_file(source, file_format=None, memory_map=True):
+    """Reads an open time file (path or file object) into a dataframe without converting anything
+    CSV columns are all read as strings. Parquet and Arrow keep their stored types
+    """
+    file_format = file_format or detect_format(source)
+    if file_format not in IMPORT_FORMATS:
+        raise OTImportError({'file': f'unknown format {file_format!r}, expected one of {", ".join(IMPORT_FORMATS)}'})
+
+    if file_format == 'csv':
+        return pd.read_csv(source, dtype=str, keep_default_na=False)
+
+    # Optional dependency, only needed for parquet and arrow files
+    try:
+        import pyarrow.ipc
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise OTImportError({'file': f'reading {file_format} files needs pyarrow'}) from None
+
+    arrow = _arrow_source(source, memory_map)
+    if file_format == 'parquet':
+        table = pq.read_table(arrow, memory_map=memory_map)
+    else:
+        table = pyarrow.ipc.open_file(arrow).read_all()
+    return table.to_pandas()
+
+
+def _examples(values, invalid):
+    # A few of the bad values with their row numbers (1 based, data rows), for the error report
+    rows = np.flatnonzero(invalid.to_numpy())
+    shown = ', '.join(f'row {r + 1}: {values.iloc[r]!r}' for r in rows[:IMPORT_EXAMPLES])
+    more = f' and {len(rows) - IMPORT_EXAMPLES} more' if len(rows) > IMPORT_EXAMPLES else ''
+    return f'{len(rows)} bad value{"s" if len(rows) > 1 else ""} ({shown}{more})'
+
+
+def _int_max(column):
+    # Largest value a compact int column holds
+    return np.iinfo(OT_COMPACT_DTYPES[column]).max
+
+
+def _to_dates(values):
+    # ISO date strings, datetime.date objects or datetime64 to datetime64. Returns (dates, invalid)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        dates = values
+    else:
+        dates = pd.to_datetime(values.astype(str), format=IMPORT_DATE_FORMAT, errors='coerce')
+    return dates, dates.isna()
+
+
+def _to_ints(values, low=0):
+    # Whole numbers >= low. Returns (ints, invalid)
+    numbers = pd.to_numeric(values, errors='coerce')
+    invalid = numbers.isna() | (numbers < low) | (numbers != numbers.round())
+    return numbers.where(~invalid, low).astype('int64'), invalid
+
+# MAIN FUNCTIONS
+
+
+def validate_ot(raw):
+    """Checks and converts a raw open time frame (see read_ot_file) column by column
+    Returns (ot, errors): ot in the compact schema (OT_COMPACT_DTYPES), None if anything is wrong, and errors,
+    a dict of column -> problem (empty if the frame is good). Pay Time is optional, if present it has to agree
+    with Pay Minutes. Pairing End Date has to be Pairing Date + Days - 1. Days and Pay Minutes have to fit the
+    compact schema's ints (up to 127 days, 32767 minutes)
+    """
+    missing = [c for c in OT_COMPACT_FORMAT if c not in raw.columns]
+    if missing:
+        return None, {c: 'missing column' for c in missing}
+
+    errors = {}
+    checked = {}
+
+    number = raw['Pairing Number'].astype(str).str.strip()
+    if (bad := number.eq('') | raw['Pairing Number'].isna()).any():
+        errors['Pairing Number'] = _examples(raw['Pairing Number'], bad)
+    checked['Pairing Number'] = number
+
+    category = raw['Category'].astype(str).str.strip()
+    if (bad := category.eq('') | raw['Category'].isna()).any():
+        errors['Category'] = _examples(raw['Category'], bad)
+    checked['Category'] = category
+
+    for column in ('Pairing Date', 'Pairing End Date'):
+        checked[column], bad = _to_dates(raw[column])
+        if bad.any():
+            errors[column] = _examples(raw[column], bad)
+
+    # Days and Pay Minutes also have to fit their small ints in the compact schema
+    checked['Days'], bad = to_days(raw['Days'])
+    bad = bad | ~compact_fits(checked['Days'], 'Days')
+    if bad.any():
+        errors['Days'] = _examples(raw['Days'], bad) + f", not a whole number from 1 to {_int_max('Days')}"
+
+    checked['Pay Minutes'], bad = _to_ints(raw['Pay Minutes'])
+    bad = bad | ~compact_fits(checked['Pay Minutes'], 'Pay Minutes')
+    if bad.any():
+        errors['Pay Minutes'] = (_examples(raw['Pay Minutes'], bad)
+                                 + f", not a whole number from 0 to {_int_max('Pay Minutes')}")
+
+    if 'Pay Time' in raw.columns and 'Pay Minutes' not in errors:
+        pay_mins, bad = durs_to_mins(raw['Pay Time'])
+        bad = bad | (pay_mins != checked['Pay Minutes'])
+        if bad.any():
+            errors['Pay Time'] = _examples(raw['Pay Time'], bad) + ', not h:mm or not the same as Pay Minutes'
+
+    if not {'Pairing Date', 'Pairing End Date', 'Days'} & errors.keys():
+        expected = checked['Pairing Date'] + pd.to_timedelta(checked['Days'] - 1, unit='D')
+        if (bad := expected.ne(checked['Pairing End Date'])).any():
+            errors['Pairing End Date'] = (_examples(raw['Pairing End Date'], bad)
+                                          + ', not Pairing Date + Days - 1')
+
+    if errors:
+        return None, errors
+    return compact_ot(pd.DataFrame(checked, index=raw.index)), {}
+
+
+def import_ot(source, file_format=None, memory_map=True):
+    """Reads and validates an open time file (path or file object, CSV/Parquet/Arrow, see read_ot_file)
+    Returns the open time in the compact schema. Raises OTImportError with per-column problems
+    """
+    try:
+        raw = read_ot_file(source, file_format, memory_map)
+    except OTImportError:
+        raise
+    except (ValueError, OSError, UnicodeDecodeError, pd.errors.ParserError) as e:
+        raise OTImportError({'file': f"can't read {_name(source)} ({e})"}) from e
+
+    ot, errors = validate_ot(raw)
+    if errors:
+        raise OTImportError(errors)
+    return ot
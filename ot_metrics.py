@@ -0,0 +1,215 @@
+# Python Standard Library imports
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Third Party Imports
+import pandas as pd
+
+# Per-category timing of a scrape, so a slow run shows which bases and fleets the wall-clock went to.
+# The engine fills in a CategorySpan for each category it scrapes when given a ScrapeMetrics; the run can then
+# be read as a dataframe (Streamlit), a JSON report or Prometheus text (cron runner).
+
+# CONSTANTS
+
+# Seconds spent in each stage of a category, in the order they happen
+SPAN_TIMERS = ('wait', 'network', 'parse_wait', 'parse', 'transform')
+
+# Counters kept next to the timers
+SPAN_COUNTERS = ('bytes', 'retries', 'rows', 'shards', 'invalid', 'pages', 'cached_pages')
+
+# Invalid values kept as examples per category
+SPAN_INVALID_EXAMPLES = 5
+
+# Prefix of every Prometheus metric name
+PROMETHEUS_PREFIX = 'ot_scrape'
+
+
+class CategorySpan:
+    """Timings and counters for one category of a scrape
+
+    wait: politeness/backoff sleeps, network: time in the request (including reads from the html cache),
+    parse_wait: time a page waited for room in the parse pool (ot_pipeline), parse: lxml walk of the page,
+    transform: building the OT_DF_FORMAT frame, bytes: response size, retries: attempts after the first,
+    rows: trips found, shards: date sub-ranges fetched for a category over the page limit, invalid: pairings
+    dropped for values that couldn't be read (a few of them in invalid_examples), pages: pages read,
+    cached_pages: how many of them came from the html cache, cached: every page came from the cache (or the
+    result was handed over without reading any), outcome: see ot_scheduler.OUTCOMES.
+    Shards of a category add to the same span from several threads
+    """
+
+    def __init__(self, cat, bid_month):
+        self.cat = tuple(cat)
+        self.bid_month = bid_month
+        self.outcome = None
+        self.cached = False
+        self.started = time.time()
+        self.finished = None
+        self.invalid_examples = []
+        self._lock = threading.Lock()
+        for name in SPAN_TIMERS + SPAN_COUNTERS:
+            setattr(self, name, 0)
+
+    @property
+    def category(self):
+        return ''.join(str(c) for c in self.cat)
+
+    @contextmanager
+    def timer(self, name):
+        # Adds the time spent in the with block to the named timer
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, value):
+        # Adds to a timer or counter
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def add_invalid(self, count, examples):
+        # Pairings dropped for bad values, and examples of them (strings) up to SPAN_INVALID_EXAMPLES
+        with self._lock:
+            self.invalid += count
+            self.invalid_examples.extend(examples[:SPAN_INVALID_EXAMPLES - len(self.invalid_examples)])
+
+    def finish(self, outcome, rows=0):
+        self.outcome = outcome
+        if self.pages and self.cached_pages == self.pages:
+            self.cached = True
+        self.rows = rows
+        self.finished = time.time()
+
+    def as_dict(self):
+        span = {'category': self.category, 'base': self.cat[0], 'fleet': self.cat[1], 'seat': self.cat[2],
+                'bid_month': self.bid_month, 'outcome': self.outcome, 'cached': self.cached,
+                'elapsed': (self.finished or time.time()) - self.started}
+        for name in SPAN_TIMERS + SPAN_COUNTERS:
+            span[name] = getattr(self, name)
+        span['invalid_examples'] = list(self.invalid_examples)
+        return span
+
+
+class ScrapeMetrics:
+    """Collects the CategorySpans of a scrape (thread safe) plus run-level timings
+    (session check, totals) and turns them into reports
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = {'session': 0.0, 'totals': 0.0}
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def span(self, cat, bid_month):
+        # New span for a category, one per extract_ot_list call
+        span = CategorySpan(cat, bid_month)
+        with self._lock:
+            self._spans.append(span)
+        return span
+
+    @contextmanager
+    def stage(self, name):
+        # Adds the time spent in the with block to a run-level stage
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    @property
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def frame(self):
+        # One row per category span
+        columns = (['category', 'base', 'fleet', 'seat', 'bid_month', 'outcome', 'cached', 'elapsed']
+                   + list(SPAN_TIMERS) + list(SPAN_COUNTERS))
+        return pd.DataFrame([s.as_dict() for s in self.spans], columns=columns)
+
+    def summary(self, by='base'):
+        # Sum of the timers and counters per base (or fleet, seat, ...), biggest elapsed first
+        spans = self.frame()
+        if spans.empty:
+            return spans
+        measures = ['elapsed'] + list(SPAN_TIMERS) + list(SPAN_COUNTERS)
+        return spans.groupby(by)[measures].sum().sort_values('elapsed', ascending=False)
+
+    def report(self):
+        # Structured run report
+        spans = self.frame()
+        return {
+            'started': datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            'elapsed': time.time() - self.started,
+            'stages': dict(self.stages),
+            'outcomes': {k: int(v) for k, v in spans['outcome'].value_counts().items()},
+            'totals': {m: float(spans[m].sum()) for m in SPAN_TIMERS + SPAN_COUNTERS},
+            'categories': [s.as_dict() for s in self.spans],
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.report(), **kwargs)
+
+    def to_prometheus(self):
+        # Prometheus text exposition format, labelled by category and bid month
+        lines = []
+        spans = self.spans
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {PROMETHEUS_PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {PROMETHEUS_PREFIX}_{name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f'{PROMETHEUS_PREFIX}_{name}{{{label_text}}} {value}')
+
+        for name in SPAN_TIMERS:
+            metric(f'{name}_seconds', 'gauge', f'Seconds spent in {name} per category',
+                   [(self._labels(s), getattr(s, name)) for s in spans])
+        for name in SPAN_COUNTERS:
+            metric(name, 'gauge', f'{name.capitalize()} per category', [(self._labels(s), getattr(s, name)) for s in spans])
+        metric('stage_seconds', 'gauge', 'Seconds spent in run-level stages',
+               [({'stage': k}, v) for k, v in self.stages.items()])
+        outcomes = {}
+        for s in spans:
+            outcomes[s.outcome] = outcomes.get(s.outcome, 0) + 1
+        metric('categories', 'gauge', 'Categories scraped per outcome',
+               [({'outcome': k}, v) for k, v in outcomes.items() if k is not None])
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _labels(span):
+        return {'category': span.category, 'base': span.cat[0], 'fleet': span.cat[1], 'seat': span.cat[2],
+                'bid_month': span.bid_month}
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.metrics.to_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_metrics(metrics, port, host='127.0.0.1'):
+    # Serves metrics.to_prometheus() on http://host:port/metrics from a background thread. Only on this machine by
+    # default, pass host='0.0.0.0' to let a scraper elsewhere reach it
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
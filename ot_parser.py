@@ -0,0 +1,157 @@
+# Python Standard Library imports
+import argparse
+import re
+import time
+
+# Third Party Imports
+import lxml.html
+import pandas as pd
+
+# CONSTANTS
+
+# Columns of the pairing list table we keep
+OT_LIST_COLUMNS = ('Pairing Number', 'Pairing Date', 'Days')
+
+# Columns of the raw page frame returned by parse_ot_page, all strings straight from the page
+OT_PAGE_COLUMNS = list(OT_LIST_COLUMNS) + ['Pay', 'Deadhead']
+
+# In a pay block, the values are on the second row: deadhead at column 2, pay time at column 5
+PAY_BLOCK_ROW = 1
+PAY_BLOCK_DHD_COL = 2
+PAY_BLOCK_PAY_COL = 5
+
+# The pairing list is the first table whose header row has a 'Pairing Number' cell
+_LIST_TABLE_XPATH = ("//table[(./tr | ./thead/tr | ./tbody/tr)[1]"
+                     "/*[self::td or self::th][normalize-space() = 'Pairing Number']]")
+
+# Pay blocks are the tables that have a 'Pay Time' cell, one per pairing in page order
+_PAY_TABLE_XPATH = ("//table[(./tr | ./thead/tr | ./tbody/tr)"
+                    "/*[self::td or self::th][normalize-space() = 'Pay Time']]")
+
+# Tables with a direct (not nested) cell reading $text
+_CELL_TABLE_XPATH = ("//table[(./tr | ./thead/tr | ./tbody/tr)"
+                     "/*[self::td or self::th][normalize-space() = $text]]")
+
+_WHITESPACE_RE = re.compile(r'[\s\xa0]+')
+
+# HELPER FUNCTIONS
+
+
+def _cell_text(cell):
+    # Same whitespace handling as pd.read_html
+    return _WHITESPACE_RE.sub(' ', cell.text_content()).strip()
+
+
+def _table_rows(table):
+    # Direct rows of a table only (never rows of a nested table)
+    return table.xpath('./tr | ./thead/tr | ./tbody/tr | ./tfoot/tr')
+
+
+def _row_cells(row):
+    # Cell texts of a row, repeating cells that span several columns so indexes line up with pd.read_html
+    cells = []
+    for cell in row.xpath('./td | ./th'):
+        try:
+            span = max(1, int(cell.get('colspan', 1)))
+        except ValueError:
+            span = 1
+        cells.extend([_cell_text(cell)] * span)
+    return cells
+
+
+def tables_with_cell(doc, text):
+    # Tables of a parsed page that have a cell reading text, in page order
+    return doc.xpath(_CELL_TABLE_XPATH, text=text)
+
+
+def table_records(table):
+    # Rows of a table as dicts keyed by the cells of its first row
+    rows = _table_rows(table)
+    if not rows:
+        return []
+    header = _row_cells(rows[0])
+    return [dict(zip(header, _row_cells(row))) for row in rows[1:]]
+
+# MAIN FUNCTIONS
+
+
+def parse_ot_page(raw_html):
+    """Walks a CCS -> Trading -> Open Time page once and pulls out only what we need:
+    the pairing list rows and the pay/deadhead cells of each pairing's pay block.
+    Returns a dataframe of strings with columns OT_PAGE_COLUMNS (Deadhead is missing when there is no DHD pay).
+    Returns None if the page can't be parsed (no pairing list, or pay blocks don't line up with the list)
+    """
+    doc = lxml.html.fromstring(raw_html)
+
+    # Pairing list, found by its header rather than its position on the page
+    list_tables = doc.xpath(_LIST_TABLE_XPATH)
+    if not list_tables:
+        return None
+    rows = _table_rows(list_tables[0])
+    header = _row_cells(rows[0])
+    try:
+        cols = [header.index(c) for c in OT_LIST_COLUMNS]
+    except ValueError:
+        # Missing one of the columns, grabbed the wrong table
+        return None
+
+    page = {c: [] for c in OT_PAGE_COLUMNS}
+    for row in rows[1:]:
+        cells = _row_cells(row)
+        if len(cells) <= max(cols):
+            continue
+        for c, i in zip(OT_LIST_COLUMNS, cols):
+            page[c].append(cells[i])
+
+    # Pay blocks
+    for table in doc.xpath(_PAY_TABLE_XPATH):
+        rows = _table_rows(table)
+        if len(rows) <= PAY_BLOCK_ROW:
+            return None
+        cells = _row_cells(rows[PAY_BLOCK_ROW])
+        if len(cells) <= PAY_BLOCK_PAY_COL:
+            return None
+        page['Pay'].append(cells[PAY_BLOCK_PAY_COL])
+        # Empty deadhead cell means no DHD pay
+        page['Deadhead'].append(cells[PAY_BLOCK_DHD_COL] or None)
+
+    if len(page['Pay']) != len(page['Pairing Number']):
+        return None
+
+    return pd.DataFrame(page, columns=OT_PAGE_COLUMNS)
+
+
+def benchmark_parsers(raw_html, cat, repeat=5):
+    """Times the lxml parser against the pd.read_html path on the same page
+    Returns a dict of best-of-repeat seconds for each path
+    """
+    # Imported here so the engine can import this module without a cycle
+    from ot_scraper_engine import parse_ot_html, parse_ot_html_read_html
+
+    results = {}
+    for name, parse in (('lxml', parse_ot_html), ('read_html', parse_ot_html_read_html)):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parse(raw_html, cat)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = best
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the lxml open time parser against pd.read_html on saved CCS pages')
+    parser.add_argument('pages', nargs='+', help='Saved opentime.aspx responses (html)')
+    parser.add_argument('--cat', nargs=3, default=('EWR', '737', 'FO'),
+                        metavar=('BASE', 'FLEET', 'SEAT'), help='Category the pages belong to')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per parser, best is kept')
+    args = parser.parse_args()
+
+    for path in args.pages:
+        with open(path, encoding='utf-8') as f:
+            raw_html = f.read()
+        times = benchmark_parsers(raw_html, tuple(args.cat), args.repeat)
+        print(f"{path}: lxml {times['lxml']*1000:.1f} ms, read_html {times['read_html']*1000:.1f} ms, "
+              f"speedup {times['read_html']/times['lxml']:.1f}x")
@@ -0,0 +1,104 @@
+# Python Standard Library imports
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# Local Imports
+from ot_metrics import CategorySpan
+
+# Second stage of a scrape: parsing raw open time pages in worker processes. Fetch threads only wait on the
+# network (or the html cache) and hand each page over without waiting for it to be parsed, so parsing - which holds
+# the GIL - no longer queues behind them in one interpreter, and a replay or an all-bases, several bid month scrape
+# parses on every core. The frames go on to whoever collects them (iter_ot_lists). A page takes one of queue_size
+# slots from the moment it is handed over until its frame has been collected: when they are all taken the fetch
+# threads wait, so raw pages and frames in memory never exceed queue_size however far behind the collector is.
+
+# CONSTANTS
+
+# Parse processes (default: every core but one, which is left to the fetch threads)
+PARSE_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# Pages between the fetch threads and the collector (waiting for, being or done being parsed), per worker
+PARSE_QUEUE_PER_WORKER = 2
+
+# Workers are started fresh rather than forked: the fetch threads (and Streamlit's) may hold locks at fork time
+PARSE_START_METHOD = 'spawn'
+
+# HELPER FUNCTIONS
+
+
+def _parse_page(raw_html, cat, compact):
+    # Runs in a worker process: parse_ot_html plus its parse/transform times and invalid values, to add to the
+    # caller's span
+    from ot_scraper_engine import parse_ot_html
+    span = CategorySpan(cat, None)
+    ot = parse_ot_html(raw_html, cat, span, compact)
+    return ot, {'parse': span.parse, 'transform': span.transform}, (span.invalid, span.invalid_examples)
+
+
+def _frame_done(parsed, span, frame):
+    # Runs when a worker is done: passes its frame (or error) on to the frame future, and its parse/transform times
+    # and invalid values to the span
+    try:
+        ot, timings, invalid = parsed.result()
+    except BaseException as e:
+        frame.set_exception(e)
+        return
+    for name, seconds in timings.items():
+        span.add(name, seconds)
+    if invalid[0]:
+        span.add_invalid(*invalid)
+    frame.set_result(ot)
+
+
+class ParsePool:
+    """Process pool parsing open time pages for the fetch threads of a scrape (see iter_ot_lists)
+
+    submit() hands a page to the workers and returns a Future of its frame straight away, so the fetch thread goes
+    on to its next page. The page holds one of queue_size slots until release() is called for it, once its frame
+    has been dealt with; submit() waits while every slot is taken. parse() is the blocking form, with the same
+    arguments and result as parse_ot_html.
+    Use as a context manager, or call close() when done
+    """
+
+    def __init__(self, workers=PARSE_WORKERS, queue_size=None):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size or self.workers * PARSE_QUEUE_PER_WORKER
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(PARSE_START_METHOD))
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+
+    def submit(self, raw_html, cat, span=None, compact=False):
+        if span is None:
+            span = CategorySpan(cat, None)
+        # Backpressure from the parse stage, kept apart from the scheduler's politeness wait
+        with span.timer('parse_wait'):
+            self._slots.acquire()
+        try:
+            parsed = self._pool.submit(_parse_page, raw_html, tuple(cat), compact)
+        except BaseException:
+            self._slots.release()
+            raise
+        frame = Future()
+        parsed.add_done_callback(lambda f: _frame_done(f, span, frame))
+        return frame
+
+    def release(self):
+        # A submitted page's frame has been dealt with, its slot goes to the next page
+        self._slots.release()
+
+    def parse(self, raw_html, cat, span=None, compact=False):
+        frame = self.submit(raw_html, cat, span, compact)
+        try:
+            return frame.result()
+        finally:
+            self.release()
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
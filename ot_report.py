@@ -0,0 +1,140 @@
+# Third Party Imports
+import numpy as np
+import pandas as pd
+
+# Local Imports
+from ot_calendar import BID_CALENDAR
+from ot_durations import durs_to_mins, mins_to_durs
+
+# Carryover and open time percentage report for every category at once. Carryover is the part of a trip flying
+# after the end of the bid month. Real carryover credit depends on the legs flown after the month end, which the open
+# time list doesn't have, so unless it is entered for a category it is estimated by pro-rating pay by days: a 4 day
+# trip with 1 day past the month end carries a quarter of its pay over. The per-category adjusted credit (pay minus
+# carryover) is then compared with each category's total credit to get the share of it sitting in open time, and
+# how much more open time would bring it up to 1%.
+
+# CONSTANTS
+
+# Share of the category credit the report measures against (1%)
+REPORT_TARGET_PERCENT = 1.0
+
+# Where a category's carryover came from
+CARRYOVER_ESTIMATE = 'estimate'
+CARRYOVER_ENTERED = 'entered'
+
+# Minute columns of the report, each gets an h:mm twin for display
+_MINUTE_COLUMNS = {'Pay Minutes': 'Total Pay', 'Carryover Minutes': 'Carryover', 'Adjusted Minutes': 'Adjusted Credit',
+                   'Credit Minutes': 'Category Credit', 'Needed Minutes': 'Needed For 1%'}
+
+
+def carryover_minutes(ot, month_end):
+    """Estimated carryover: pay minutes of each trip flying after month_end (datetime.date), pro-rated by days past it
+    Returns an int64 array lined up with ot (0 for trips ending in the month)
+    """
+    end = pd.to_datetime(ot['Pairing End Date']).to_numpy(dtype='datetime64[D]')
+    days = ot['Days'].to_numpy(dtype='int64')
+    past = np.clip((end - np.datetime64(month_end, 'D')).astype('int64'), 0, days)
+    pay = ot['Pay Minutes'].to_numpy(dtype='int64')
+    return np.rint(pay * past / np.maximum(days, 1)).astype('int64')
+
+
+def _table_minutes(table, minutes_column, duration_column, what, blank_ok=False):
+    # Minutes from a minutes column or, if there isn't one, an h:mm column. Returns (minutes, given).
+    # Credits have to be positive. With blank_ok (carryover) 0 is fine and blank cells are not given
+    column = minutes_column if minutes_column in table.columns else duration_column
+    values = table[column]
+    if column == minutes_column:
+        mins = pd.to_numeric(values, errors='coerce')
+        invalid = mins.isna()
+    else:
+        mins, invalid = durs_to_mins(values.astype(str).str.strip())
+    invalid = invalid | (mins < 0 if blank_ok else mins <= 0)
+    given = ~(values.isna() | values.astype(str).str.strip().eq('')) if blank_ok else pd.Series(True, table.index)
+    invalid = invalid & given
+    if invalid.any():
+        rows = ', '.join(str(r + 1) for r in np.flatnonzero(invalid.to_numpy())[:5])
+        raise ValueError(f'{what} that are not {"" if blank_ok else "positive "}h:mm or minutes on rows {rows}')
+    return mins.where(given, 0).astype('int64'), given.to_numpy()
+
+
+def credits_from_table(table):
+    """Category total credits table (Category plus Total Credit h:mm or Credit Minutes) to a Series of minutes
+    indexed by Category. Raises ValueError naming the rows that can't be read
+    """
+    if 'Category' not in table.columns:
+        raise ValueError('Category credits need a Category column')
+    if not {'Credit Minutes', 'Total Credit'} & set(table.columns):
+        raise ValueError('Category credits need a Total Credit (h:mm) or Credit Minutes column')
+    mins, _ = _table_minutes(table, 'Credit Minutes', 'Total Credit', 'Category credits')
+    return pd.Series(mins.to_numpy(), index=table['Category'].astype(str).str.strip(),
+                     name='Credit Minutes').groupby(level=0).sum()
+
+
+def carryover_from_table(table):
+    """Entered carryover from a category credits table: its optional Carryover (h:mm) or Carryover Minutes column,
+    as a Series of minutes indexed by Category for the rows that have one. None if there is no such column.
+    Raises ValueError naming the rows that can't be read
+    """
+    if 'Category' not in table.columns or not {'Carryover Minutes', 'Carryover'} & set(table.columns):
+        return None
+    mins, given = _table_minutes(table, 'Carryover Minutes', 'Carryover', 'Carryover values', blank_ok=True)
+    return pd.Series(mins.to_numpy()[given], index=table['Category'].astype(str).str.strip()[given],
+                     name='Carryover Minutes').groupby(level=0).sum()
+
+
+def carryover_report(ot, bid_month, credits=None, carryover=None):
+    """One row per category: Trip Count, Pay Minutes, Carryover Trips, Carryover Minutes, Carryover Source and
+    Adjusted Minutes (pay without carryover). Carryover is the one entered for the category in carryover (Series of
+    minutes by category, see carryover_from_table) if there is one, Carryover Source CARRYOVER_ENTERED, otherwise
+    the estimate against the end of bid_month (see carryover_minutes), Carryover Source CARRYOVER_ESTIMATE.
+    With credits (Series of total credit minutes by category, see credits_from_table) adds Credit Minutes,
+    Open Time % (adjusted minutes over credit) and Needed Minutes (open time still needed to reach
+    REPORT_TARGET_PERCENT, 0 if it already does). Every minutes column has an h:mm twin for display
+    """
+    month_end = BID_CALENDAR.dates(bid_month)[1]
+    carry = carryover_minutes(ot, month_end)
+    trips = pd.DataFrame({'Category': ot['Category'].astype(str).to_numpy(),
+                          'Pay Minutes': ot['Pay Minutes'].to_numpy(dtype='int64'),
+                          'Carryover Trips': (carry > 0).astype('int64'),
+                          'Carryover Minutes': carry})
+    report = trips.groupby('Category', sort=True).agg(**{
+        'Trip Count': ('Pay Minutes', 'size'),
+        'Pay Minutes': ('Pay Minutes', 'sum'),
+        'Carryover Trips': ('Carryover Trips', 'sum'),
+        'Carryover Minutes': ('Carryover Minutes', 'sum'),
+    })
+    report['Carryover Source'] = CARRYOVER_ESTIMATE
+    if carryover is not None and not carryover.empty:
+        # Entered carryover replaces the estimate, for categories with no open time too
+        report = report.reindex(report.index.union(carryover.index)).fillna(
+            {'Trip Count': 0, 'Pay Minutes': 0, 'Carryover Trips': 0, 'Carryover Minutes': 0,
+             'Carryover Source': CARRYOVER_ESTIMATE})
+        report.loc[carryover.index, 'Carryover Minutes'] = carryover.to_numpy()
+        report.loc[carryover.index, 'Carryover Source'] = CARRYOVER_ENTERED
+        report = report.astype({c: 'int64' for c in ('Trip Count', 'Pay Minutes', 'Carryover Trips',
+                                                      'Carryover Minutes')})
+    report['Adjusted Minutes'] = report['Pay Minutes'] - report['Carryover Minutes']
+
+    if credits is not None:
+        report = report.join(credits.rename('Credit Minutes'), how='outer')
+        counts = report.columns.drop(['Credit Minutes', 'Carryover Source'])
+        report = report.fillna({c: 0 for c in counts}).fillna({'Carryover Source': CARRYOVER_ESTIMATE})
+        report[counts] = report[counts].astype('int64')
+        credit = report['Credit Minutes'].astype('float64')
+        percentage = report['Adjusted Minutes'] / credit * 100
+        report['Open Time %'] = percentage.round(2)
+        # Same rounding as the calculator always used: whole minutes short of the target, plus one
+        short = credit * REPORT_TARGET_PERCENT / 100 - report['Adjusted Minutes']
+        needed = np.floor(short) + 1
+        needed = needed.where(percentage < REPORT_TARGET_PERCENT, 0).where(credit.notna())
+        report['Needed Minutes'] = needed.astype('Int64')
+        report['Credit Minutes'] = report['Credit Minutes'].astype('Int64')
+
+    for column, label in _MINUTE_COLUMNS.items():
+        if column in report.columns:
+            values = report[column]
+            durs = pd.Series(None, index=report.index, dtype=object)
+            known = values.notna().to_numpy()
+            durs[known] = mins_to_durs(values[known].astype('int64')).to_numpy()
+            report.insert(report.columns.get_loc(column), label, durs)
+    return report
@@ -0,0 +1,137 @@
+# Python Standard Library imports
+import random
+import threading
+import time
+
+# Paces every request a scrape makes to CCS. One RateScheduler is shared by all workers: requests are let out by a
+# token bucket whose rate adapts to how CCS is coping (AIMD - creep up while pages come back fast and clean, halve on
+# an error page or a failed request), and retries wait out an exponential backoff with jitter on top.
+
+# CONSTANTS
+
+# Requests per second the bucket starts at, and the range the adaptation keeps it in
+SCHED_RATE = 0.75
+SCHED_MIN_RATE = 0.1
+SCHED_MAX_RATE = 3.0
+
+# Requests that can go out back to back after a quiet spell
+SCHED_BURST = 1
+
+# Random extra wait on top of each token, as a share of the token interval, so requests don't land on a beat
+SCHED_JITTER = 0.25
+
+# AIMD: rate added after each good page, rate multiplied by on an error page or failed request,
+# and on a good page that took longer than SCHED_TARGET_LATENCY seconds
+SCHED_INCREASE = 0.05
+SCHED_DECREASE = 0.5
+SCHED_SLOW_DECREASE = 0.9
+SCHED_TARGET_LATENCY = 5.0
+
+# Retry backoff: up to SCHED_BACKOFF_BASE * 2 ** (retry - 1) seconds (full jitter), capped
+SCHED_BACKOFF_BASE = 2.0
+SCHED_BACKOFF_CAP = 60.0
+
+# Attempts per category before giving up
+SCHED_MAX_ATTEMPTS = 3
+
+# Per-category outcomes
+OUTCOME_OK = 'ok'
+OUTCOME_NO_TRIPS = 'no trips'
+OUTCOME_PAGE_ERROR = 'page error'      # Got a page but couldn't parse it
+OUTCOME_GAVE_UP = 'gave up'            # Error pages or failed requests on every attempt
+OUTCOME_NOT_CACHED = 'not cached'      # Replay only cache without the page
+OUTCOME_TRUNCATED = 'truncated'        # Still over the page limit for a single day, rows past it are missing
+
+OUTCOMES = (OUTCOME_OK, OUTCOME_NO_TRIPS, OUTCOME_PAGE_ERROR, OUTCOME_GAVE_UP, OUTCOME_NOT_CACHED, OUTCOME_TRUNCATED)
+
+
+class RateScheduler:
+    """Global request rate shared by every worker of a scrape (thread safe)
+
+    acquire() blocks until the caller may send a request, record() feeds back how it went, backoff() sleeps
+    before a retry. rate is requests per second, adapted between min_rate and max_rate by record(): up by increase
+    after a good page, times decrease after a bad one, times slow_decrease after a good one slower than
+    target_latency
+    """
+
+    def __init__(self, rate=SCHED_RATE, min_rate=SCHED_MIN_RATE, max_rate=SCHED_MAX_RATE, burst=SCHED_BURST,
+                 jitter=SCHED_JITTER, increase=SCHED_INCREASE, decrease=SCHED_DECREASE,
+                 slow_decrease=SCHED_SLOW_DECREASE, target_latency=SCHED_TARGET_LATENCY,
+                 backoff_base=SCHED_BACKOFF_BASE, backoff_cap=SCHED_BACKOFF_CAP, max_attempts=SCHED_MAX_ATTEMPTS):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.burst = burst
+        self.jitter = jitter
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_decrease = slow_decrease
+        self.target_latency = target_latency
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_attempts = max_attempts
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.stats = {'requests': 0, 'good': 0, 'bad': 0, 'slow': 0}
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+
+    def acquire(self):
+        # Takes a token, sleeping (outside the lock) until it is due. Tokens can go negative, each waiting
+        # caller holds a reservation further out. Returns the seconds slept
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens -= 1
+            delay = max(0.0, -self._tokens / self.rate)
+            delay += random.uniform(0, self.jitter / self.rate)
+            self.stats['requests'] += 1
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def record(self, latency, ok):
+        # AIMD: additive increase on a good, quick page, multiplicative decrease on a bad or slow one
+        with self._lock:
+            if not ok:
+                self.stats['bad'] += 1
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+            elif latency > self.target_latency:
+                self.stats['slow'] += 1
+                self.rate = max(self.min_rate, self.rate * self.slow_decrease)
+            else:
+                self.stats['good'] += 1
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def backoff_delay(self, retry):
+        # Full jitter exponential backoff for the retry'th retry (1 based)
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** (retry - 1)))
+
+    def backoff(self, retry):
+        # Sleeps before a retry, returns the seconds slept
+        delay = self.backoff_delay(retry)
+        time.sleep(delay)
+        return delay
+
+    def finish(self, outcome):
+        # Counts a category's outcome
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {'rate': self.rate, 'outcomes': dict(self.outcomes), **self.stats}
+
+
+# Used when a scrape isn't given its own, so separate calls still share one rate
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler():
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RateScheduler()
+        return _default_scheduler
@@ -4,21 +4,46 @@ from datetime import datetime
 from datetime import timedelta
 import io
 import os
-import random
+import queue
 import re
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from pathlib import Path
 import requests
 
 # Third Party Imports
+import numpy as np
 import pandas as pd
 
 # Local Imports
 from ua_scrapers_ref import *
+from ot_aggregate import build_ot_cube, rollup
+from ot_calendar import BID_CALENDAR
+from ot_cache import OT_CACHE_DIR, OT_CACHE_TTL, CacheMissError, HtmlCache
+from ot_durations import (mins_to_dur, dur_to_mins, str_to_dur, ccs_to_mins, mins_to_durs, ddmmyy_to_dates, to_days,
+                          end_dates)
+from ot_metrics import CategorySpan, ScrapeMetrics, serve_metrics
+from ot_parser import parse_ot_page
+from ot_pipeline import PARSE_WORKERS, ParsePool
+from ot_session import ccs_html, ccs_session
+from ot_shared import SHARED_FETCHED, SHARED_HIT
+from ot_scheduler import (SCHED_RATE, SCHED_MAX_RATE, OUTCOME_OK, OUTCOME_NO_TRIPS, OUTCOME_PAGE_ERROR,
+                          OUTCOME_GAVE_UP, OUTCOME_NOT_CACHED, OUTCOME_TRUNCATED, RateScheduler, default_scheduler)
 
 # CONSTANTS
 
+# Most pairings CCS lists on one page (txtNumPerPage), a full page is split into date ranges
+OT_PAGE_LIMIT = 499
 
+# Date sub-ranges a full page is split into, fetched at the same time
+OT_SHARDS = 4
+
+# Default number of categories fetched at the same time
+OT_MAX_IN_FLIGHT = 4
+
+# Seconds to wait on CCS before giving up on a request
+OT_REQUEST_TIMEOUT = 30
 
 OT_DF_DTYPES = {
     'Pairing Number'    : str,
@@ -33,83 +58,37 @@ OT_DF_DTYPES = {
 # Just the columns, used to validate import csv format
 OT_DF_FORMAT = list(OT_DF_DTYPES.keys())
 
-# HELPER FUNCTIONS
-
-
-def mins_to_dur(mins):
-    # Takes an int number of minutes and returns a duration string
-    try:
-        h = int(mins / 60)
-        m = int(mins % 60)
-    except:
-        print('Error with minutes format: {mins}')
-        return 'err'
-
-    h = str(h)
-    m = str(m)
-    if len(m) == 1:
-        # Single digit, append a 0
-        m = f'0{m}'
-    return (f'{h}:{m}')
-
-
-def dur_to_mins(d):
-    # Takes a time in hhh:mm format and returns the number of minutes
-    # Returns -1 if there was an error
-    total_mins = 0
-    d = d.replace(',', '') # Remove commas
-    print(d)
-    try:
-        s = str.split(d, sep=':')
-        # Error checking for correct number after split (should be 2)
-        if len(s) != 2:
-            print(f'Error with duration format: {d}')
-            return -1
-        # Hours can be 1 or more digits, but mins has to be 2
-        if len(s[1]) != 2:
-            print(f'Error with duration format: {d}')
-            return -1
-
-        # These will throw an exception if they don't convert to int
-        h = int(s[0])
-        m = int(s[1])
-
-        # Minutes should be 0 to 59
-        if (m > 59):
-            print(f'Error with minutes format: {m}')
-            return -1
-    except:
-        print(f'Format error with {d}')
-        return -1
-
-    return m + (60*h)
+# Every category string, sorted so categorical Category groups and sorts like the plain strings do
+OT_CATEGORY_DTYPE = pd.CategoricalDtype(sorted(f'{b}{e}{s}' for b, e, s in ALL_CATS))
 
+# Compact schema: one categorical Category for every frame (so concatenating keeps it categorical), datetime64
+# dates, small ints and no Pay Time, which is derived from Pay Minutes for display (see with_pay_time)
+OT_COMPACT_DTYPES = {
+    'Pairing Number'    : object,
+    'Category'          : OT_CATEGORY_DTYPE,
+    'Pairing Date'      : 'datetime64[s]',
+    'Pairing End Date'  : 'datetime64[s]',
+    'Days'              : 'int8',
+    'Pay Minutes'       : 'int16'
+}
 
-def str_to_dur(s):
-    # Takes a string s and returns it in hhh:mm format
-    # Might want to add some validation here
+OT_COMPACT_FORMAT = list(OT_COMPACT_DTYPES.keys())
 
-    # Remove whitespaces
-    s = s.strip()
+# HELPER FUNCTIONS
 
-    # Hours is everything but the last two digits
-    h = s[:-2]
 
-    # Minutes is the last two, strip everything else
-    m = s[-2:]
+# MAIN FUNCTIONS
 
-    return f'{h}:{m}'
 
-# MAIN FUNCTIONS
+def ot_page_url(skey, base_url=None):
+    # Open time page URL for a session key, on CCS_BASE_URL unless another base URL is given
+    return f'{base_url or CCS_BASE_URL}/opentime.aspx?SKEY={skey}&CMS=False'
 
 
-def extract_ot_html(ot_url, cat, bid_month):
-    """
-    Extracts and returns the raw html text of the relevant category and bid month from the CCS -> Trading -> Open Time page
-    Returns a dataframe with columns OT_DF_FORMAT. If no trips, returns an empty dataframe with OT_DF_FORMAT columns.
-    If it runs into a page problem, returns an empty dataframe with no columns
+def ot_payload(cat, bid_month):
+    """Returns the POST payload for the open time page of a category over a bid month (tuple of DDMMYY dates)
     """
-    ot_url_payload = {
+    return {
         '__VIEWSTATE': '/wEPDwUJNTU4NzU2MjAzDxYCHhNWYWxpZGF0ZVJlcXVlc3RNb2RlAgEWAmYPZBYEAgEPZBYEAgoPFgIeBGhyZWYFIH4vQ29udGVudC9hcHAvaWNvbnMvSWNvbi01MTIucG5nZAIcDxYCHgRUZXh0Be0CPHNjcmlwdCBzcmM9Ii9DQ1MvanMvanF1ZXJ5LTMuNS4xLm1pbi5qcyIgdHlwZT0idGV4dC9qYXZhc2NyaXB0Ij48L3NjcmlwdD48c2NyaXB0IHNyYz0iL0NDUy9TY3JpcHRzL2pxdWVyeS11aS5taW4uanMiIHR5cGU9InRleHQvamF2YXNjcmlwdCI+PC9zY3JpcHQ+PHNjcmlwdCBzcmM9Ii9DQ1MvU2NyaXB0cy9qcXVlcnkudmFsaWRhdGUubWluLmpzIiB0eXBlPSJ0ZXh0L2phdmFzY3JpcHQiPjwvc2NyaXB0PjxzY3JpcHQgc3JjPSIvQ0NTL2pzL3BsdWdpbnMvcHVybC5qcyIgdHlwZT0idGV4dC9qYXZhc2NyaXB0Ij48L3NjcmlwdD48c2NyaXB0IHNyYz0iL0NDUy9qcy9VdGlscy5qcyIgdHlwZT0idGV4dC9qYXZhc2NyaXB0Ij48L3NjcmlwdD5kAgMPZBYKAgMPZBYGAgEPFgIfAQU6fi9NYWluLmFzcHg/U0tFWT0wMzIwYjFlY2E4NDYxMmM0OTEyOTE1ZGFlOWQxYTQ2NmM2YjIzNjQ0NGQCBQ8WAh4JaW5uZXJodG1sZWQCCQ8WAh8DBQ1UcmlwIFNob3BwaW5nZAIFD2QWBgIDDxYCHwEFOn4vTWFpbi5hc3B4P1NLRVk9MDMyMGIxZWNhODQ2MTJjNDkxMjkxNWRhZTlkMWE0NjZjNmIyMzY0NDRkAgUPFgIfAwUWSk9OQVRIQU4gSCBPVUdIT1VSTElBTmQCBw8WAh8DBQ1UcmlwIFNob3BwaW5nZAIJD2QWAmYPZBYCAgEPDxYCHwJlZGQCCw9kFgQCAQ8WAh8BBUkvQ0NTL0xvZ29mZjIuYXNweD9TS0VZPTAzMjBiMWVjYTg0NjEyYzQ5MTI5MTVkYWU5ZDFhNDY2YzZiMjM2NDQ0JkxvZ29mZj0xZAIDDxYCHwEFQS9DQ1MvTWVudXBhZ2UuYXNweD9TS0VZPTAzMjBiMWVjYTg0NjEyYzQ5MTI5MTVkYWU5ZDFhNDY2YzZiMjM2NDQ0ZAIPDxYCHwMFP0NvcHlyaWdodCAmY29weTsgMjAyNCBVbml0ZWQgQWlybGluZXMsIEluYy4gQWxsIFJpZ2h0cyBSZXNlcnZlZGRkZWBxXNmS3fcArMABc7WGYuFl9MM=',
         'SearchCriteriaStatus': 'show',
         'txtStartDate': bid_month[0],  # start date
@@ -124,7 +103,7 @@ def extract_ot_html(ot_url, cat, bid_month):
         'selSort': '1',
         'selSort2': '3',
         # 'chkBrief' : 'on', #single page - turned off to maintain pay time information
-        'txtNumPerPage': '499',  # limited to 499 per page
+        'txtNumPerPage': str(OT_PAGE_LIMIT),  # limited to 499 per page
         'Submitter': 'Display Pairings',
         'From': 'OT',
         'AdvertiseCount': '0',
@@ -136,39 +115,367 @@ def extract_ot_html(ot_url, cat, bid_month):
         '__VIEWSTATEGENERATOR': 'AA2A2EBD'
     }
 
-    ot_html = requests.post(url=ot_url, data=ot_url_payload,
-                            headers=requests.utils.default_headers()).text
+
+def extract_ot_html(ot_url, cat, bid_month, cache=None, session=None):
+    """
+    Extracts and returns the raw html text of the relevant category and bid month from the CCS -> Trading -> Open Time page
+    If an HtmlCache is given, a fresh cached page is returned instead of going to CCS. Fetched pages are saved to it
+    by the caller once they have parsed (see _extract_ot_range). In replay only mode a page missing from the cache
+    raises CacheMissError. Anything but a 200 from CCS raises requests.HTTPError (see ot_session.ccs_html)
+    With a CCSSession (ot_session) the request goes over its pooled connections with the session's current tokens
+    """
+    ot_url_payload = ot_payload(cat, bid_month)
+
+    if cache is not None:
+        ot_html = cache.lookup(cat, bid_month, ot_url_payload)
+        if ot_html is not None:
+            return ot_html
+
+    if session is not None:
+        ot_html = session.post(ot_url, ot_url_payload)
+    else:
+        ot_html = ccs_html(requests.post(url=ot_url, data=ot_url_payload,
+                                         headers=requests.utils.default_headers(), timeout=OT_REQUEST_TIMEOUT))
     return ot_html
 
 
-def extract_ot_list(skey, cat, bid_month):
+def ot_outcome(ot):
+    # What a per-category result means: 'ok', 'no trips' (empty with columns) or 'page error' (empty, no columns)
+    if not ot.empty:
+        return OUTCOME_OK
+    if set(OT_COMPACT_FORMAT).issubset(ot.columns):
+        return OUTCOME_NO_TRIPS
+    return OUTCOME_PAGE_ERROR
+
+
+def fetch_paced(fetch, scheduler, span=None, paced=True):
+    """Calls fetch() (returns raw html) under a RateScheduler: waits for a token before each attempt and retries
+    error pages, non-200 responses and failed requests after a backoff, up to scheduler.max_attempts tries.
+    Returns the html, or None if every attempt failed. CacheMissError is left to the caller.
+    Unpaced calls (pages served from a cache) skip the scheduler. Waits, network time, bytes and retries are
+    added to span (a CategorySpan) if given
+    """
+    if span is None:
+        span = CategorySpan(('', '', ''), None)
+
+    for attempt in range(scheduler.max_attempts):
+        if paced:
+            with span.timer('wait'):
+                if attempt:
+                    # Give CCS room before trying again
+                    scheduler.backoff(attempt)
+                scheduler.acquire()
+        start = time.perf_counter()
+        try:
+            with span.timer('network'):
+                raw_html = fetch()
+            span.add('bytes', len(raw_html.encode('utf-8')))
+        except requests.RequestException:
+            # Timeout, connection problem or a non-200 status (CCS throttling), counts as a bad attempt like an
+            # error page
+            raw_html = None
+        good_html = raw_html is not None and 'error occurred' not in raw_html
+        if paced:
+            scheduler.record(time.perf_counter() - start, good_html)
+        if good_html:
+            return raw_html
+        if attempt + 1 < scheduler.max_attempts:
+            span.add('retries', 1)
+    return None
+
+
+def extract_ot_list(skey, cat, bid_month, scheduler=None, cache=None, base_url=None, metrics=None, compact=False,
+                    parse_pool=None):
     """Takes a session key, category, bid month and returns a dataframe of open time
+    Requests are paced by a RateScheduler (the process wide default_scheduler() unless one is given), error pages
+    and failed requests are retried after a backoff, up to scheduler.max_attempts tries
+    If an HtmlCache is given, cached pages are parsed without waiting or going to CCS (see extract_ot_html)
+    base_url replaces CCS_BASE_URL, e.g. to scrape a local stand-in server
+    If a ScrapeMetrics is given, the category's waits, network, parse and transform times are recorded in it
+    With compact=True the dataframe has the OT_COMPACT_DTYPES schema instead of OT_DF_FORMAT
+    With a ParsePool (ot_pipeline) the category goes through the fetch -> parse pipeline (see iter_ot_lists)
     """
+    if scheduler is None:
+        scheduler = default_scheduler()
+    if parse_pool is not None:
+        for _, ot in _iter_ot_pipelined(skey, [cat], bid_month, OT_SHARDS, scheduler, cache, base_url, metrics,
+                                        compact, None, parse_pool):
+            return ot
+    span = metrics.span(cat, bid_month) if metrics is not None else CategorySpan(cat, bid_month)
+    ot, outcome = _extract_ot_list(skey, cat, bid_month, scheduler, cache, base_url, span, compact)
+    span.finish(outcome, len(ot))
+    scheduler.finish(outcome)
+    return ot
+
+
+def _extract_ot_list(skey, cat, bid_month, scheduler, cache, base_url, span, compact=False):
+    # Returns the dataframe and its outcome (see ot_scheduler.OUTCOMES)
+    dates = BID_CALENDAR.ddmmyy(bid_month)
+    ot, outcome = _extract_ot_range(skey, cat, dates, scheduler, cache, base_url, span, compact)
+    if outcome == OUTCOME_OK and len(ot) >= OT_PAGE_LIMIT:
+        # Full page, CCS may have cut the list short
+        ot, outcome = _extract_ot_shards(skey, cat, dates, scheduler, cache, base_url, span, compact)
+    return ot, outcome
+
+
+def _extract_ot_range(skey, cat, dates, scheduler, cache, base_url, span, compact=False):
+    # One page of open time for a (DDMMYY, DDMMYY) date range, retried on error pages. Returns (dataframe, outcome)
+    raw_html, cached, outcome = _fetch_ot_range(skey, cat, dates, scheduler, cache, base_url, span)
+    if raw_html is None:
+        return pd.DataFrame(), outcome
+    ot = parse_ot_html(raw_html, cat, span, compact)
+    return ot, _parsed_ot_range(ot, raw_html, cached, cat, dates, cache)
+
+
+def _fetch_ot_range(skey, cat, dates, scheduler, cache, base_url, span):
+    # The raw page for a (DDMMYY, DDMMYY) date range: (html, cached, None), or (None, cached, outcome) when there is
+    # no page to parse
+
+    # Read the cache once: a cached page needs no pacing or session, anything else is fetched from CCS
+    raw_html = None
+    if cache is not None:
+        try:
+            with span.timer('network'):
+                raw_html = cache.lookup(cat, dates, ot_payload(cat, dates))
+        except CacheMissError:
+            # Nothing to replay
+            return None, True, OUTCOME_NOT_CACHED
+    cached = raw_html is not None
+    # Shards of a category share the span, so pages are counted rather than flagged
+    span.add('pages', 1)
+
+    if cached:
+        span.add('cached_pages', 1)
+        span.add('bytes', len(raw_html.encode('utf-8')))
+    else:
+        # Create the OT URL with the session key, requests go through the key's pooled session
+        ot_url = ot_page_url(skey, base_url)
+        session = ccs_session(skey, base_url, scheduler)
+        raw_html = fetch_paced(lambda: extract_ot_html(ot_url, cat, dates, session=session), scheduler, span)
+        if raw_html is None:
+            # Error page on every attempt
+            return None, False, OUTCOME_GAVE_UP
+    return raw_html, cached, None
 
-    # Create the OT URL with the session key
-    ot_url = (f'https://ccs.ual.com/CCS/opentime.aspx?'
-              f'SKEY={skey}&CMS=False')
-
-    # Shamelessly stolen from CCS Reserve Scraper
-    max_attempts = 3
-    attempts = 1
-    raw_html = ''
-    while attempts <= max_attempts:
-        time.sleep(random.uniform(2, 4.5))
-        raw_html = extract_ot_html(ot_url, cat, BID_MONTHS[bid_month])
-        bad_html = 'error occurred' in raw_html
-        if bad_html:
-            attempts += 1
-            if attempts >= max_attempts:
-                return pd.DataFrame() # Return empty dataframe if we had an error
-        else:
-            # Used to be a warning here
-            break
+
+def _parsed_ot_range(ot, raw_html, cached, cat, dates, cache):
+    # Outcome of a parsed page. A page fetched from CCS is saved to the cache here, if it parsed: anything else is
+    # fetched again next time
+    outcome = ot_outcome(ot)
+    if cache is not None and not cached and outcome in (OUTCOME_OK, OUTCOME_NO_TRIPS):
+        cache.put(cat, dates, ot_payload(cat, dates), raw_html)
+    return outcome
+
+
+def split_date_range(dates, parts=OT_SHARDS):
+    # Splits a (DDMMYY, DDMMYY) range into up to parts consecutive, non-overlapping (DDMMYY, DDMMYY) sub-ranges
+    start, end = (datetime.strptime(d, '%d%m%y').date() for d in dates)
+    days = (end - start).days + 1
+    parts = max(1, min(parts, days))
+    bounds = [start + timedelta(days=days * i // parts) for i in range(parts + 1)]
+    return [(bounds[i].strftime('%d%m%y'), (bounds[i + 1] - timedelta(days=1)).strftime('%d%m%y'))
+            for i in range(parts)]
+
+
+def _extract_ot_shards(skey, cat, dates, scheduler, cache, base_url, span, compact=False):
+    """Fetches a category whose page hit OT_PAGE_LIMIT again as OT_SHARDS date sub-ranges at the same time,
+    splitting any sub-range that is still full, and merges them without duplicate (Pairing Number, Pairing Date).
+    Shards go through their own pool (the caller is usually a worker of iter_ot_lists) but share the scheduler.
+    A single day that is still full is kept and reported as OUTCOME_TRUNCATED
+    """
+    shards = split_date_range(dates)
+    if len(shards) == 1:
+        # Can't split a single day any further, this is as much as CCS will show
+        ot, outcome = _extract_ot_range(skey, cat, dates, scheduler, cache, base_url, span, compact)
+        return ot, OUTCOME_TRUNCATED if outcome == OUTCOME_OK else outcome
+
+    span.add('shards', len(shards))
+    with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+        results = list(pool.map(lambda d: _extract_ot_range(skey, cat, d, scheduler, cache, base_url, span, compact),
+                                shards))
+
+    frames = []
+    truncated = False
+    for shard, (ot, outcome) in zip(shards, results):
+        if outcome == OUTCOME_OK and len(ot) >= OT_PAGE_LIMIT:
+            ot, outcome = _extract_ot_shards(skey, cat, shard, scheduler, cache, base_url, span, compact)
+        if outcome not in (OUTCOME_OK, OUTCOME_NO_TRIPS, OUTCOME_TRUNCATED):
+            # A missing shard would leave holes in the category, report it like any failed page
+            return pd.DataFrame(), outcome
+        truncated = truncated or outcome == OUTCOME_TRUNCATED
+        frames.append(ot)
+    return _merge_shards(frames, truncated, compact)
+
+
+def _merge_shards(frames, truncated, compact=False):
+    # (dataframe, outcome) of a category from the frames of its date shards, without duplicate
+    # (Pairing Number, Pairing Date): overnight pairings at a boundary are listed in both shards
+    ot = concat_ot(frames)
+    if ot.empty:
+        return _no_trips_frame(compact), OUTCOME_NO_TRIPS
+    ot = ot.drop_duplicates(['Pairing Number', 'Pairing Date'], ignore_index=True)
+    return ot, OUTCOME_TRUNCATED if truncated else OUTCOME_OK
+
+
+def _no_trips_frame(compact=False):
+    # Empty dataframe in the correct format, to distinguish no trips from a page error
+    if compact:
+        return pd.DataFrame({c: pd.Series(dtype=t) for c, t in OT_COMPACT_DTYPES.items()})
+    return pd.DataFrame(columns=OT_DF_FORMAT)
+
+
+def _category_dtype(categories):
+    # OT_CATEGORY_DTYPE, extended with any categories that aren't in ALL_CATS
+    extra = sorted(set(categories) - set(OT_CATEGORY_DTYPE.categories))
+    if not extra:
+        return OT_CATEGORY_DTYPE
+    return pd.CategoricalDtype(sorted(list(OT_CATEGORY_DTYPE.categories) + extra))
+
+
+def compact_fits(values, column):
+    # True where values fit the small int type column (Days or Pay Minutes) has in OT_COMPACT_DTYPES
+    info = np.iinfo(OT_COMPACT_DTYPES[column])
+    values = pd.Series(values, copy=False)
+    return (values >= info.min) & (values <= info.max)
+
+
+def compact_ot(ot):
+    # OT_DF_FORMAT frame (or an already compact one) to the OT_COMPACT_DTYPES schema
+    # Raises ValueError if Days or Pay Minutes don't fit their small ints, rather than letting them wrap
+    if ot.empty and not set(OT_COMPACT_FORMAT).issubset(ot.columns):
+        return ot
+    for column in ('Days', 'Pay Minutes'):
+        fits = compact_fits(pd.to_numeric(ot[column]), column)
+        if not fits.all():
+            raise ValueError(f"{column} {ot[column][~fits].iloc[0]} doesn't fit the compact schema "
+                             f"({OT_COMPACT_DTYPES[column]})")
+    dtypes = dict(OT_COMPACT_DTYPES, Category=_category_dtype(ot['Category'].astype(str).unique()))
+    compact = ot[OT_COMPACT_FORMAT].copy()
+    for column in ('Pairing Date', 'Pairing End Date'):
+        compact[column] = pd.to_datetime(compact[column])
+    return compact.astype(dtypes)
+
+
+def with_pay_time(ot):
+    # Adds the h:mm Pay Time column (derived from Pay Minutes) if the frame doesn't have it, for display
+    if 'Pay Time' in ot.columns:
+        return ot
+    ot = ot.copy()
+    ot.insert(ot.columns.get_loc('Pay Minutes'), 'Pay Time', mins_to_durs(ot['Pay Minutes']).to_numpy())
+    return ot
+
+
+def expand_ot(ot):
+    # Compact frame back to OT_DF_FORMAT (datetime.date dates, Pay Time), e.g. for the CSV download
+    if ot.empty and not set(OT_COMPACT_FORMAT).issubset(ot.columns):
+        return ot
+    ot = with_pay_time(ot)
+    expanded = pd.DataFrame({
+        'Pairing Number': ot['Pairing Number'].astype(str),
+        'Category': ot['Category'].astype(str),
+        'Pairing Date': pd.to_datetime(ot['Pairing Date']).dt.date,
+        'Pairing End Date': pd.to_datetime(ot['Pairing End Date']).dt.date,
+        'Days': ot['Days'].astype('int64'),
+        'Pay Time': ot['Pay Time'],
+        'Pay Minutes': ot['Pay Minutes'].astype('int64'),
+    })
+    return expanded[OT_DF_FORMAT]
+
+
+def parse_ot_html(raw_html, cat, span=None, compact=False):
+    """Parses the raw html of an open time page into a dataframe with columns OT_DF_FORMAT
+    Uses the lxml parser (ot_parser), which only reads the pairing list and the pay blocks.
+    If no trips, returns an empty dataframe with OT_DF_FORMAT columns.
+    If it can't parse the page, returns an empty dataframe with no columns
+    Pairings with a value that can't be read are left out and counted on span (with examples), the rest are kept
+    Parse and transform times are added to span (a CategorySpan) if given
+    With compact=True the dataframe has the OT_COMPACT_DTYPES schema
+    """
+    if span is None:
+        span = CategorySpan(cat, None)
 
+    # Check if no trips
+    if 'No Records' in raw_html:
+        return _no_trips_frame(compact)
+
+    with span.timer('parse'):
+        page = parse_ot_page(raw_html)
+    if page is None:
+        # Issue parsing, possibly empty list or grabbed the wrong table
+        return pd.DataFrame()
+
+    with span.timer('transform'):
+        return _ot_page_to_frame(page, cat, compact, span)
+
+
+def _invalid_examples(page, bad_columns):
+    # 'pairing column=value' for each bad value, in page order
+    examples = []
+    for row in np.flatnonzero(np.logical_or.reduce([bad.to_numpy() for bad in bad_columns.values()])):
+        for column, bad in bad_columns.items():
+            if bad.iloc[row]:
+                examples.append(f"{page['Pairing Number'].iloc[row]} {column}={page[column].iloc[row]!r}")
+    return examples
+
+
+def _ot_page_to_frame(page, cat, compact=False, span=None):
+    # Raw page strings (see parse_ot_page) to the OT_DF_FORMAT frame
+
+    # For some unknown and annyoing reason, CCS Open Time 'Pay Time' doesn't include the deadhead time, so if there is DHD time we need to add it in
+    pay, bad_pay = ccs_to_mins(page['Pay'])
+    dhd, bad_dhd = ccs_to_mins(page['Deadhead'], missing=0)  # No DHD pay counts as 0
+    dates, bad_dates = ddmmyy_to_dates(page['Pairing Date'])
+    days, bad_days = to_days(page['Days'])
+    if compact:
+        # Values too big for the compact ints would wrap, they count as unreadable
+        bad_pay = bad_pay | ~compact_fits(pay + dhd, 'Pay Minutes')
+        bad_days = bad_days | ~compact_fits(days, 'Days')
+
+    bad = bad_pay | bad_dhd | bad_dates | bad_days
+    if bad.any():
+        # Only the pairings with values we can't read are left out, and recorded on the span
+        if span is not None:
+            span.add_invalid(int(bad.sum()), _invalid_examples(page, {
+                'Pay': bad_pay, 'Deadhead': bad_dhd, 'Pairing Date': bad_dates, 'Days': bad_days}))
+        if bad.all():
+            # Nothing on the page is in the format we expect
+            return pd.DataFrame()
+        keep = ~bad.to_numpy()
+        page, pay, dhd, dates, days = (x[keep].reset_index(drop=True) for x in (page, pay, dhd, dates, days))
+
+    ot = page[['Pairing Number']].copy()
+
+    # Add Category column
+    ot['Category'] = str(cat[0]) + str(cat[1]) + str(cat[2])
+
+    ot['Pay Minutes'] = pay + dhd
+
+    if compact:
+        ot['Category'] = ot['Category'].astype(_category_dtype(ot['Category'].iloc[:1]))
+        ot['Days'] = days
+        ot['Pairing Date'] = dates
+        ot['Pairing End Date'] = end_dates(dates, days)
+        return ot[OT_COMPACT_FORMAT].astype({c: t for c, t in OT_COMPACT_DTYPES.items() if c != 'Category'})
+
+    # Minutes back to duration (our formatting with a colon)
+    ot['Pay Time'] = mins_to_durs(ot['Pay Minutes'])
+
+    # Dates are kept as datetime.date objects
+    ot['Days'] = days
+    ot['Pairing Date'] = dates.dt.date
+    ot['Pairing End Date'] = end_dates(dates, days).dt.date
+
+    return ot[OT_DF_FORMAT]
+
+
+def parse_ot_html_read_html(raw_html, cat):
+    """Original pd.read_html based parser, kept to cross-check and benchmark parse_ot_html (see ot_parser.py)
+    Same return values as parse_ot_html
+    """
     # Check if no trips
     if 'No Records' in raw_html:
         # If no trips, return a dataframe in the correct format to distinguish from a page error
-        return pd.DataFrame(columns=OT_DF_FORMAT)
+        return _no_trips_frame()
 
     ot_display_html = io.StringIO(initial_value=raw_html)
     all_tables = pd.read_html(ot_display_html)
@@ -253,36 +560,484 @@ def extract_ot_list(skey, cat, bid_month):
     return ot
 
 
-def calculate_ot_totals(ot):
-    # Takes DataFrame of OT (with pay minutes) and returns a dataframe of totals per category
+
+def extract_ot_list_shared(shared, skey, cat, bid_month, scheduler=None, cache=None, base_url=None, metrics=None,
+                           compact=False, parse_pool=None):
+    """extract_ot_list through a SharedResults: a fresh result someone else scraped is handed back straight away,
+    a scrape of the same category and bid month already running is waited on instead of being repeated. Results
+    are kept per base URL, so a stand-in server's pages are never handed to a scrape of CCS or the other way round.
+    Page errors aren't kept, the next caller tries again. Categories served this way are recorded in metrics as
+    cached spans, with the time spent waiting on the other scrape as their wait
+    """
+    started = time.perf_counter()
+    ot, source = shared.get(_shared_key(cat, bid_month, compact, base_url),
+                            lambda: extract_ot_list(skey, cat, bid_month, scheduler, cache, base_url, metrics, compact,
+                                                    parse_pool),
+                            keep=_shared_keep)
+    if source != SHARED_FETCHED:
+        _shared_span(metrics, cat, bid_month, ot, started)
+    return ot
+
+
+def _shared_key(cat, bid_month, compact, base_url):
+    # SharedResults key of a category's open time
+    return tuple(cat), bid_month, compact, base_url or CCS_BASE_URL
+
+
+def _shared_keep(ot):
+    # Shared results worth handing to the next caller: page errors are tried again
+    return ot_outcome(ot) in (OUTCOME_OK, OUTCOME_NO_TRIPS)
+
+
+def _shared_span(metrics, cat, bid_month, ot, started):
+    # Records a category another scrape fetched as a cached span, the time spent waiting on that scrape as its wait
+    if metrics is not None:
+        span = metrics.span(cat, bid_month)
+        span.cached = True
+        span.add('wait', time.perf_counter() - started)
+        span.finish(ot_outcome(ot), len(ot))
+
+
+class _PipelinedCategory:
+    # A category on its way through _iter_ot_pipelined: its span, how many of its pages are still being fetched or
+    # parsed, the frames of those done, and the SharedResults claim it has to settle (if it fetches for others)
+
+    def __init__(self, cat, span, claim=None):
+        self.cat = cat
+        self.span = span
+        self.claim = claim
+        self.pending = 0
+        self.frames = []
+        self.sharded = False
+        self.truncated = False
+        self.failed = None
+
+    def add(self, dates, ot, outcome, split):
+        # Takes a page's frame and outcome, split(dates) is called to fetch a full page again as date shards
+        if self.failed is not None:
+            # A page already failed, the category is a page error whatever the rest say
+            return
+        if outcome == OUTCOME_OK and len(ot) >= OT_PAGE_LIMIT:
+            # Full page, CCS may have cut the list short
+            shards = split_date_range(dates)
+            if len(shards) > 1:
+                self.sharded = True
+                self.span.add('shards', len(shards))
+                for shard in shards:
+                    split(shard)
+                return
+            # Can't split a single day any further, this is as much as CCS will show
+            self.truncated = True
+        elif outcome not in (OUTCOME_OK, OUTCOME_NO_TRIPS):
+            # A missing page would leave holes in the category, report it like any failed page
+            self.failed = outcome
+            return
+        self.frames.append(ot)
+
+    def result(self, compact):
+        # (dataframe, outcome) once no pages are pending, as _extract_ot_list returns them
+        if self.failed is not None:
+            return pd.DataFrame(), self.failed
+        if self.sharded:
+            return _merge_shards(self.frames, self.truncated, compact)
+        ot = self.frames[0]
+        return ot, OUTCOME_TRUNCATED if self.truncated else ot_outcome(ot)
+
+
+def _iter_ot_pipelined(skey, cats, bid_month, max_in_flight, scheduler, cache, base_url, metrics, compact, shared,
+                       parse_pool):
+    # iter_ot_lists with a ParsePool: fetch threads -> parse processes -> this generator, which collects the frames,
+    # caches the pages that parsed, shards the full ones and yields each category once its last page is in
+    dates = BID_CALENDAR.ddmmyy(bid_month)
+    # What comes back from the other stages, in the order it's ready:
+    # ('page', category, date range, raw html to cache or None, cached, Future of the frame / outcome / error)
+    # ('shared', cat, time started, Future of a result another scrape is fetching)
+    done = queue.Queue()
+    fetch_pool = ThreadPoolExecutor(max_workers=max(1, max_in_flight))
+    fetches = []
+    collected = 0
+    claimed = {}  # cat -> _PipelinedCategory fetching for a SharedResults claim, until settled
+
+    def fetch(category, page_dates):
+        # Runs in a fetch thread: gets the page and hands it to the parse pool without waiting for the frame
+        try:
+            raw_html, cached, outcome = _fetch_ot_range(skey, category.cat, page_dates, scheduler, cache, base_url,
+                                                        category.span)
+            if raw_html is None:
+                done.put(('page', category, page_dates, None, cached, outcome))
+                return
+            frame = parse_pool.submit(raw_html, category.cat, category.span, compact)
+        except requests.RequestException:
+            # Connection problem, treat it like a page error
+            done.put(('page', category, page_dates, None, False, OUTCOME_PAGE_ERROR))
+            return
+        except BaseException as e:
+            done.put(('page', category, page_dates, None, False, e))
+            return
+        # The raw page is only held on to if it is to be cached once it has parsed
+        keep_html = raw_html if cache is not None and not cached else None
+        frame.add_done_callback(lambda f: done.put(('page', category, page_dates, keep_html, cached, f)))
+
+    def start(category, page_dates):
+        category.pending += 1
+        fetches.append(fetch_pool.submit(fetch, category, page_dates))
+
+    try:
+        remaining = 0
+        for cat in cats:
+            started = time.perf_counter()
+            claim = None
+            if shared is not None:
+                source, value = shared.claim(_shared_key(cat, bid_month, compact, base_url))
+                if source != SHARED_FETCHED:
+                    if source == SHARED_HIT:
+                        value, result = Future(), value
+                        value.set_result(result)
+                    value.add_done_callback(lambda f, cat=cat, started=started: done.put(('shared', cat, started, f)))
+                    remaining += 1
+                    continue
+                claim = value
+            span = metrics.span(cat, bid_month) if metrics is not None else CategorySpan(cat, bid_month)
+            category = _PipelinedCategory(cat, span, claim)
+            if claim is not None:
+                claimed[cat] = category
+            start(category, dates)
+            remaining += 1
+
+        while remaining:
+            item = done.get()
+            if item[0] == 'shared':
+                _, cat, started, result = item
+                try:
+                    ot = result.result()
+                except requests.RequestException:
+                    ot = pd.DataFrame()
+                _shared_span(metrics, cat, bid_month, ot, started)
+                remaining -= 1
+                yield cat, ot
+                continue
+
+            _, category, page_dates, raw_html, cached, parsed = item
+            collected += 1
+            category.pending -= 1
+            # parsed is the Future of the page's frame, or whatever stopped the page before it got to a parser
+            if isinstance(parsed, BaseException):
+                raise parsed
+            if isinstance(parsed, Future):
+                parse_pool.release()
+                ot = parsed.result()
+                outcome = _parsed_ot_range(ot, raw_html, cached, category.cat, page_dates, cache)
+            else:
+                ot, outcome = pd.DataFrame(), parsed
+            category.add(page_dates, ot, outcome, lambda shard: start(category, shard))
+            if category.pending:
+                continue
+
+            ot, outcome = category.result(compact)
+            category.span.finish(outcome, len(ot))
+            scheduler.finish(outcome)
+            if category.claim is not None:
+                shared.settle(_shared_key(category.cat, bid_month, compact, base_url), category.claim, ot,
+                              _shared_keep)
+                del claimed[category.cat]
+            remaining -= 1
+            yield category.cat, ot
+    finally:
+        # Closed early (or failed): nothing new is fetched, and the pages already out are collected so their parse
+        # slots go back to the pool
+        fetch_pool.shutdown(wait=False, cancel_futures=True)
+        outstanding = sum(not f.cancelled() for f in fetches) - collected
+        while outstanding > 0:
+            item = done.get()
+            if item[0] == 'page':
+                outstanding -= 1
+                if isinstance(item[-1], Future):
+                    parse_pool.release()
+        # Whoever waits on a category this scrape didn't finish gets a page error, and the next caller tries again
+        for cat, category in claimed.items():
+            shared.settle(_shared_key(cat, bid_month, compact, base_url), category.claim, pd.DataFrame(),
+                          _shared_keep)
+
+
+def iter_ot_lists(skey, cats, bid_month, max_in_flight=OT_MAX_IN_FLIGHT, scheduler=None, cache=None, base_url=None,
+                  metrics=None, compact=False, shared=None, parse_pool=None):
+    """Fetches the open time of several categories through a bounded pool of workers and yields (cat, dataframe)
+    as each category finishes, so callers can use rows as they arrive instead of waiting for the whole scrape.
+    All workers share one RateScheduler, so the request rate to CCS is the same however many are in flight.
+    Each dataframe is in the same shape as extract_ot_list (OT_DF_FORMAT columns, empty with columns if no trips,
+    empty without columns on a page error, OT_COMPACT_DTYPES with compact=True). An HtmlCache can be given to
+    serve/record pages (see extract_ot_html), and a ScrapeMetrics to record per-category timings.
+    With a SharedResults, categories other scrapes in the process have fetched (or are fetching) are shared
+    (see extract_ot_list_shared).
+    With a ParsePool (ot_pipeline) the scrape is a pipeline: the workers only fetch, handing each page to the
+    pool's processes and going straight on to the next, and the frames are collected here as they are parsed -
+    this is where pages are cached, outcomes worked out and full pages sent back to be fetched as date shards.
+    The pool's slots bound the pages between fetching and collecting (see ParsePool).
+    Closing the generator early cancels the categories that haven't started.
+    """
+    if scheduler is None:
+        scheduler = default_scheduler()
+    if parse_pool is not None:
+        yield from _iter_ot_pipelined(skey, cats, bid_month, max_in_flight, scheduler, cache, base_url, metrics,
+                                      compact, shared, parse_pool)
+        return
+
+    pool = ThreadPoolExecutor(max_workers=max(1, max_in_flight))
+    try:
+        if shared is None:
+            futures = {pool.submit(extract_ot_list, skey, cat, bid_month, scheduler, cache, base_url, metrics,
+                                   compact): cat for cat in cats}
+        else:
+            futures = {pool.submit(extract_ot_list_shared, shared, skey, cat, bid_month, scheduler, cache, base_url,
+                                   metrics, compact): cat for cat in cats}
+        for future in as_completed(futures):
+            cat = futures[future]
+            try:
+                ot = future.result()
+            except requests.RequestException:
+                # Connection problem, treat it like a page error
+                ot = pd.DataFrame()
+            yield cat, ot
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def extract_ot_lists(skey, cats, bid_month, max_in_flight=OT_MAX_IN_FLIGHT, scheduler=None, callback=None,
+                     cache=None, base_url=None, metrics=None, compact=False, shared=None, parse_pool=None):
+    """Fetches the open time of several categories concurrently (see iter_ot_lists)
+    Returns a dict {cat: dataframe} in the order of cats.
+    If given, callback(cat, ot) is called from the calling thread as each category finishes.
+    """
+    results = {}
+    for cat, ot in iter_ot_lists(skey, cats, bid_month, max_in_flight, scheduler, cache, base_url, metrics, compact,
+                                 shared, parse_pool):
+        results[cat] = ot
+        if callback is not None:
+            callback(cat, ot)
+
+    # Keep the caller's category order
+    return {cat: results[cat] for cat in cats}
+
+
+def concat_ot(frames):
+    # The one concatenation of per-category results, skipping the empty ones (no trips or page error)
+    found = [ot for ot in frames if not ot.empty]
+    return pd.concat(found, ignore_index=True) if found else pd.DataFrame()
+
+
+def calculate_ot_totals(ot, cube=None, metrics=None):
+    # Takes DataFrame of OT (with pay minutes, either schema) and returns a dataframe of totals per category
     # Resulting DataFrame format: Category | Trip Count | Total Credit | Pay Minutes
+    # Read off the aggregate cube (see ot_aggregate), pass it in if it's already built
     if ot.empty:
         return pd.DataFrame()
 
-    grouped = ot.groupby('Category')
+    with metrics.stage('totals') if metrics is not None else nullcontext():
+        if cube is None:
+            cube = build_ot_cube(ot)
+
+        return rollup(cube, 'Category')[['Trip Count', 'Total Credit', 'Pay Minutes']]
+
+
+def initialize_session(skey, base_url=None, metrics=None):
+    # Checks the session key on the open time page and returns its pooled CCSSession (see ot_session), with the
+    # page's tokens harvested ready for the scrape. Raises ValueError if the session isn't valid
+    ot_url = ot_page_url(skey, base_url)
+
+    with metrics.stage('session') if metrics is not None else nullcontext():
+        return ccs_session(skey, base_url).open(ot_url)
+
+
+# COMMAND LINE
+
+
+def select_cats(bases=None, fleets=None, seats=None):
+    # Filters ALL_CATS down to the given bases, fleets and seats (None means all)
+    return [c for c in ALL_CATS
+            if (not bases or c[0] in bases) and (not fleets or c[1] in fleets) and (not seats or c[2] in seats)]
+
+
+class OTFileWriter:
+    """Writes open time to a CSV or Parquet file one category at a time, so a scrape never has to be held in memory
+    CSV matches the Streamlit download (and upload) format. Parquet needs pyarrow, each category is a row group
+    """
+
+    def __init__(self, path, file_format='csv'):
+        self.path = Path(path)
+        self.file_format = file_format
+        self.rows = 0
+        self._writer = None
+        self._header = True
+
+    def write(self, ot):
+        if ot.empty:
+            return
+        if self.file_format == 'parquet':
+            # Optional dependency, only needed for parquet output
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(ot, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        else:
+            ot.to_csv(self.path, mode='w' if self._header else 'a', header=self._header, index=False)
+            self._header = False
+        self.rows += len(ot)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def scrape_to_files(skey, cats, bid_months, out_dir, file_format='csv', max_in_flight=OT_MAX_IN_FLIGHT,
+                    cache=None, base_url=None, metrics=None, scheduler=None, compact=False, log=print,
+                    parse_pool=None, history=None):
+    """Scrapes each bid month's categories and streams the rows to <out_dir>/<bid month>.<format>
+    compact=True scrapes into the compact schema (Parquet keeps it, typed and without Pay Time)
+    With a ParsePool, pages are parsed in its processes while the workers fetch the next ones (see iter_ot_lists)
+    With an OTHistory (ot_history), each bid month is also appended to it as one snapshot once its categories are
+    done (failed categories left out)
+    Returns a summary dict per bid month: categories, rows, no trips, errors, seconds
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # One request rate for the whole run
+    if scheduler is None:
+        scheduler = RateScheduler()
+
+    summary = {}
+    for bid_month in bid_months:
+        writer = OTFileWriter(out_dir / f'{bid_month}.{file_format}', file_format)
+        stats = {'categories': 0, 'rows': 0, 'no trips': 0, 'errors': 0}
+        start = time.perf_counter()
+        taken = pd.Timestamp.now('UTC').tz_localize(None)
+        # For the history: the bid month's rows and the categories they cover, appended in one go at the end
+        history_frames, history_cats = [], []
+        try:
+            for cat, ot in iter_ot_lists(skey, cats, bid_month, max_in_flight, scheduler, cache, base_url, metrics,
+                                         compact, parse_pool=parse_pool):
+                stats['categories'] += 1
+                outcome = ot_outcome(ot)
+                if outcome == OUTCOME_OK:
+                    writer.write(ot)
+                elif outcome == OUTCOME_NO_TRIPS:
+                    stats['no trips'] += 1
+                if history is not None and outcome in (OUTCOME_OK, OUTCOME_NO_TRIPS):
+                    history_frames.append(compact_ot(ot))
+                    history_cats.append(cat)
+                if outcome not in (OUTCOME_OK, OUTCOME_NO_TRIPS):
+                    stats['errors'] += 1
+                    log(f'{bid_month} {cat[0]}{cat[1]}{cat[2]}: {outcome}')
+        finally:
+            writer.close()
+        if history_cats:
+            # One snapshot file per base partition, rather than one per category
+            history.append(concat_ot(history_frames), bid_month, taken, categories=history_cats)
+        stats['rows'] = writer.rows
+        stats['seconds'] = time.perf_counter() - start
+        summary[bid_month] = stats
+
+    return summary
+
+
+def format_run_summary(summary):
+    # One line per bid month plus a total line, with throughput
+    lines = []
+    total = {'categories': 0, 'rows': 0, 'no trips': 0, 'errors': 0, 'seconds': 0.0}
+    for bid_month, stats in summary.items():
+        lines.append(_format_stats(bid_month, stats))
+        for k in total:
+            total[k] += stats[k]
+    if len(summary) > 1:
+        lines.append(_format_stats('TOTAL', total))
+    return '\n'.join(lines)
+
+
+def _format_stats(label, stats):
+    seconds = max(stats['seconds'], 1e-9)
+    return (f"{label}: {stats['categories']} categories, {stats['rows']} rows, "
+            f"{stats['no trips']} with no trips, {stats['errors']} errors in {stats['seconds']:.1f}s "
+            f"({stats['categories'] / seconds * 60:.1f} categories/min, {stats['rows'] / seconds:.1f} rows/s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Scrape CCS open time for one or more bid months without the Streamlit app')
+    parser.add_argument('bid_months', nargs='+', choices=BID_CALENDAR.names(), metavar='BID_MONTH',
+                        help=f'Bid months to scrape, e.g. {" ".join(BID_CALENDAR.upcoming())}')
+    parser.add_argument('--skey', help='CCS session key (prompted for a CCS URL if not given)')
+    parser.add_argument('--base', nargs='+', choices=list(BASES_W_FLEETS), help='Bases (default all)')
+    parser.add_argument('--fleet', nargs='+', choices=sorted(EQUIP_FOR_OT), help='Fleets (default all)')
+    parser.add_argument('--seat', nargs='+', choices=SEATS, help='Seats (default both)')
+    parser.add_argument('--out-dir', default='.', help='Directory the files are written to')
+    parser.add_argument('--format', default='csv', choices=('csv', 'parquet'), help='Output file format')
+    parser.add_argument('--max-in-flight', type=int, default=OT_MAX_IN_FLIGHT,
+                        help='Categories fetched at the same time')
+    parser.add_argument('--compact', action='store_true',
+                        help='Write the compact schema (categorical Category, typed dates, no Pay Time)')
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help=f'Parse pages in this many processes (0 = in the fetch threads, {PARSE_WORKERS} '
+                             f'would use every core but one)')
+    parser.add_argument('--rate', type=float, default=SCHED_RATE, help='Requests per second to start at')
+    parser.add_argument('--max-rate', type=float, default=SCHED_MAX_RATE,
+                        help='Requests per second the rate can adapt up to')
+    parser.add_argument('--cache-dir', help='Keep raw pages in this html cache')
+    parser.add_argument('--cache-ttl', type=int, help='Seconds a cached page stays fresh')
+    parser.add_argument('--replay', action='store_true', help='Only use cached pages, never go to CCS')
+    parser.add_argument('--base-url', help=f'CCS root URL (default {CCS_BASE_URL})')
+    parser.add_argument('--history', help='Also append each bid month as a snapshot to this history directory')
+    parser.add_argument('--report', help='Write a JSON report of per-category timings to this file')
+    parser.add_argument('--metrics-file', help='Write Prometheus text metrics to this file when done')
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus text metrics on this port while running')
+    parser.add_argument('--metrics-host', default='127.0.0.1',
+                        help='Address to serve metrics on (default 127.0.0.1, 0.0.0.0 for all interfaces)')
+    args = parser.parse_args(argv)
 
-    # Save results in a dictionary for now
-    ot_totals = {}
+    cache = None
+    if args.cache_dir or args.replay:
+        cache = HtmlCache(args.cache_dir or OT_CACHE_DIR,
+                          args.cache_ttl if args.cache_ttl is not None else OT_CACHE_TTL, args.replay)
 
-    # Go through each category and sum pay times
-    for cat, ot_list in grouped:
-        total = ot_list['Pay Minutes'].sum()
-        # Trip Count, Total Credit, Pay Minutes
-        ot_totals[cat] = [len(ot_list), mins_to_dur(total), total]
+    cats = select_cats(args.base, args.fleet, args.seat)
+    if not cats:
+        parser.error('No categories match the base/fleet/seat filters')
 
-    # Convert our dictionary to a dataframe
-    df = pd.DataFrame.from_dict(ot_totals, orient='index',
-                                columns=['Trip Count', 'Total Credit', 'Pay Minutes'])
-    df.index.name = 'Category'
+    metrics = ScrapeMetrics()
+    if args.metrics_port:
+        serve_metrics(metrics, args.metrics_port, args.metrics_host)
 
-    return df
+    if args.replay:
+        skey = args.skey or ''
+    else:
+        skey = args.skey or skey_from_user()
+        initialize_session(skey, args.base_url, metrics)
 
+    scheduler = RateScheduler(args.rate, max_rate=args.max_rate)
+    history = None
+    if args.history:
+        # ot_history builds on this module
+        from ot_history import OTHistory
+        history = OTHistory(args.history)
+    with ParsePool(args.parse_workers) if args.parse_workers > 0 else nullcontext() as parse_pool:
+        summary = scrape_to_files(skey, cats, args.bid_months, args.out_dir, args.format, args.max_in_flight, cache,
+                                  args.base_url, metrics, scheduler, args.compact, parse_pool=parse_pool,
+                                  history=history)
+    print(format_run_summary(summary))
+    sched = scheduler.snapshot()
+    print(f"Requests: {sched['requests']} ({sched['bad']} bad, {sched['slow']} slow), "
+          f"rate ended at {sched['rate']:.2f}/s")
 
-def initialize_session(skey):
-    session = requests.Session()
+    if args.report:
+        with open(args.report, 'w') as f:
+            f.write(metrics.to_json(indent=2))
+    if args.metrics_file:
+        with open(args.metrics_file, 'w') as f:
+            f.write(metrics.to_prometheus())
+    # Non-zero exit if any category failed, so cron notices
+    return 1 if any(stats['errors'] for stats in summary.values()) else 0
 
-    ot_url = (f'https://ccs.ual.com/CCS/opentime.aspx?'
-              f'SKEY={skey}&CMS=False')
 
-    if (session.get(ot_url, verify=False, headers=requests.utils.default_headers()).status_code != 200):
-        raise ValueError(msg='Session is not valid!')
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,154 @@
+# Python Standard Library imports
+import threading
+import time
+
+# Third Party Imports
+import lxml.html
+import requests
+from requests.adapters import HTTPAdapter
+
+# Local Imports
+from ua_scrapers_ref import CCS_BASE_URL
+from ot_cache import VOLATILE_PAYLOAD_KEYS
+
+# One pooled, keep-alive HTTP session per CCS session key. Every request of a scrape goes through it, so the
+# categories reuse a handful of open connections instead of paying a TCP+TLS handshake each, and every POST carries
+# the ASP.NET tokens (__VIEWSTATE and friends) the page handed out this session rather than the ones recorded in the
+# payloads months ago. An error page is taken as a sign the tokens went stale: they are harvested again before the
+# retry. Harvests are requests to CCS too, so they wait for the scrape's RateScheduler like the pages do.
+# Sessions are shared by all the worker threads of a scrape (and by the PI and RSV engines).
+
+# CONSTANTS
+
+# Connections kept open per host, enough for the fetch workers plus the shards of a full category
+SESSION_POOL_SIZE = 16
+
+# A session nobody has used for this long (seconds) is closed the next time a session is handed out
+SESSION_IDLE = 30 * 60
+
+# Seconds to wait for CCS
+SESSION_TIMEOUT = 30
+
+
+def ccs_html(response):
+    # Raw html of a CCS response. Anything but a 200 (429 and 5xx when CCS is pushing back) raises
+    # requests.HTTPError, a RequestException, so fetch_paced counts it as a bad attempt and backs off
+    if response.status_code != 200:
+        raise requests.HTTPError(f'{response.status_code} from {response.url}', response=response)
+    return response.text
+
+
+def harvest_tokens(raw_html):
+    # The hidden ASP.NET token fields (VOLATILE_PAYLOAD_KEYS) of a page, as {name: value}
+    doc = lxml.html.fromstring(raw_html)
+    tokens = {}
+    for field in doc.xpath('//input[@type="hidden"][@name]'):
+        if field.get('name') in VOLATILE_PAYLOAD_KEYS:
+            tokens[field.get('name')] = field.get('value', '')
+    return tokens
+
+
+class CCSSession:
+    """Pooled keep-alive requests.Session for one session key, plus the ASP.NET tokens of each page it has posted to
+
+    post(url, payload) sends the payload with the page's current tokens in place of the recorded ones, harvesting
+    them with a GET the first time a page is used. When CCS answers with an error page the tokens are harvested
+    again (once, however many workers saw the error) and the error page is returned, so the caller's retry goes
+    out with fresh ones. With a scheduler (ot_scheduler.RateScheduler) every harvest waits for a token and is
+    recorded like a page request. Thread safe
+    """
+
+    def __init__(self, skey, base_url=None, pool_size=SESSION_POOL_SIZE, timeout=SESSION_TIMEOUT, scheduler=None):
+        self.skey = skey
+        self.base_url = base_url or CCS_BASE_URL
+        self.timeout = timeout
+        self.scheduler = scheduler
+        self.last_used = time.monotonic()
+        self.refreshes = 0
+        self._http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._http.mount('https://', adapter)
+        self._http.mount('http://', adapter)
+        self._tokens = {}  # page url -> tokens
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        self.last_used = time.monotonic()
+        return self._http.get(url, timeout=self.timeout)
+
+    def _refresh(self, url, seen=None):
+        # Harvests the tokens of a page, unless another thread already replaced the ones the caller used (seen)
+        with self._lock:
+            current = self._tokens.get(url)
+            if current is not None and current is not seen:
+                return current
+            tokens = harvest_tokens(self._paced_get(url))
+            self._tokens[url] = tokens
+            self.refreshes += 1
+            return tokens
+
+    def _paced_get(self, url):
+        # Html of a GET under the scheduler (if there is one), counted as good or bad like a page
+        scheduler = self.scheduler
+        if scheduler is None:
+            return ccs_html(self.get(url))
+        scheduler.acquire()
+        start = time.perf_counter()
+        ok = False
+        try:
+            raw_html = ccs_html(self.get(url))
+            ok = 'error occurred' not in raw_html
+            return raw_html
+        finally:
+            scheduler.record(time.perf_counter() - start, ok)
+
+    def tokens(self, url):
+        # Current tokens of a page, harvested on first use
+        tokens = self._tokens.get(url)
+        return tokens if tokens is not None else self._refresh(url)
+
+    def open(self, url):
+        """Checks the session key is good on a page (harvesting its tokens on the way)
+        Raises ValueError if CCS doesn't answer with the page
+        """
+        response = self.get(url)
+        if response.status_code != 200:
+            raise ValueError('Session is not valid!')
+        with self._lock:
+            self._tokens[url] = harvest_tokens(response.text)
+        return self
+
+    def post(self, url, payload):
+        # Raw html of a POST to a page, with its current tokens
+        tokens = self.tokens(url)
+        self.last_used = time.monotonic()
+        raw_html = ccs_html(self._http.post(url, data={**payload, **tokens}, timeout=self.timeout))
+        if 'error occurred' in raw_html:
+            # Most likely stale tokens, get new ones for the retry
+            self._refresh(url, seen=tokens)
+        return raw_html
+
+    def close(self):
+        self._http.close()
+
+
+# Sessions handed out by ccs_session, by (session key, base url)
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def ccs_session(skey, base_url=None, scheduler=None):
+    # The process wide CCSSession of a session key, created on first use. Idle ones are closed on the way.
+    # A scheduler given here paces the session's token harvests from now on (the latest scrape's scheduler)
+    key = (skey, base_url or CCS_BASE_URL)
+    now = time.monotonic()
+    with _sessions_lock:
+        for other in [k for k, s in _sessions.items() if k != key and now - s.last_used > SESSION_IDLE]:
+            _sessions.pop(other).close()
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = CCSSession(skey, base_url)
+        if scheduler is not None:
+            session.scheduler = scheduler
+        session.last_used = now
+        return session
@@ -0,0 +1,114 @@
+# Python Standard Library imports
+import threading
+import time
+from concurrent.futures import Future
+
+# Results shared between everyone scraping in the same process (all the Streamlit sessions of one server).
+# Open time for a category and bid month is the same whoever asks, so a finished result is kept for a freshness
+# window and handed to later callers, and a fetch that is already running is waited on instead of being repeated:
+# around bid close several users asking for the same bases cost CCS one set of requests.
+
+# CONSTANTS
+
+# How long (seconds) a shared result stays fresh. Open time moves quickly around bid close, keep this short
+SHARED_TTL = 5 * 60
+
+# Where a result came from
+SHARED_FETCHED = 'fetched'  # This caller fetched it
+SHARED_HIT = 'hit'          # A fresh result someone else fetched
+SHARED_WAITED = 'waited'    # Someone else was fetching it, this caller waited for that fetch
+
+
+class SharedResults:
+    """Thread safe, process wide results keyed by any hashable key (the engine uses
+    (cat, bid month, compact, base URL))
+
+    get(key, fetch) returns a fresh stored result, waits on a fetch of the same key already in flight, or runs
+    fetch() itself with other callers of the key waiting on it. Only results keep(result) accepts are stored
+    (so page errors are tried again by the next caller), but waiters get whatever the fetch returned or raised.
+    claim(), settle() and fail() are the same steps for callers that can't block on a fetch (the parse pipeline).
+    Results are shared objects: treat them as read-only.
+    """
+
+    def __init__(self, ttl=SHARED_TTL):
+        self.ttl = ttl
+        self._results = {}   # key -> (time stored, result)
+        self._in_flight = {}  # key -> Future of the running fetch
+        self._lock = threading.Lock()
+
+    def _fresh(self, stored):
+        return self.ttl is None or (time.time() - stored) <= self.ttl
+
+    def get(self, key, fetch, keep=None):
+        """Result for key, fetching it (at most once at a time across threads) if there is no fresh one
+        Returns (result, source) with source SHARED_FETCHED, SHARED_HIT or SHARED_WAITED
+        """
+        source, value = self.claim(key)
+        if source == SHARED_HIT:
+            return value, source
+        if source == SHARED_WAITED:
+            return value.result(), source
+
+        try:
+            result = fetch()
+        except BaseException as e:
+            self.fail(key, value, e)
+            raise
+        self.settle(key, value, result, keep)
+        return result, SHARED_FETCHED
+
+    def claim(self, key):
+        """get() without blocking. Returns (source, value): (SHARED_HIT, the stored result), (SHARED_WAITED, Future
+        of the fetch in flight) or (SHARED_FETCHED, Future): the caller now fetches the key, and has to settle() or
+        fail() that Future when done
+        """
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None and self._fresh(entry[0]):
+                return SHARED_HIT, entry[1]
+            future = self._in_flight.get(key)
+            if future is not None:
+                return SHARED_WAITED, future
+            future = self._in_flight[key] = Future()
+            return SHARED_FETCHED, future
+
+    def settle(self, key, future, result, keep=None):
+        # Ends a claimed fetch with its result: stored if keep(result) accepts it, and handed to the waiters
+        with self._lock:
+            del self._in_flight[key]
+            if keep is None or keep(result):
+                # Storing is the time to let go of stale results, so the dict doesn't grow with every bid month
+                self._drop_stale()
+                self._results[key] = (time.time(), result)
+        future.set_result(result)
+
+    def fail(self, key, future, error):
+        # Ends a claimed fetch that raised, the waiters get the error and nothing is stored
+        with self._lock:
+            del self._in_flight[key]
+        future.set_exception(error)
+
+    def in_flight(self):
+        # Keys being fetched right now
+        with self._lock:
+            return list(self._in_flight)
+
+    def _drop_stale(self):
+        # Call with the lock held
+        stale = [key for key, (stored, _) in self._results.items() if not self._fresh(stored)]
+        for key in stale:
+            del self._results[key]
+        return len(stale)
+
+    def purge(self):
+        # Drops the results that are no longer fresh, returns how many went
+        with self._lock:
+            return self._drop_stale()
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._results)
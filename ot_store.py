@@ -0,0 +1,100 @@
+# Third Party Imports
+import numpy as np
+import pandas as pd
+
+
+def _to_days(dates):
+    # datetime.date / datetime64 column to a datetime64[D] array
+    return pd.to_datetime(pd.Series(dates, copy=False)).to_numpy(dtype='datetime64[D]')
+
+
+class TripStore:
+    """In-memory open time trip list with prebuilt indexes, so filters don't copy or rescan the whole list.
+
+    The trips are held once, sorted by Category then Pairing Date, which makes every category a contiguous
+    block: a category on its own is answered with a slice of the stored frame (a view, nothing is copied).
+    Sorted start and end dates answer interval queries (trips overlapping a day, trips ending after a day
+    i.e. carrying over a month end) with binary searches; only the matching rows are ever materialized.
+    """
+
+    def __init__(self, ot):
+        if ot.empty:
+            self.ot = ot
+        else:
+            self.ot = ot.sort_values(['Category', 'Pairing Date'], kind='stable', ignore_index=True)
+
+        # Category -> [start, stop) row range
+        self._cat_bounds = {}
+        if not self.ot.empty:
+            cats = self.ot['Category'].to_numpy()
+            breaks = np.flatnonzero(cats[1:] != cats[:-1]) + 1
+            starts = np.concatenate(([0], breaks))
+            stops = np.concatenate((breaks, [len(cats)]))
+            self._cat_bounds = {cats[a]: (a, b) for a, b in zip(starts, stops)}
+
+        # Sorted dates for interval queries
+        if self.ot.empty:
+            self._start = self._end = np.array([], dtype='datetime64[D]')
+        else:
+            self._start = _to_days(self.ot['Pairing Date'])
+            self._end = _to_days(self.ot['Pairing End Date'])
+        self._start_order = np.argsort(self._start, kind='stable')
+        self._start_sorted = self._start[self._start_order]
+        self._end_order = np.argsort(self._end, kind='stable')
+        self._end_sorted = self._end[self._end_order]
+
+    def __len__(self):
+        return len(self.ot)
+
+    @property
+    def categories(self):
+        # Sorted list of the categories in the store
+        return list(self._cat_bounds)
+
+    def category_rows(self, category):
+        # Row range [start, stop) of a category, empty if it isn't in the store
+        return self._cat_bounds.get(category, (0, 0))
+
+    def starting_by(self, day):
+        # Row positions (unsorted) of trips starting on or before day
+        return self._start_order[:np.searchsorted(self._start_sorted, np.datetime64(day, 'D'), side='right')]
+
+    def ending_after(self, day):
+        # Row positions (unsorted) of trips ending after day, e.g. carryover past the end of a bid month
+        return self._end_order[np.searchsorted(self._end_sorted, np.datetime64(day, 'D'), side='right'):]
+
+    def overlapping(self, day):
+        # Row positions (unsorted) of trips flying on day
+        starts = self.starting_by(day)
+        return starts[self._end[starts] >= np.datetime64(day, 'D')]
+
+    def positions(self, category=None, overlaps=None, ends_after=None):
+        """Sorted row positions matching every given filter, or None if no filter was given
+        """
+        if overlaps is None and ends_after is None:
+            if category is None:
+                return None
+            return np.arange(*self.category_rows(category))
+
+        rows = None
+        if overlaps is not None:
+            rows = self.overlapping(overlaps)
+        if ends_after is not None:
+            after = self.ending_after(ends_after)
+            rows = after if rows is None else np.intersect1d(rows, after, assume_unique=True)
+        if category is not None:
+            a, b = self.category_rows(category)
+            rows = rows[(rows >= a) & (rows < b)]
+        return np.sort(rows)
+
+    def query(self, category=None, overlaps=None, ends_after=None):
+        """Trips matching every given filter (category name, day the trip overlaps, day the trip ends after)
+        No filter returns the stored frame and a category alone returns a slice of it, both without copying.
+        Interval filters return just the matching rows
+        """
+        if overlaps is None and ends_after is None:
+            if category is None:
+                return self.ot
+            a, b = self.category_rows(category)
+            return self.ot.iloc[a:b]
+        return self.ot.iloc[self.positions(category, overlaps, ends_after)]
@@ -0,0 +1,241 @@
+# Python Standard Library imports
+import argparse
+import hashlib
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+# Third Party Imports
+import pandas as pd
+import requests
+
+# Local Imports
+from ua_scrapers_ref import *
+from ot_cache import VOLATILE_PAYLOAD_KEYS
+from ot_scraper_engine import *
+from ot_scraper_engine import _extract_ot_shards
+
+# Watch mode for bid close: polls every category on a schedule and only does work for the ones whose page changed.
+# Each response is fingerprinted with the session key and ASP.NET tokens taken out, an unchanged fingerprint skips
+# the parse altogether, and a changed one is parsed and compared with the last list of that category: pairings
+# added and removed, and the change in pay. Totals are kept per category and only the changed rows are recomputed,
+# so the cost of a cycle follows how much open time moved rather than how much there is.
+
+# CONSTANTS
+
+# Seconds between the starts of two polls
+WATCH_INTERVAL = 5 * 60
+
+# Parts of a page that change from request to request without the open time changing: SKEY in links, and the
+# hidden ASP.NET token fields (whole tags, whatever order their attributes are in)
+FINGERPRINT_IGNORE = re.compile(
+    r'SKEY=[0-9A-Za-z]+'
+    r'|<input[^>]*name="(?:' + '|'.join(re.escape(k) for k in VOLATILE_PAYLOAD_KEYS) + r')"[^>]*>',
+    re.IGNORECASE)
+
+# A pairing in open time
+WATCH_KEY = ['Pairing Number', 'Pairing Date']
+
+# HELPER FUNCTIONS
+
+
+def page_fingerprint(raw_html):
+    # Hash of a page without its volatile parts (FINGERPRINT_IGNORE), equal for pages listing the same open time
+    return hashlib.sha256(FINGERPRINT_IGNORE.sub('', raw_html).encode('utf-8')).hexdigest()
+
+
+def ot_delta(old, new):
+    """What changed in a category between two open time lists (either may be None or empty)
+    Returns a dict: added and removed (rows of new/old, by Pairing Number and Pairing Date), trips (in new),
+    trip change and pay change (minutes)
+    """
+    old = None if old is None or old.empty else old
+    new = None if new is None or new.empty else new
+    if old is not None and new is not None:
+        old_keys = pd.MultiIndex.from_frame(old[WATCH_KEY])
+        new_keys = pd.MultiIndex.from_frame(new[WATCH_KEY])
+        added = new[~new_keys.isin(old_keys)]
+        removed = old[~old_keys.isin(new_keys)]
+    else:
+        added = new if new is not None else pd.DataFrame()
+        removed = old if old is not None else pd.DataFrame()
+    old_pay = 0 if old is None else int(old['Pay Minutes'].sum())
+    new_pay = 0 if new is None else int(new['Pay Minutes'].sum())
+    trips = 0 if new is None else len(new)
+    return {'added': added, 'removed': removed, 'trips': trips,
+            'trip change': trips - (0 if old is None else len(old)), 'pay change': new_pay - old_pay}
+
+
+def format_delta(cat, delta):
+    # One line for a changed category, e.g. 'EWR737FO: 42 trips (+3 -1), pay +12:34'
+    sign = '-' if delta['pay change'] < 0 else '+'
+    return (f"{cat[0]}{cat[1]}{cat[2]}: {delta['trips']} trips (+{len(delta['added'])} -{len(delta['removed'])}), "
+            f"pay {sign}{mins_to_dur(abs(delta['pay change']))}")
+
+# MAIN FUNCTIONS
+
+
+class OTWatcher:
+    """Keeps the open time of a set of categories for a bid month up to date, one poll() at a time
+
+    Every poll fetches each category's page (under the scheduler, over the session key's pooled session). Pages
+    whose fingerprint hasn't changed since the last poll aren't parsed. Changed ones are, and their deltas (see
+    ot_delta) are returned. A category on an error page keeps its last list. Categories over OT_PAGE_LIMIT are
+    always scraped in full (date shards, see extract_ot_list): their first page doesn't show every change.
+    ot() and totals() give the current list and totals (calculate_ot_totals format)
+    """
+
+    def __init__(self, skey, cats, bid_month, scheduler=None, base_url=None, max_in_flight=OT_MAX_IN_FLIGHT,
+                 metrics=None, compact=True):
+        self.skey = skey
+        self.cats = [tuple(cat) for cat in cats]
+        self.bid_month = bid_month
+        self.scheduler = scheduler or default_scheduler()
+        self.base_url = base_url
+        self.max_in_flight = max_in_flight
+        self.metrics = metrics
+        self.compact = compact
+        self.cycles = 0
+        self._fingerprints = {}  # cat -> fingerprint of the last good page
+        self._frames = {}        # cat -> open time
+        self._totals = {}        # cat -> its calculate_ot_totals row
+
+    def _poll_category(self, cat):
+        # Returns (outcome, open time or None if the page is unchanged or couldn't be read)
+        if self.metrics is not None:
+            span = self.metrics.span(cat, self.bid_month)
+        else:
+            span = CategorySpan(cat, self.bid_month)
+        dates = BID_CALENDAR.ddmmyy(self.bid_month)
+        ot_url = ot_page_url(self.skey, self.base_url)
+        session = ccs_session(self.skey, self.base_url, self.scheduler)
+        raw_html = fetch_paced(lambda: extract_ot_html(ot_url, cat, dates, session=session), self.scheduler, span)
+        if raw_html is None:
+            span.finish(OUTCOME_GAVE_UP)
+            self.scheduler.finish(OUTCOME_GAVE_UP)
+            return OUTCOME_GAVE_UP, None
+        span.add('pages', 1)
+
+        fingerprint = page_fingerprint(raw_html)
+        if fingerprint == self._fingerprints.get(cat):
+            # Same open time as last poll, nothing to parse
+            span.cached = True
+            span.finish(OUTCOME_OK, len(self._frames.get(cat, ())))
+            self.scheduler.finish(OUTCOME_OK)
+            return 'unchanged', None
+
+        ot = parse_ot_html(raw_html, cat, span, self.compact)
+        outcome = ot_outcome(ot)
+        if outcome == OUTCOME_OK and len(ot) >= OT_PAGE_LIMIT:
+            # Full page, the rest of the list is past it: on to the date shards, as extract_ot_list does after
+            # this same page. Fingerprint left unset so it's scraped every time
+            ot, outcome = _extract_ot_shards(self.skey, cat, dates, self.scheduler, None, self.base_url, span,
+                                             self.compact)
+        elif outcome in (OUTCOME_OK, OUTCOME_NO_TRIPS):
+            self._fingerprints[cat] = fingerprint
+        span.finish(outcome, len(ot))
+        self.scheduler.finish(outcome)
+        return outcome, ot
+
+    def poll(self):
+        """Polls every category once. Returns a dict: changed {cat: delta}, unchanged (count), errors {cat: outcome},
+        parsed (pages parsed) and seconds
+        """
+        start = time.perf_counter()
+        result = {'changed': {}, 'unchanged': 0, 'errors': {}, 'parsed': 0}
+        with ThreadPoolExecutor(max_workers=max(1, self.max_in_flight)) as pool:
+            futures = {pool.submit(self._poll_category, cat): cat for cat in self.cats}
+            for future in as_completed(futures):
+                cat = futures[future]
+                try:
+                    outcome, ot = future.result()
+                except requests.RequestException:
+                    outcome, ot = OUTCOME_GAVE_UP, None
+                if outcome == 'unchanged':
+                    result['unchanged'] += 1
+                    continue
+                if outcome not in (OUTCOME_OK, OUTCOME_NO_TRIPS, OUTCOME_TRUNCATED):
+                    result['errors'][cat] = outcome
+                    continue
+                result['parsed'] += 1
+                self._update(cat, ot, result['changed'])
+        self.cycles += 1
+        result['seconds'] = time.perf_counter() - start
+        return result
+
+    def _update(self, cat, ot, changed):
+        # Stores a category's new list, and its delta and totals row if anything changed
+        delta = ot_delta(self._frames.get(cat), ot)
+        self._frames[cat] = ot
+        if len(delta['added']) or len(delta['removed']) or delta['pay change']:
+            changed[cat] = delta
+            if ot.empty:
+                self._totals.pop(cat, None)
+            else:
+                self._totals[cat] = calculate_ot_totals(ot)
+
+    def ot(self):
+        # Current open time of every category
+        return concat_ot(self._frames[cat] for cat in self.cats if cat in self._frames)
+
+    def totals(self):
+        # Current totals per category, assembled from the per-category rows
+        rows = [self._totals[cat] for cat in self.cats if cat in self._totals]
+        return pd.concat(rows).sort_index() if rows else pd.DataFrame()
+
+    def run(self, interval=WATCH_INTERVAL, cycles=None, callback=None):
+        """Polls every interval seconds (from the start of one poll to the next), cycles times or until interrupted
+        callback(watcher, result) is called after every poll
+        """
+        while cycles is None or self.cycles < cycles:
+            started = time.monotonic()
+            result = self.poll()
+            if callback is not None:
+                callback(self, result)
+            if cycles is not None and self.cycles >= cycles:
+                break
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def _print_cycle(watcher, result):
+    print(f"{datetime.now():%H:%M:%S} poll {watcher.cycles}: {len(result['changed'])} changed, "
+          f"{result['unchanged']} unchanged, {len(result['errors'])} errors, {result['parsed']} parsed "
+          f"in {result['seconds']:.1f}s")
+    for cat, delta in result['changed'].items():
+        print(f'  {format_delta(cat, delta)}')
+    for cat, outcome in result['errors'].items():
+        print(f'  {cat[0]}{cat[1]}{cat[2]}: {outcome}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Keep polling CCS open time and report what changed')
+    parser.add_argument('bid_month', choices=BID_CALENDAR.names(), metavar='BID_MONTH')
+    parser.add_argument('--skey', help='CCS session key (prompted for a CCS URL if not given)')
+    parser.add_argument('--base', nargs='+', choices=list(BASES_W_FLEETS), help='Bases (default all)')
+    parser.add_argument('--fleet', nargs='+', choices=sorted(EQUIP_FOR_OT), help='Fleets (default all)')
+    parser.add_argument('--seat', nargs='+', choices=SEATS, help='Seats (default both)')
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL, help='Seconds between polls')
+    parser.add_argument('--cycles', type=int, help='Stop after this many polls (default: until interrupted)')
+    parser.add_argument('--totals-out', help='Rewrite this CSV with the totals after every poll')
+    parser.add_argument('--max-in-flight', type=int, default=OT_MAX_IN_FLIGHT, help='Categories polled at once')
+    parser.add_argument('--rate', type=float, default=SCHED_RATE, help='Requests per second to start at')
+    parser.add_argument('--base-url', help=f'CCS root URL (default {CCS_BASE_URL})')
+    args = parser.parse_args()
+
+    cats = select_cats(args.base, args.fleet, args.seat)
+    if not cats:
+        parser.error('No categories match the base/fleet/seat filters')
+    skey = args.skey or skey_from_user()
+    initialize_session(skey, args.base_url)
+
+    def report(watcher, result):
+        _print_cycle(watcher, result)
+        if args.totals_out:
+            watcher.totals().to_csv(args.totals_out)
+
+    watcher = OTWatcher(skey, cats, args.bid_month, RateScheduler(args.rate), args.base_url, args.max_in_flight)
+    try:
+        watcher.run(args.interval, args.cycles, report)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,252 @@
+# Python Standard Library imports
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+# Third Party Imports
+import lxml.html
+import pandas as pd
+import requests
+
+# Local Imports
+from ua_scrapers_ref import *
+from ot_cache import CacheMissError, HtmlCache
+from ot_parser import tables_with_cell, table_records
+from ot_session import ccs_html, ccs_session
+from ot_scheduler import RateScheduler, default_scheduler
+from ot_scraper_engine import OT_REQUEST_TIMEOUT, fetch_paced, initialize_session
+
+# Bulk Flight Planning -> Pairing Info lookups for the pairings of an open time list. Each unique
+# (Pairing Number, Pairing Date) is fetched once through a bounded pool paced by the scrape's RateScheduler, and
+# the raw pages are kept in a persistent HtmlCache, so a repeat run only goes to CCS for pairings it hasn't seen.
+
+# CONSTANTS
+
+# Pairing Info page under CCS_BASE_URL, and the format it takes ctl01$mHolder$txtDate in.
+# Neither is recorded in FULL_PI_URL_PAYLOAD - check both against the Flight Planning menu link if lookups fail
+PI_PAGE = 'PairingInfo.aspx'
+PI_DATE_FORMAT = '%m/%d/%Y'
+
+# Raw pairing info pages are kept here. Details rarely change within a bid month, so entries don't expire
+PI_CACHE_DIR = Path('.pi_cache')
+PI_CACHE_TTL = None
+
+# Pairings looked up at the same time
+PI_MAX_IN_FLIGHT = 4
+
+# A legs table has one of these header cells, the pay block is the table with a 'Pay Time' cell
+PI_LEG_HEADERS = ('Flight', 'Flt')
+PI_PAY_HEADER = 'Pay Time'
+
+# Keys of a pairing
+PI_KEY = ['Pairing Number', 'Pairing Date']
+
+# HELPER FUNCTIONS
+
+
+def pi_page_url(skey, base_url=None):
+    return f'{base_url or CCS_BASE_URL}/{PI_PAGE}?SKEY={skey}'
+
+
+def pi_payload(number, date):
+    # FULL_PI_URL_PAYLOAD for a pairing number and date (datetime.date), as scheduled
+    payload = dict(FULL_PI_URL_PAYLOAD)
+    payload['ctl01$mHolder$txtPairingNumber'] = str(number)
+    payload['ctl01$mHolder$txtDate'] = date.strftime(PI_DATE_FORMAT)
+    return payload
+
+
+def _cache_key(number, date):
+    # HtmlCache entries are grouped by pairing number, one per date
+    ddmmyy = date.strftime('%d%m%y')
+    return (str(number),), (ddmmyy, ddmmyy)
+
+
+def unique_pairings(ot):
+    """Unique (Pairing Number, Pairing Date) of an open time list, sorted, with dates as datetime.date
+    (works on scraped frames and on uploaded ones where dates are still strings)
+    """
+    if ot.empty:
+        return pd.DataFrame(columns=PI_KEY)
+    pairings = pd.DataFrame({'Pairing Number': ot['Pairing Number'].astype(str),
+                             'Pairing Date': pd.to_datetime(ot['Pairing Date']).dt.date})
+    return pairings.drop_duplicates().sort_values(PI_KEY, ignore_index=True)
+
+# MAIN FUNCTIONS
+
+
+def extract_pi_html(pi_url, number, date, cache=None, session=None):
+    """Raw html of the Pairing Info page for a pairing number and date
+    Served from the HtmlCache if given (raising CacheMissError on a miss in replay only mode), pages that parse are
+    saved by extract_pairing_info. Anything but a 200 raises requests.HTTPError
+    Goes through the CCSSession if given (pooled connections, current page tokens)
+    """
+    payload = pi_payload(number, date)
+    key, dates = _cache_key(number, date)
+
+    if cache is not None:
+        pi_html = cache.lookup(key, dates, payload)
+        if pi_html is not None:
+            return pi_html
+
+    if session is not None:
+        pi_html = session.post(pi_url, payload)
+    else:
+        pi_html = ccs_html(requests.post(url=pi_url, data=payload, headers=requests.utils.default_headers(),
+                                         timeout=OT_REQUEST_TIMEOUT))
+    return pi_html
+
+
+def parse_pi_html(raw_html, number, date):
+    """Parses a Pairing Info page into (details, legs)
+    details: dict with the pairing keys, leg count and every cell of the pay block (Block, TAFB, DHD, Credit,
+    Pay Time, ...) as strings. legs: list of dicts, one per row of the legs table, keyed by its header.
+    Returns (None, None) if the page has no pay block
+    """
+    doc = lxml.html.fromstring(raw_html)
+    pay_tables = tables_with_cell(doc, PI_PAY_HEADER)
+    if not pay_tables:
+        return None, None
+    pay = table_records(pay_tables[0])
+
+    legs = []
+    for header in PI_LEG_HEADERS:
+        tables = tables_with_cell(doc, header)
+        if tables:
+            legs = table_records(tables[0])
+            break
+
+    keys = {'Pairing Number': str(number), 'Pairing Date': date}
+    details = {**keys, 'Legs': len(legs), **(pay[0] if pay else {})}
+    return details, [{**keys, **leg} for leg in legs]
+
+
+def extract_pairing_info(skey, number, date, scheduler=None, cache=None, base_url=None):
+    """Takes a session key, pairing number and date and returns (details, legs) (see parse_pi_html)
+    Returns (None, None) if CCS kept sending error pages or the page couldn't be parsed
+    """
+    if scheduler is None:
+        scheduler = default_scheduler()
+    try:
+        raw_html = _cached_pi_html(cache, number, date)
+    except CacheMissError:
+        return None, None
+    if raw_html is not None:
+        return parse_pi_html(raw_html, number, date)
+    return _fetch_pairing_info(skey, number, date, scheduler, cache, base_url)
+
+
+def _cached_pi_html(cache, number, date):
+    # The page from the cache (read once, see HtmlCache.lookup), None if it has to be fetched
+    if cache is None:
+        return None
+    key, dates = _cache_key(number, date)
+    return cache.lookup(key, dates, pi_payload(number, date))
+
+
+def _fetch_pairing_info(skey, number, date, scheduler, cache, base_url):
+    # extract_pairing_info for a page that isn't cached: paced, over the key's pooled session, and saved to the
+    # cache if it parses
+    pi_url = pi_page_url(skey, base_url)
+    session = ccs_session(skey, base_url, scheduler)
+    raw_html = fetch_paced(lambda: extract_pi_html(pi_url, number, date, session=session), scheduler)
+    if raw_html is None:
+        return None, None
+    details, legs = parse_pi_html(raw_html, number, date)
+    if cache is not None and details is not None:
+        key, dates = _cache_key(number, date)
+        # Only pages that parsed are kept, anything else is fetched again next time
+        cache.put(key, dates, pi_payload(number, date), raw_html)
+    return details, legs
+
+
+def extract_pairings_info(skey, ot, max_in_flight=PI_MAX_IN_FLIGHT, scheduler=None, cache=None, base_url=None,
+                          callback=None):
+    """Looks up the Pairing Info of every unique (Pairing Number, Pairing Date) in an open time list
+    Pairings already in the cache are parsed first without going to CCS, the rest go through a bounded pool of
+    workers sharing the scheduler. callback(done, total) is called from the calling thread as pairings finish.
+    Returns (details, legs, stats): details one row per pairing (see parse_pi_html), legs one row per leg,
+    stats counts of pairings: total, cached, fetched, failed
+    """
+    if scheduler is None:
+        scheduler = default_scheduler()
+    pairings = unique_pairings(ot)
+    keys = list(zip(pairings['Pairing Number'], pairings['Pairing Date']))
+
+    stats = {'total': len(keys), 'cached': 0, 'fetched': 0, 'failed': 0}
+
+    # Each page is read from the cache once, and parsed straight away if it's there
+    results = {}
+    missing = []
+    done = 0
+    for number, date in keys:
+        try:
+            raw_html = _cached_pi_html(cache, number, date)
+        except CacheMissError:
+            # Replay only, nothing to fetch it from
+            results[(number, date)] = (None, None)
+        else:
+            if raw_html is None:
+                missing.append((number, date))
+                continue
+            results[(number, date)] = parse_pi_html(raw_html, number, date)
+            stats['cached'] += 1
+        done += 1
+        if callback is not None:
+            callback(done, len(keys))
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+            futures = {pool.submit(_fetch_pairing_info, skey, number, date, scheduler, cache, base_url):
+                       (number, date) for number, date in missing}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                done += 1
+                if callback is not None:
+                    callback(done, len(keys))
+
+    stats['fetched'] = sum(1 for k in missing if results[k][0] is not None)
+    details, legs = [], []
+    for k in keys:
+        pairing_details, pairing_legs = results[k]
+        if pairing_details is None:
+            stats['failed'] += 1
+            continue
+        details.append(pairing_details)
+        legs.extend(pairing_legs)
+
+    details = pd.DataFrame(details, columns=None if details else PI_KEY)
+    legs = pd.DataFrame(legs, columns=None if legs else PI_KEY)
+    return details, legs, stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Look up Pairing Info for every pairing of a saved open time list')
+    parser.add_argument('open_time', help='Open time CSV or Parquet file (from the app or ot_scraper_engine)')
+    parser.add_argument('--skey', help='CCS session key (prompted for a CCS URL if not given)')
+    parser.add_argument('--out', default='pairing_info.csv', help='Pairing details file, legs go next to it')
+    parser.add_argument('--max-in-flight', type=int, default=PI_MAX_IN_FLIGHT, help='Pairings looked up at once')
+    parser.add_argument('--cache-dir', default=PI_CACHE_DIR, help='Pairing Info page cache')
+    parser.add_argument('--replay', action='store_true', help='Only use cached pages, never go to CCS')
+    parser.add_argument('--base-url', help=f'CCS root URL (default {CCS_BASE_URL})')
+    args = parser.parse_args()
+
+    if args.open_time.endswith('.parquet'):
+        ot = pd.read_parquet(args.open_time)
+    else:
+        ot = pd.read_csv(args.open_time, dtype={'Pairing Number': str})
+
+    if args.replay:
+        skey = args.skey or ''
+    else:
+        skey = args.skey or skey_from_user()
+        initialize_session(skey, args.base_url)
+
+    cache = HtmlCache(args.cache_dir, PI_CACHE_TTL, args.replay)
+    details, legs, stats = extract_pairings_info(skey, ot, args.max_in_flight, RateScheduler(), cache,
+                                                 args.base_url)
+    out = Path(args.out)
+    details.to_csv(out, index=False)
+    legs.to_csv(out.with_name(f'{out.stem}_legs{out.suffix}'), index=False)
+    print(f"{stats['total']} pairings: {stats['cached']} from the cache, {stats['fetched']} fetched, "
+          f"{stats['failed']} failed")
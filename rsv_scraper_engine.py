@@ -0,0 +1,214 @@
+# Python Standard Library imports
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Third Party Imports
+import lxml.html
+import pandas as pd
+import requests
+
+# Local Imports
+from ua_scrapers_ref import *
+from ot_calendar import BID_CALENDAR
+from ot_cache import OT_CACHE_DIR, OT_CACHE_TTL, CacheMissError, HtmlCache
+from ot_parser import tables_with_cell, table_records
+from ot_session import ccs_html, ccs_session
+from ot_scheduler import RateScheduler, default_scheduler
+from ot_scraper_engine import OT_MAX_IN_FLIGHT, OT_REQUEST_TIMEOUT, fetch_paced, initialize_session, select_cats
+
+# Trading -> RSV Availability Display (UPA23) for every category and day of a bid month. Mirrors the open time
+# engine: a bounded pool works through the categories, each worker asks for its category's days one at a time,
+# and every request is paced by the same RateScheduler, so the whole (base, equipment, position, date) matrix
+# stays inside one rate budget. Results come back as a compact day x category matrix.
+
+# CONSTANTS
+
+# RSV Availability page under CCS_BASE_URL, and the format it takes ctl01$mHolder$txtDate in.
+# Neither is recorded in FULL_RSV_URL_PAYLOAD - check both against the Trading menu link if lookups fail
+RSV_PAGE = 'UPA23.aspx'
+RSV_DATE_FORMAT = '%m/%d/%Y'
+
+# The availability table is the one with this header cell, the count is read from its first row
+RSV_AVAIL_HEADER = 'Available'
+
+# Matrix values, nullable so a failed day stays distinguishable from 0 reserves
+RSV_DTYPE = 'Int16'
+
+# HELPER FUNCTIONS
+
+
+def rsv_page_url(skey, base_url=None):
+    return f'{base_url or CCS_BASE_URL}/{RSV_PAGE}?SKEY={skey}'
+
+
+def rsv_payload(cat, date):
+    # FULL_RSV_URL_PAYLOAD for a category and a day (datetime.date)
+    payload = dict(FULL_RSV_URL_PAYLOAD)
+    payload['ctl01$mHolder$txtDate'] = date.strftime(RSV_DATE_FORMAT)
+    payload['BaseCombo1'] = cat[0]
+    payload['EquipmentCombo1'] = cat[1]
+    payload['PositionCombo1'] = cat[2]
+    return payload
+
+
+def _cache_key(cat, date):
+    ddmmyy = date.strftime('%d%m%y')
+    return ('RSV',) + tuple(cat), (ddmmyy, ddmmyy)
+
+# MAIN FUNCTIONS
+
+
+def extract_rsv_html(rsv_url, cat, date, cache=None, session=None):
+    """Raw html of the RSV Availability page for a category and day
+    Served from the HtmlCache if given (raising CacheMissError on a miss in replay only mode), pages that parse are
+    saved by extract_rsv_days. Anything but a 200 raises requests.HTTPError
+    Goes through the CCSSession if given (pooled connections, current page tokens)
+    """
+    payload = rsv_payload(cat, date)
+    key, dates = _cache_key(cat, date)
+
+    if cache is not None:
+        rsv_html = cache.lookup(key, dates, payload)
+        if rsv_html is not None:
+            return rsv_html
+
+    if session is not None:
+        rsv_html = session.post(rsv_url, payload)
+    else:
+        rsv_html = ccs_html(requests.post(url=rsv_url, data=payload, headers=requests.utils.default_headers(),
+                                          timeout=OT_REQUEST_TIMEOUT))
+    return rsv_html
+
+
+def parse_rsv_html(raw_html):
+    # Reserves available on an RSV Availability page, None if the page can't be read
+    tables = tables_with_cell(lxml.html.fromstring(raw_html), RSV_AVAIL_HEADER)
+    if not tables:
+        return None
+    records = table_records(tables[0])
+    try:
+        return int(records[0][RSV_AVAIL_HEADER])
+    except (IndexError, KeyError, ValueError):
+        return None
+
+
+def extract_rsv_days(skey, cat, days, scheduler=None, cache=None, base_url=None):
+    """Takes a session key, category and days (datetime.date) and returns a Series of reserves available per day
+    (RSV_DTYPE, <NA> where CCS kept sending error pages or the page couldn't be read)
+    """
+    if scheduler is None:
+        scheduler = default_scheduler()
+    rsv_url = rsv_page_url(skey, base_url)
+
+    available = []
+    for day in days:
+        key, dates = _cache_key(cat, day)
+        # Read the cache once, only pages that aren't there are paced and go over the session
+        try:
+            raw_html = None if cache is None else cache.lookup(key, dates, rsv_payload(cat, day))
+        except CacheMissError:
+            raw_html = None
+            cached = True
+        else:
+            cached = raw_html is not None
+        if not cached:
+            session = ccs_session(skey, base_url, scheduler)
+            raw_html = fetch_paced(lambda: extract_rsv_html(rsv_url, cat, day, session=session), scheduler)
+        day_available = None if raw_html is None else parse_rsv_html(raw_html)
+        if cache is not None and not cached and day_available is not None:
+            # Only pages that parsed are kept, anything else is fetched again next time
+            cache.put(key, dates, rsv_payload(cat, day), raw_html)
+        available.append(day_available)
+
+    return pd.Series(available, index=pd.DatetimeIndex(days, name='Date'), dtype=RSV_DTYPE,
+                     name=f'{cat[0]}{cat[1]}{cat[2]}')
+
+
+def iter_rsv_availability(skey, cats, bid_month, max_in_flight=OT_MAX_IN_FLIGHT, scheduler=None, cache=None,
+                          base_url=None, days=None):
+    """Fetches the reserve availability of several categories over a bid month (or the given days) through a
+    bounded pool of workers sharing one RateScheduler, and yields (cat, Series) as each category finishes
+    Closing the generator early cancels the categories that haven't started.
+    """
+    if scheduler is None:
+        scheduler = default_scheduler()
+    if days is None:
+        days = BID_CALENDAR.days(bid_month)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, max_in_flight))
+    try:
+        futures = {pool.submit(extract_rsv_days, skey, cat, days, scheduler, cache, base_url): cat for cat in cats}
+        for future in as_completed(futures):
+            cat = futures[future]
+            try:
+                available = future.result()
+            except requests.RequestException:
+                available = pd.Series(pd.NA, index=pd.DatetimeIndex(days, name='Date'), dtype=RSV_DTYPE,
+                                      name=f'{cat[0]}{cat[1]}{cat[2]}')
+            yield cat, available
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def extract_rsv_matrix(skey, cats, bid_month, max_in_flight=OT_MAX_IN_FLIGHT, scheduler=None, cache=None,
+                       base_url=None, days=None):
+    """Day x category matrix of reserves available: DatetimeIndex of days, one RSV_DTYPE column per category
+    (category strings like the open time Category column), in the order of cats
+    """
+    columns = {}
+    for cat, available in iter_rsv_availability(skey, cats, bid_month, max_in_flight, scheduler, cache, base_url,
+                                                days):
+        columns[cat] = available
+    return pd.DataFrame({columns[cat].name: columns[cat] for cat in cats})
+
+
+def rsv_long(matrix):
+    # Matrix to one row per (Category, Date) with the Reserves Available, for joins
+    long = matrix.rename_axis(columns='Category').stack(future_stack=True).rename('Reserves Available')
+    return long.reset_index()[['Category', 'Date', 'Reserves Available']]
+
+
+def add_rsv_availability(ot, matrix):
+    # Adds the reserves available on each pairing's start date to an open time list
+    long = rsv_long(matrix)
+    keys = pd.DataFrame({'Category': ot['Category'].astype(str),
+                         'Date': pd.to_datetime(ot['Pairing Date']).to_numpy()})
+    available = keys.merge(long, on=['Category', 'Date'], how='left')['Reserves Available']
+    ot = ot.copy()
+    ot['Reserves Available'] = available.to_numpy()
+    return ot
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scrape CCS reserve availability for every day of a bid month')
+    parser.add_argument('bid_month', choices=BID_CALENDAR.names(), metavar='BID_MONTH')
+    parser.add_argument('--skey', help='CCS session key (prompted for a CCS URL if not given)')
+    parser.add_argument('--base', nargs='+', choices=list(BASES_W_FLEETS), help='Bases (default all)')
+    parser.add_argument('--fleet', nargs='+', choices=sorted(EQUIP_FOR_OT), help='Fleets (default all)')
+    parser.add_argument('--seat', nargs='+', choices=SEATS, help='Seats (default both)')
+    parser.add_argument('--out', help='CSV file for the matrix (default RSV_<bid month>.csv)')
+    parser.add_argument('--max-in-flight', type=int, default=OT_MAX_IN_FLIGHT, help='Categories fetched at once')
+    parser.add_argument('--cache-dir', help='Keep raw pages in this html cache')
+    parser.add_argument('--replay', action='store_true', help='Only use cached pages, never go to CCS')
+    parser.add_argument('--base-url', help=f'CCS root URL (default {CCS_BASE_URL})')
+    args = parser.parse_args()
+
+    cats = select_cats(args.base, args.fleet, args.seat)
+    if not cats:
+        parser.error('No categories match the base/fleet/seat filters')
+    cache = None
+    if args.cache_dir or args.replay:
+        cache = HtmlCache(args.cache_dir or OT_CACHE_DIR, OT_CACHE_TTL, args.replay)
+
+    if args.replay:
+        skey = args.skey or ''
+    else:
+        skey = args.skey or skey_from_user()
+        initialize_session(skey, args.base_url)
+
+    scheduler = RateScheduler()
+    matrix = extract_rsv_matrix(skey, cats, args.bid_month, args.max_in_flight, scheduler, cache, args.base_url)
+    matrix.to_csv(args.out or f'RSV_{args.bid_month}.csv')
+    sched = scheduler.snapshot()
+    print(f"{matrix.shape[1]} categories x {matrix.shape[0]} days, {int(matrix.isna().sum().sum())} missing, "
+          f"{sched['requests']} requests")
@@ -1,5 +1,6 @@
 # Python Standard Library Imports
 import time
+import uuid
 from datetime import datetime
 import streamlit as st
 import numpy as np
@@ -11,6 +12,12 @@ import pandas as pd
 # Local Imports
 from ua_scrapers_ref import *
 from ot_scraper_engine import *
+from ot_aggregate import CUBE_DIMS, build_ot_cube, rollup
+from ot_import import OTImportError, import_ot
+from ot_report import (CARRYOVER_ENTERED, CARRYOVER_ESTIMATE, carryover_from_table, carryover_report,
+                       credits_from_table)
+from ot_shared import SharedResults
+from ot_store import TripStore
 
 
 # Make it look pretty (try to anyway..)
@@ -24,34 +31,192 @@ st.title('UA Scrapers - Open Time')
 # Cached functions
 
 
-@st.cache_data
-def convert_df(df):
-    return df.to_csv(index=False).encode('utf-8')
+# The open time is passed as _open_time (not hashed) with ot_key, set once per loaded list (see TripStore below), so
+# a cache lookup costs the same however many trips are loaded
+
+
+@st.cache_data(max_entries=8)
+def convert_df(_open_time, ot_key):
+    # CSV in the full OT_DF_FORMAT (the upload format), whatever schema the app holds
+    return expand_ot(_open_time).to_csv(index=False).encode('utf-8')
 
 
 @st.cache_data
-def add_credit_hours(open_time):
-    return calculate_ot_totals(open_time)
+def convert_report(report):
+    return report.to_csv().encode('utf-8')
+
+
+@st.cache_data(max_entries=8)
+def build_cube(_open_time, ot_key):
+    # Trip counts and pay minutes rolled up by base, fleet, seat, category, start day and trip length
+    return build_ot_cube(_open_time)
+
+
+@st.cache_data(max_entries=8)
+def add_credit_hours(_open_time, ot_key):
+    return calculate_ot_totals(_open_time, build_cube(_open_time, ot_key))
+
+
+@st.cache_data(max_entries=64)
+def chart_totals(_open_time, ot_key, dim):
+    # Totals by one cube dimension, for the charts
+    return rollup(build_cube(_open_time, ot_key), dim)
+
+
+@st.cache_data(max_entries=64)
+def ot_report(_open_time, ot_key, bid_month, credits=None, carryover=None):
+    # Carryover (entered or estimated), adjusted credit and (with category credits) open time % for every
+    # category, see ot_report.py
+    return carryover_report(_open_time, bid_month, credits, carryover)
+
+
+@st.cache_resource
+def shared_results():
+    # One SharedResults for every session of this server, so users scraping the same categories share the fetches
+    return SharedResults()
+
+
+# Results page views, each rerunning on its own when its widgets change (st.fragment)
+
+# Trips shown per page of the trip list
+TRIP_PAGE_SIZE = 100
+
+
+@st.fragment
+def trip_list_view(trip_store, bid_month, selected_cats_text):
+    # Category and carryover filters over the TripStore indexes, one page of trips rendered at a time
+    open_time = trip_store.ot
+
+    # Category Filter
+    selected_category = st.selectbox('Category', selected_cats_text)
+
+    # For displaying filtered results, straight from the store's indexes
+    category_filter = None if selected_category == 'ALL' else selected_category
+
+    # Carryover if pairing end date is past the end of the bid month
+    carryover_filter = None
+    if bid_month is not None and st.checkbox('Show Carryover Trips Only'):
+        carryover_filter = BID_CALENDAR.dates(bid_month)[1]
+
+    # Row positions of the matching trips (None: every trip), only the page shown is built into a frame
+    rows = trip_store.positions(category=category_filter, ends_after=carryover_filter)
+    total = len(open_time) if rows is None else len(rows)
+    pages = max(1, -(-total // TRIP_PAGE_SIZE))
+    page = st.number_input('Page', min_value=1, max_value=pages, value=1) if pages > 1 else 1
+    start = (page - 1) * TRIP_PAGE_SIZE
+    stop = min(start + TRIP_PAGE_SIZE, total)
+    shown = open_time.iloc[start:stop] if rows is None else open_time.iloc[rows[start:stop]]
+
+    st.write('Trip List')
+    # Don't display these columns to the user
+    st.dataframe(with_pay_time(shown).drop(['Pairing End Date', 'Pay Minutes'], axis=1), hide_index=True)
+    st.caption(f'{total} trips, page {page} of {pages}')
+
+
+@st.fragment
+def calculator_view(open_time, ot_key, bid_month, selected_cats_text):
+    # Open time % of one category against its total credit
+    if bid_month is None:
+        st.write("Couldn't work out the bid month, so no carryover report")
+        return
+    selected_cat = st.selectbox(
+        'Select Category', selected_cats_text[1:])  # without ALL
+    # Carryover adjustment, estimated from the trips if left blank
+    co_adj = st.text_input('Enter Carryover Adjustment Here (blank to estimate):')
+    cat_credit = st.text_input(
+        'Enter Category Total Credit:')  # Total category credit
+    if st.button('Submit'):
+        # Convert Category credit to minutes
+        cat_credit = dur_to_mins(cat_credit)
+        carryover = None
+        if co_adj.strip():
+            # Entered carryover replaces the estimate, 0 included
+            co_adj = 0 if co_adj.strip() == '0' else dur_to_mins(co_adj)
+            carryover = pd.Series({selected_cat: co_adj}, name='Carryover Minutes')
+
+        # Check if user input is valid
+        if cat_credit <= 0 or (carryover is not None and co_adj < 0):
+            st.write('Please enter a valid CO adjustment and total credit in hhh:mm format')
+        else:
+            row = ot_report(open_time, ot_key, bid_month,
+                            pd.Series({selected_cat: cat_credit}, name='Credit Minutes'), carryover).loc[selected_cat]
+            if row['Carryover Source'] == CARRYOVER_ENTERED:
+                st.write(f"Carryover: {row['Carryover']} (entered)")
+                estimate = ''
+            else:
+                # Pro-rated by the days past the end of the bid month, real carryover depends on the legs flown
+                st.write(f"Estimated carryover: {row['Carryover']} on {row['Carryover Trips']} trips, "
+                         f"pro-rated by days past the end of the month. Enter it above for exact figures")
+                estimate = ' (estimate)'
+            st.write(f"Total without carry-over{estimate}: {row['Adjusted Credit']}")
+            st.write(f"Percentage of credit in open time{estimate}: {row['Open Time %']:.2f}%")
+            if row['Needed Minutes'] > 0:
+                st.write(f"{row['Needed For 1%']} more needed to achieve 1%{estimate}")
+
+
+@st.fragment
+def report_view(open_time, ot_key, bid_month):
+    # The same figures for every category at once, from a table of category total credits
+    st.write('Open Time Report')
+    credits_file = st.file_uploader('Category Total Credits (CSV with Category and Total Credit columns, and an '
+                                    'optional Carryover column)', type=['csv'])
+    credits = carryover = None
+    if credits_file is not None:
+        try:
+            table = pd.read_csv(credits_file, dtype=str)
+            credits = credits_from_table(table)
+            carryover = carryover_from_table(table)
+        except ValueError as e:
+            st.write(f'Issue reading the credits file: {e}')
+    if bid_month is not None:
+        report = ot_report(open_time, ot_key, bid_month, credits, carryover)
+        st.dataframe(report.drop(columns=[c for c in report.columns if c.endswith('Minutes')]))
+        st.caption(f'Carryover Source {CARRYOVER_ESTIMATE}: pay pro-rated by the days past the end of the month, '
+                   f'so the figures depending on it are approximate. Add a Carryover column to the credits file to '
+                   f'enter it')
+        st.download_button('Download Report', convert_report(report),
+                           file_name=f'{bid_month}_open_time_report.csv')
+
+
+@st.fragment
+def charts_view(open_time, ot_key):
+    # Charts read a slice of the cube for the chosen dimension
+    chart_dim = st.selectbox('Chart Totals By', CUBE_DIMS, index=CUBE_DIMS.index('Category'))
+    totals = chart_totals(open_time, ot_key, chart_dim)
+
+    st.write("Trip Count")
+    st.bar_chart(totals.drop(labels=['Total Credit', 'Pay Minutes'],
+                             axis=1), horizontal=True)
+
+    st.write("Total Pay Minutes")
+    st.bar_chart(totals.drop(labels=['Trip Count', 'Total Credit'],
+                             axis=1), horizontal=True)
 
 
 def process_ot(skey, cats, bid_month):
     # Goes through each category and compiles a DataFrame of OT
+    # Categories are shown as soon as they arrive, with running totals, and concatenated once at the end
     st.write(bid_month)
     l = len(cats)
-    i = 0
     prog = st.progress(0)
+    latest = st.empty()  # Rows of the category that just arrived
+    running = st.empty()  # Totals so far
 
-    initialize_session(skey)
+    # Per-category timings, shown in the scrape stats panel
+    metrics = ScrapeMetrics()
+    st.session_state.scrape_metrics = metrics
 
-    # Dataframe of OT
-    df = pd.DataFrame()
-    for cat in cats:
-        prog.progress(i/l, f'{cat[0]}{cat[1]}{cat[2]}')
-        i += 1
+    initialize_session(skey, metrics=metrics)
 
-        ot = extract_ot_list(skey, cat, bid_month)
+    found = []
+    totals = []
+    # Fetch all categories concurrently, under a shared rate budget, into the compact schema
+    # Categories another session has just scraped (or is scraping) are shared rather than fetched again
+    for i, (cat, ot) in enumerate(iter_ot_lists(skey, cats, bid_month, metrics=metrics, compact=True,
+                                                shared=shared_results()), start=1):
+        prog.progress(i/l, f'{cat[0]}{cat[1]}{cat[2]}')
         if ot.empty:
-            if set(OT_DF_FORMAT).issubset(ot.columns):
+            if set(OT_COMPACT_FORMAT).issubset(ot.columns):
                 # Empty dataframe with columns, so no trips found
                 st.write(
                     f'No trips found for {cat[0]}{cat[1]}{cat[2]}')
@@ -59,8 +224,17 @@ def process_ot(skey, cats, bid_month):
                 # This means we had a page error as opposed to just no trips
                 st.write(
                     f'Error with {cat[0]}{cat[1]}{cat[2]}: connection error')
-        else:
-            df = pd.concat((df, ot), ignore_index=True)
+            continue
+
+        found.append(ot)
+        totals.append(calculate_ot_totals(ot, metrics=metrics))
+        with latest.container():
+            st.write(f'{cat[0]}{cat[1]}{cat[2]}: {len(ot)} trips')
+            st.dataframe(with_pay_time(ot).drop(['Pairing End Date', 'Pay Minutes'], axis=1), hide_index=True)
+        running.dataframe(pd.concat(totals).drop('Pay Minutes', axis=1))
+
+    # Dataframe of OT
+    df = concat_ot(found)
 
     prog.progress(100, "Done!")
     # It didn't crash! Make sure the user sees this
@@ -83,42 +257,31 @@ if ('ot_form' not in st.session_state) and ('open_time' not in st.session_state)
         selected_bases = st.multiselect('Select one or more options:',
                                         BASES_W_FLEETS)
 
-        # Bid month dropdown - uses stripped bid months (current month onward), default to next month (index 1)
-        bid_month = st.selectbox("Bid Month", BID_MONTHS_DT, index=1)
+        # Bid month dropdown - current bid month onward from the calendar, default to next month (index 1)
+        bid_month = st.selectbox("Bid Month", BID_CALENDAR.upcoming(), index=1)
 
         # File Upload Options
         st.write('OR')
-        st.write('Upload Open Time from a CSV File')
-        ot_file = st.file_uploader('Choose a file')
+        st.write('Upload Open Time from a CSV, Parquet or Arrow File')
+        ot_file = st.file_uploader('Choose a file', type=['csv', 'parquet', 'arrow', 'feather'])
 
         # Submit button
         if st.form_submit_button():
             # First check if the user uploaded a file
             if ot_file is not None:
-                # If so, import the file checking for valid data
+                # If so, import the file checking for valid data (see ot_import)
                 try:
-                    ot = pd.read_csv(ot_file, dtype=OT_DF_DTYPES)
-                    # String to dates:
-                    ot['Pairing Date'] = ot['Pairing Date'].apply(lambda d: datetime.strptime(
-                        d, '%Y-%m-%d').date())
-                    ot['Pairing End Date'] = ot['Pairing End Date'].apply(lambda d: datetime.strptime(
-                        d, '%Y-%m-%d').date())
-                    
-                    # Check for correct format
-                    if set(OT_DF_FORMAT).issubset(ot.columns):
-                        if ot.empty:  # Empty dataframe
-                            st.write('No trips in the file! Please select another file.')
-                        else:
-                            # Correct format, save it
-                            st.session_state.open_time = ot
-                    else: 
-                        # Couldn't find the right columns in the data
-                        st.write(
-                            'The file is in the incorrect format! Please select another file.')
-                except:
-                    st.write(
-                        'Issue reading the file! Please select another file.')
-                
+                    ot = import_ot(ot_file)
+                except OTImportError as e:
+                    st.write('Issue reading the file! Please fix it or select another file.')
+                    st.dataframe(pd.Series(e.errors, name='Problem').rename_axis('Column'))
+                else:
+                    if ot.empty:  # Empty dataframe
+                        st.write('No trips in the file! Please select another file.')
+                    else:
+                        # Correct format, save it (already in the compact schema)
+                        st.session_state.open_time = ot
+
                 if 'open_time' in st.session_state:
                     # Successfully opened the file, rerun to branch into the main branch
                     st.rerun()
@@ -161,8 +324,16 @@ else:
 
             st.rerun()
 
-    # copy of existing open time
-    open_time = st.session_state.open_time.copy()
+    if 'trip_store' not in st.session_state:
+        # Index the open time once per session, the store holds the only copy from here on
+        st.session_state.trip_store = TripStore(st.session_state.open_time)
+        st.session_state.open_time = st.session_state.trip_store.ot
+        # Names this list in the caches, so they never hash the trips
+        st.session_state.ot_key = uuid.uuid4().hex
+
+    trip_store = st.session_state.trip_store
+    open_time = trip_store.ot
+    ot_key = st.session_state.ot_key
 
     # If it's empty, don't continue and start from the beginning
     if open_time.empty:
@@ -173,14 +344,13 @@ else:
 
     if 'selected_cats_text' not in st.session_state:
         # Generate list of categories adding an ALL option
-        st.session_state.selected_cats_text = sorted(open_time['Category'].unique(
-        ).tolist())
+        st.session_state.selected_cats_text = trip_store.categories
         st.session_state.selected_cats_text.insert(0, 'ALL')
 
     if 'bid_month' not in st.session_state:
-        # Figure out the bid month
-        d = open_time['Pairing Date'].iloc[0]  # Date of first pairing
-        st.session_state.bid_month = date_to_bidmonth(d)
+        # Figure out the bid month: the one most pairings start in, tagged in one pass over the dates
+        bid_months = BID_CALENDAR.bid_month_of(open_time['Pairing Date']).dropna()
+        st.session_state.bid_month = bid_months.mode().iloc[0] if not bid_months.empty else None
 
     selected_cats_text = st.session_state.selected_cats_text
 
@@ -188,92 +358,45 @@ else:
     st.write(bid_month)
 
     with st.container(border=True):
-        # This is the main branch that displays everything
+        # This is the main branch that displays everything. Each view below is a fragment: using its widgets
+        # reruns that view only, not the page
 
         # Take the open_time dataframe and save it to a csv with the bid month as file name
-        ot_csv = convert_df(open_time)
+        ot_csv = convert_df(open_time, ot_key)
         st.download_button('Download Entire Trip List', ot_csv,
                             file_name=f'{bid_month}.csv')
 
-        # Category Filter
-        selected_category = st.selectbox('Category', selected_cats_text)
-
-        # For displaying filtered results
-        trip_list = open_time.copy()
-
-        if (selected_category != 'ALL'):
-            # Filter selected category
-            trip_list = trip_list[trip_list['Category']
-                                    == selected_category]
-
-        if st.checkbox('Show Carryover Trips Only'):
-            # Filter carryover if pairing end date is past the end of the bid month
-            trip_list = trip_list[trip_list['Pairing End Date']
-                                    > BID_MONTHS_DT[bid_month][1]]
-
-        st.write('Trip List')
-        # Don't display these columns to the user
-        st.write(trip_list.drop(
-            ['Pairing End Date', 'Pay Minutes'], axis=1))
+        trip_list_view(trip_store, bid_month, selected_cats_text)
 
         # Initialize streamlit columns
         left, right = st.columns(2, gap='small')
 
         # Left Side
-        ot_totals = add_credit_hours(open_time)
-        # df = pd.DataFrame.from_dict(ot_totals, orient='index', columns=[
-        #                            'Trip Count', 'Total Credit'])
-        # df.index.name = 'Category'
+        ot_totals = add_credit_hours(open_time, ot_key)
         left.write('Totals')
         left.write(ot_totals.drop('Pay Minutes', axis=1))
 
         with right.container(border=True):
-            selected_cat = st.selectbox(
-                'Select Category', selected_cats_text[1:])  # without ALL
-            # Carryover adjustment
-            co_adj = st.text_input('Enter Carryover Adjustment Here:')
-            cat_credit = st.text_input(
-                'Enter Category Total Credit:')  # Total category credit
-            if st.button('Submit'):
-                if not co_adj or co_adj == '0':
-                    # Blank or 0 CO adjustment, make it zero
-                    co_adj = 0
-                else:
-                    # Otherwise try to convert it to minutes
-                    co_adj = dur_to_mins(co_adj)
+            calculator_view(open_time, ot_key, bid_month, selected_cats_text)
 
-                # Convert Category credit to minutes
-                cat_credit = dur_to_mins(cat_credit)
-
-                # Check if user input is valid
-                if (co_adj < 0) or (cat_credit < 0):
-                    st.write(
-                        'Please enter a valid CO adjustment and total credit in hhh:mm format')
-                else:
-                    # Deduct the carryover adjustment and display it
-                    adj_credit = int(
-                        ot_totals['Pay Minutes'][selected_cat] - co_adj)
-                    st.write(
-                        f'Total without carry-over: {mins_to_dur(adj_credit)}')
-
-                    # Calculate the percentage of open time credit and display it (2 decimal places)
-                    percentage = ((adj_credit / cat_credit)*100)
-                    st.write(
-                        f'Percentage of credit in open time: {percentage:.2f}%')
-                    
-                    # Calculate the required number to bring it up to 1%
-                    if percentage < 1.0:
-                        d = (cat_credit/100) - adj_credit
-                        st.write(f'{mins_to_dur(int(d) + 1)} more needed to achieve 1%')
+        with st.container(border=True):
+            report_view(open_time, ot_key, bid_month)
 
         # Just for fun:
-
-        st.write("Trip Count")
-        st.bar_chart(ot_totals.drop(labels=['Total Credit', 'Pay Minutes'],
-                                    axis=1), horizontal=True)
-
-        st.write("Total Pay Minutes")
-        st.bar_chart(ot_totals.drop(labels=['Trip Count', 'Total Credit'],
-                                    axis=1), horizontal=True)
-
-        st.map()
+        charts_view(open_time, ot_key)
+
+        if 'scrape_metrics' in st.session_state:
+            # Where the scrape's time went
+            metrics = st.session_state.scrape_metrics
+            with st.expander('Scrape Stats'):
+                report = metrics.report()
+                st.write(f"{len(report['categories'])} categories in {report['elapsed']:.1f}s, "
+                         f"outcomes: {report['outcomes']}")
+                st.write('By Base')
+                st.dataframe(metrics.summary('base'))
+                st.write('By Fleet')
+                st.dataframe(metrics.summary('fleet'))
+                st.write('Per Category')
+                st.dataframe(metrics.frame(), hide_index=True)
+                st.download_button('Download Scrape Report', metrics.to_json(indent=2),
+                                   file_name=f'{bid_month}_scrape_report.json')
@@ -0,0 +1,100 @@
+# Python Standard Library imports
+import os
+import time
+
+# Third Party Imports
+import pytest
+
+# Local Imports
+from ccs_standin import StandinConfig, start_standin
+from ot_cache import HtmlCache
+from ot_calendar import BID_CALENDAR
+from ot_metrics import ScrapeMetrics
+from ot_scraper_engine import (OUTCOME_NOT_CACHED, OUTCOME_OK, RateScheduler, extract_ot_list, ot_outcome, ot_payload,
+                               split_date_range)
+
+# A page is read from the cache once: whatever that read says decides pacing, the session and re-caching
+
+CAT = ('EWR', '737', 'FO')
+BID_MONTH = 'APR2025'
+
+
+class CountingScheduler(RateScheduler):
+    # RateScheduler counting the tokens handed out
+    def __init__(self):
+        super().__init__(rate=100, max_rate=100)
+        self.acquired = 0
+
+    def acquire(self):
+        self.acquired += 1
+        return super().acquire()
+
+
+@pytest.fixture
+def standin():
+    server = start_standin(StandinConfig(pairings=(50, 50), no_records_rate=0))
+    yield server
+    server.shutdown()
+
+
+def _entry(cache):
+    dates = BID_CALENDAR.ddmmyy(BID_MONTH)
+    return cache.path(CAT, dates, ot_payload(CAT, dates))
+
+
+def test_fresh_page_is_not_fetched(standin, tmp_path):
+    cache = HtmlCache(tmp_path, ttl=60)
+    extract_ot_list('standin', CAT, BID_MONTH, RateScheduler(rate=100, max_rate=100), cache, standin.base_url)
+    posts = standin.stats['post']
+    scheduler = CountingScheduler()
+    ot = extract_ot_list('standin', CAT, BID_MONTH, scheduler, cache, standin.base_url)
+    assert ot_outcome(ot) == OUTCOME_OK
+    assert standin.stats['post'] == posts
+    assert scheduler.acquired == 0
+
+
+def test_stale_page_is_paced_and_cached_again(standin, tmp_path):
+    cache = HtmlCache(tmp_path, ttl=60)
+    extract_ot_list('standin', CAT, BID_MONTH, RateScheduler(rate=100, max_rate=100), cache, standin.base_url)
+    entry = _entry(cache)
+    # Gone stale: fetched like any other page, and the fresh copy replaces it
+    os.utime(entry, (time.time() - 120, time.time() - 120))
+    posts = standin.stats['post']
+    scheduler = CountingScheduler()
+    ot = extract_ot_list('standin', CAT, BID_MONTH, scheduler, cache, standin.base_url)
+    assert ot_outcome(ot) == OUTCOME_OK
+    assert standin.stats['post'] == posts + 1
+    assert scheduler.acquired >= 1
+    assert time.time() - entry.stat().st_mtime < 60
+
+
+def test_replay_miss_is_not_cached(tmp_path):
+    cache = HtmlCache(tmp_path, replay_only=True)
+    scheduler = CountingScheduler()
+    metrics = ScrapeMetrics()
+    ot = extract_ot_list('standin', CAT, BID_MONTH, scheduler, cache, 'http://127.0.0.1:9', metrics)
+    assert ot.empty
+    assert metrics.spans[0].outcome == OUTCOME_NOT_CACHED
+    assert scheduler.acquired == 0
+
+
+def test_partly_cached_category_is_not_cached(tmp_path):
+    # A category over the page limit: the full page and its shards are counted, the span is only cached if all are
+    server = start_standin(StandinConfig(pairings=(600, 600), no_records_rate=0))
+    try:
+        cache = HtmlCache(tmp_path, ttl=60)
+        metrics = ScrapeMetrics()
+        for _ in range(2):
+            extract_ot_list('standin', CAT, BID_MONTH, RateScheduler(rate=100, max_rate=100), cache, server.base_url,
+                            metrics)
+        shard = split_date_range(BID_CALENDAR.ddmmyy(BID_MONTH))[1]
+        entry = cache.path(CAT, shard, ot_payload(CAT, shard))
+        os.utime(entry, (time.time() - 120, time.time() - 120))
+        extract_ot_list('standin', CAT, BID_MONTH, RateScheduler(rate=100, max_rate=100), cache, server.base_url,
+                        metrics)
+    finally:
+        server.shutdown()
+    fetched, replayed, partly = metrics.spans
+    assert (fetched.pages, fetched.cached_pages, fetched.cached) == (5, 0, False)
+    assert (replayed.pages, replayed.cached_pages, replayed.cached) == (5, 5, True)
+    assert (partly.pages, partly.cached_pages, partly.cached) == (5, 4, False)
@@ -0,0 +1,84 @@
+# Python Standard Library imports
+from datetime import date, timedelta
+
+# Third Party Imports
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+# Local Imports
+from ot_history import OTHistory
+
+# Behaviour of the snapshot history: what series() reports, and that compact() keeps it while merging files
+
+BID_MONTH = 'APR2025'
+SNAPSHOTS = [pd.Timestamp('2025-03-20 12:00') + pd.Timedelta(hours=h) for h in range(4)]
+
+
+def _ot(*pairings):
+    # OT_DF_FORMAT rows for (category, pairing number, pay minutes)
+    start = date(2025, 4, 2)
+    return pd.DataFrame({
+        'Pairing Number': [p[1] for p in pairings],
+        'Category': [p[0] for p in pairings],
+        'Pairing Date': [start] * len(pairings),
+        'Pairing End Date': [start + timedelta(days=2)] * len(pairings),
+        'Days': [3] * len(pairings),
+        'Pay Time': ['0:00'] * len(pairings),
+        'Pay Minutes': [p[2] for p in pairings],
+    })
+
+
+@pytest.fixture
+def history(tmp_path):
+    # EWR737FO: 1001 throughout, 1002 goes away in the third snapshot and comes back in the fourth.
+    # ORD320CA: one pairing, and no trips in the last snapshot
+    history = OTHistory(tmp_path)
+    history.append(_ot(('EWR737FO', '1001', 600), ('EWR737FO', '1002', 700), ('ORD320CA', '2001', 500)),
+                   BID_MONTH, SNAPSHOTS[0])
+    history.append(_ot(('EWR737FO', '1001', 600), ('EWR737FO', '1002', 700), ('ORD320CA', '2001', 500)),
+                   BID_MONTH, SNAPSHOTS[1])
+    history.append(_ot(('EWR737FO', '1001', 600), ('ORD320CA', '2001', 500)), BID_MONTH, SNAPSHOTS[2])
+    history.append(_ot(('EWR737FO', '1001', 600), ('EWR737FO', '1002', 700)), BID_MONTH, SNAPSHOTS[3],
+                   categories=['EWR737FO', 'ORD320CA'])
+    return history
+
+
+def test_series_follows_snapshots(history):
+    series = history.series(BID_MONTH, ['EWR737FO', 'ORD320CA'])
+    assert series.loc['EWR737FO', 'Trip Count'].tolist() == [2, 2, 1, 2]
+    assert series.loc['EWR737FO', 'Pay Minutes'].tolist() == [1300, 1300, 600, 1300]
+    assert series.loc['ORD320CA', 'Trip Count'].tolist() == [1, 1, 1, 0]
+
+
+def test_compact_keeps_series(history):
+    before = history.series(BID_MONTH, ['EWR737FO', 'ORD320CA'])
+    results = history.compact(BID_MONTH)
+    pd.testing.assert_frame_equal(history.series(BID_MONTH, ['EWR737FO', 'ORD320CA']), before)
+    assert results == {f'bid_month={BID_MONTH}/base=EWR': (7, 3), f'bid_month={BID_MONTH}/base=ORD': (3, 1)}
+
+
+def test_compact_replaces_files(history, tmp_path):
+    history.compact(BID_MONTH)
+    for base in ('EWR', 'ORD'):
+        assert len(list((tmp_path / f'bid_month={BID_MONTH}' / f'base={base}').glob('*.parquet'))) == 1
+
+
+def test_compact_keeps_stretches_apart(history):
+    # A pairing that went away and came back is two stretches, not one row spanning the gap
+    history.compact(BID_MONTH)
+    rows = history.load(BID_MONTH, category='EWR737FO').sort_values(['Pairing Number', 'First Seen'])
+    gone = rows[rows['Pairing Number'] == '1002']
+    assert gone['First Seen'].tolist() == [SNAPSHOTS[0], SNAPSHOTS[3]]
+    assert gone['Last Seen'].tolist() == [SNAPSHOTS[1], SNAPSHOTS[3]]
+    kept = rows[rows['Pairing Number'] == '1001']
+    assert kept[['First Seen', 'Last Seen']].values.tolist() == [[SNAPSHOTS[0], SNAPSHOTS[3]]]
+
+
+def test_compact_twice_changes_nothing(history):
+    history.compact(BID_MONTH)
+    before = history.load(BID_MONTH).sort_values(['Category', 'Pairing Number', 'First Seen'], ignore_index=True)
+    history.compact(BID_MONTH)
+    after = history.load(BID_MONTH).sort_values(['Category', 'Pairing Number', 'First Seen'], ignore_index=True)
+    pd.testing.assert_frame_equal(after, before)
@@ -0,0 +1,41 @@
+# Third Party Imports
+import pandas as pd
+import pytest
+
+# Local Imports
+from ot_import import validate_ot
+from ot_scraper_engine import compact_ot
+
+# Values have to fit the compact schema's small ints, instead of wrapping when they are cast
+
+
+def _raw(days, pay):
+    # Raw imported rows (strings, like a CSV) with the given Days and Pay Minutes
+    return pd.DataFrame({'Pairing Number': [str(1000 + i) for i in range(len(days))], 'Category': 'EWR737FO',
+                         'Pairing Date': '2025-04-01', 'Pairing End Date': '2025-04-01',
+                         'Days': days, 'Pay Minutes': pay})
+
+
+def test_validate_accepts_limits():
+    raw = _raw(['1', '1'], ['0', '32767'])
+    ot, errors = validate_ot(raw)
+    assert errors == {}
+    assert ot['Pay Minutes'].tolist() == [0, 32767]
+
+
+@pytest.mark.parametrize('column, values', [('Pay Minutes', ['60', '40000']), ('Pay Minutes', ['60', '-1']),
+                                            ('Days', ['1', '128'])])
+def test_validate_rejects_out_of_range(column, values):
+    raw = _raw(values if column == 'Days' else ['1', '1'], values if column == 'Pay Minutes' else ['60', '60'])
+    ot, errors = validate_ot(raw)
+    assert ot is None
+    assert list(errors) == [column]
+    assert 'row 2' in errors[column]
+
+
+def test_compact_ot_refuses_to_wrap():
+    ot = pd.DataFrame({'Pairing Number': ['1001'], 'Category': ['EWR737FO'],
+                       'Pairing Date': [pd.Timestamp('2025-04-01')], 'Pairing End Date': [pd.Timestamp('2025-04-01')],
+                       'Days': [1], 'Pay Time': ['666:40'], 'Pay Minutes': [40000]})
+    with pytest.raises(ValueError, match='Pay Minutes'):
+        compact_ot(ot)
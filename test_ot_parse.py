@@ -0,0 +1,47 @@
+# Local Imports
+from ot_benchmark import make_ot_page
+from ot_durations import ccs_to_mins
+from ot_metrics import CategorySpan
+from ot_parser import parse_ot_page
+from ot_scraper_engine import OUTCOME_OK, OUTCOME_PAGE_ERROR, ot_outcome, parse_ot_html
+
+# A value on the page that can't be read costs its own pairing, not the whole category
+
+CAT = ('EWR', '737', 'FO')
+
+
+def _page_with_pay(values):
+    # Synthetic 200 pairing page with the first pay cells replaced by values
+    raw_html = make_ot_page(200, ('010425', '300425'), seed=1)
+    pays = parse_ot_page(raw_html)['Pay']
+    for old, new in zip(pays, values):
+        raw_html = raw_html.replace(f'>{old}<', f'>{new}<', 1)
+    return raw_html
+
+
+def test_short_ccs_durations_are_minutes():
+    mins, invalid = ccs_to_mins(['45', '5', '100', '1230', 'x1', ''])
+    assert mins.tolist() == [45, 5, 60, 750, -1, -1]
+    assert invalid.tolist() == [False, False, False, False, True, True]
+
+
+def test_bad_value_drops_its_pairing():
+    for compact in (False, True):
+        span = CategorySpan(CAT, None)
+        ot = parse_ot_html(_page_with_pay(['45', '4x5']), CAT, span, compact)
+        assert ot_outcome(ot) == OUTCOME_OK
+        assert len(ot) == 199
+        assert ot['Pay Minutes'].iloc[0] >= 45
+        assert span.invalid == 1
+        assert span.invalid_examples[0].endswith("Pay='4x5'")
+
+
+def test_nothing_readable_is_page_error():
+    raw_html = make_ot_page(200, ('010425', '300425'), seed=1)
+    for pay in set(parse_ot_page(raw_html)['Pay']):
+        raw_html = raw_html.replace(f'>{pay}<', '>bad<')
+    span = CategorySpan(CAT, None)
+    ot = parse_ot_html(raw_html, CAT, span)
+    assert ot_outcome(ot) == OUTCOME_PAGE_ERROR
+    assert span.invalid == 200
+    assert len(span.invalid_examples) == 5
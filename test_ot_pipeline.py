@@ -0,0 +1,72 @@
+# Third Party Imports
+import pandas as pd
+import pytest
+
+# Local Imports
+from ua_scrapers_ref import ALL_CATS
+from ccs_standin import StandinConfig, start_standin
+from ot_pipeline import ParsePool
+from ot_scraper_engine import RateScheduler, extract_ot_lists, iter_ot_lists, ot_outcome
+from ot_shared import SharedResults
+
+# The fetch -> parse pipeline gives the same open time as parsing in the fetch threads, and an early close leaves
+# its parse pool as it found it
+
+CATS = ALL_CATS[:12]
+BID_MONTH = 'APR2025'
+
+
+@pytest.fixture(scope='module')
+def standin():
+    # Up to 900 pairings a month, so some categories go over the page limit and are sharded
+    server = start_standin(StandinConfig(pairings=(0, 900)))
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture(scope='module')
+def parse_pool():
+    with ParsePool(2) as pool:
+        yield pool
+
+
+def _scheduler():
+    return RateScheduler(rate=200, max_rate=200)
+
+
+def _sorted(ot):
+    return ot.sort_values(['Pairing Number', 'Pairing Date'], ignore_index=True)
+
+
+def test_pipeline_matches_fetch_threads(standin, parse_pool):
+    threaded = extract_ot_lists('standin', CATS, BID_MONTH, 4, _scheduler(), base_url=standin.base_url)
+    pipelined = extract_ot_lists('standin', CATS, BID_MONTH, 4, _scheduler(), base_url=standin.base_url,
+                                 parse_pool=parse_pool)
+    assert any(len(ot) > 499 for ot in threaded.values())
+    for cat in CATS:
+        assert ot_outcome(pipelined[cat]) == ot_outcome(threaded[cat])
+        if not threaded[cat].empty:
+            pd.testing.assert_frame_equal(_sorted(pipelined[cat]), _sorted(threaded[cat]))
+
+
+def test_early_close_frees_parse_slots(standin, parse_pool):
+    scrape = iter_ot_lists('standin', CATS, BID_MONTH, 4, _scheduler(), base_url=standin.base_url,
+                           parse_pool=parse_pool)
+    next(scrape)
+    scrape.close()
+    # Every slot is free again
+    taken = [parse_pool._slots.acquire(timeout=5) for _ in range(parse_pool.queue_size)]
+    for _ in range(sum(taken)):
+        parse_pool.release()
+    assert all(taken)
+
+
+def test_pipeline_shares_results(standin, parse_pool):
+    shared = SharedResults()
+    first = extract_ot_lists('standin', CATS, BID_MONTH, 4, _scheduler(), base_url=standin.base_url,
+                             shared=shared, parse_pool=parse_pool)
+    posts = standin.stats['post']
+    second = extract_ot_lists('standin', CATS, BID_MONTH, 4, _scheduler(), base_url=standin.base_url,
+                              shared=shared, parse_pool=parse_pool)
+    assert standin.stats['post'] == posts
+    assert all(second[cat] is first[cat] for cat in CATS if not first[cat].empty)
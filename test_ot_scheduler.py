@@ -0,0 +1,29 @@
+# Third Party Imports
+import pytest
+
+# Local Imports
+from ot_scheduler import SCHED_SLOW_DECREASE, RateScheduler
+
+# AIMD adaptation of the request rate, with the knobs given to the scheduler
+
+
+def test_record_adapts_rate():
+    scheduler = RateScheduler(rate=1.0, min_rate=0.1, max_rate=2.0, increase=0.5, decrease=0.5, target_latency=1)
+    scheduler.record(0.1, True)
+    assert scheduler.rate == pytest.approx(1.5)
+    scheduler.record(0.1, False)
+    assert scheduler.rate == pytest.approx(0.75)
+    scheduler.record(2, True)
+    assert scheduler.rate == pytest.approx(0.75 * SCHED_SLOW_DECREASE)
+    assert scheduler.snapshot()['slow'] == 1
+
+
+@pytest.mark.parametrize('slow_decrease', [0.5, 1.0])
+def test_slow_decrease_is_per_scheduler(slow_decrease):
+    scheduler = RateScheduler(rate=1.0, slow_decrease=slow_decrease, target_latency=1)
+    scheduler.record(2, True)
+    assert scheduler.rate == pytest.approx(slow_decrease)
+    # Still kept above min_rate
+    for _ in range(20):
+        scheduler.record(2, True)
+    assert scheduler.rate >= scheduler.min_rate
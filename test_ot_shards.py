@@ -0,0 +1,93 @@
+# Python Standard Library imports
+from datetime import datetime, timedelta
+
+# Third Party Imports
+import pandas as pd
+import pytest
+
+# Local Imports
+import ot_scraper_engine
+from ot_scraper_engine import (OT_PAGE_LIMIT, OUTCOME_OK, OUTCOME_PAGE_ERROR, OUTCOME_TRUNCATED, RateScheduler,
+                               _extract_ot_shards, split_date_range)
+from ot_metrics import CategorySpan
+
+# Splitting a full category into date range shards, and merging the shards back without duplicates
+
+CAT = ('EWR', '737', 'FO')
+
+
+def _days(dates):
+    return [datetime.strptime(d, '%d%m%y').date() for d in dates]
+
+
+@pytest.mark.parametrize('dates, parts', [(('010425', '300425'), 4), (('010425', '300425'), 7),
+                                          (('280225', '030325'), 4), (('010425', '020425'), 4),
+                                          (('150425', '150425'), 4)])
+def test_split_date_range_covers_range(dates, parts):
+    shards = split_date_range(dates, parts)
+    start, end = _days(dates)
+    assert len(shards) == min(parts, (end - start).days + 1)
+    # Consecutive and non-overlapping, from the first day to the last
+    assert _days(shards[0])[0] == start and _days(shards[-1])[1] == end
+    for (a, b), (c, _) in zip(shards, shards[1:]):
+        assert _days((c,))[0] - _days((b,))[0] == timedelta(days=1)
+    assert all(_days(s)[0] <= _days(s)[1] for s in shards)
+
+
+def _page(numbers, start):
+    # Compact-ish open time rows starting on a DDMMYY day
+    day = pd.Timestamp(datetime.strptime(start, '%d%m%y'))
+    return pd.DataFrame({'Pairing Number': [str(n) for n in numbers], 'Category': 'EWR737FO',
+                         'Pairing Date': day, 'Pairing End Date': day, 'Days': 1, 'Pay Minutes': 300})
+
+
+def _fake_range(pages):
+    # Stands in for _extract_ot_range, serving (dataframe, outcome) per date range
+    def extract(skey, cat, dates, *args, **kwargs):
+        return pages[dates]
+    return extract
+
+
+def _shards(monkeypatch, pages, dates=('010425', '300425')):
+    monkeypatch.setattr(ot_scraper_engine, '_extract_ot_range', _fake_range(pages))
+    return _extract_ot_shards('standin', CAT, dates, RateScheduler(), None, None, CategorySpan(CAT, None))
+
+
+def test_shards_drop_duplicates(monkeypatch):
+    # Pairings listed in two shards (overnight ones at a boundary) are kept once
+    shards = split_date_range(('010425', '300425'))
+    pages = {s: (_page(range(i * 100, i * 100 + 12), s[0]), OUTCOME_OK) for i, s in enumerate(shards)}
+    # Same pairing and date in two shards
+    pages[shards[1]] = (pd.concat([pages[shards[1]][0], pages[shards[0]][0].iloc[:3]], ignore_index=True),
+                        OUTCOME_OK)
+    ot, outcome = _shards(monkeypatch, pages)
+    assert outcome == OUTCOME_OK
+    assert not ot.duplicated(['Pairing Number', 'Pairing Date']).any()
+    assert len(ot) == 12 * len(shards)
+
+
+def test_full_shard_is_split_again(monkeypatch):
+    shards = split_date_range(('010425', '300425'))
+    pages = {s: (_page([f'{i}00'], s[0]), OUTCOME_OK) for i, s in enumerate(shards)}
+    pages[shards[0]] = (_page(range(OT_PAGE_LIMIT), shards[0][0]), OUTCOME_OK)
+    for i, s in enumerate(split_date_range(shards[0])):
+        pages[s] = (_page([f'9{i}'], s[0]), OUTCOME_OK)
+    ot, outcome = _shards(monkeypatch, pages)
+    assert outcome == OUTCOME_OK
+    assert sorted(ot['Pairing Number']) == sorted(['90', '91', '92', '93'] + [f'{i}00' for i in range(1, 4)])
+
+
+def test_full_single_day_is_truncated(monkeypatch):
+    pages = {('150425', '150425'): (_page(range(OT_PAGE_LIMIT), '150425'), OUTCOME_OK)}
+    ot, outcome = _shards(monkeypatch, pages, ('150425', '150425'))
+    assert outcome == OUTCOME_TRUNCATED
+    assert len(ot) == OT_PAGE_LIMIT
+
+
+def test_failed_shard_fails_category(monkeypatch):
+    shards = split_date_range(('010425', '300425'))
+    pages = {s: (_page([i], s[0]), OUTCOME_OK) for i, s in enumerate(shards)}
+    pages[shards[2]] = (pd.DataFrame(), OUTCOME_PAGE_ERROR)
+    ot, outcome = _shards(monkeypatch, pages)
+    assert outcome == OUTCOME_PAGE_ERROR
+    assert ot.empty
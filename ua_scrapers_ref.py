@@ -1,6 +1,6 @@
 # Python Standard Library imports
+import os
 import re
-from datetime import datetime
 
 ### CONSTANTS ###
 
@@ -45,7 +45,8 @@ EQUIP_FOR_OT = {
     '787': '8'
 }
 
-# List of bid months, each being a tuple of dates (from, to) inclusive in DDMMYY format. Should go into refdata and kept updated
+# Published bid months, each being a tuple of dates (from, to) inclusive in DDMMYY format. Every other month is
+# generated from rules by ot_calendar, these override the generated dates. Look dates up with ot_calendar.BID_CALENDAR
 BID_MONTHS = {
     # 2024/2025 Month Definitions
     'OCT2024': ('290924', '291024'),
@@ -55,18 +56,10 @@ BID_MONTHS = {
     'FEB2025': ('300125', '010325'),
     'MAR2025': ('020325', '310325'),
     'APR2025': ('010425', '300425')
-    # 2025/2026 Month Definitions
-    # todo
 }
 
-# List of bid months in datetime.date format, current month onwards
-
-
-def str_to_date(d):
-    return (datetime.strptime(d[0], '%d%m%y').date(), datetime.strptime(d[1], '%d%m%y').date())
-
-BID_MONTHS_DT = {k: str_to_date(d) for k, d in BID_MONTHS.items()
-                 if datetime.today().date() <= str_to_date(d)[1]} # Strip previous months
+# Root of the CCS site. Override with the CCS_BASE_URL environment variable (e.g. to point at ccs_standin.py)
+CCS_BASE_URL = os.environ.get('CCS_BASE_URL', 'https://ccs.ual.com/CCS')
 
 # This RE extracts the SKEY from a URL.
 SKEY_RE = r'.+SKEY\=(?P<skey>.{41}).*'
@@ -182,14 +175,6 @@ FULL_PI_URL_PAYLOAD = {
 ### HELPER FUNCTIONS ###
 
 
-def date_to_bidmonth(d):
-    # Returns the bid month associated with a datetime.date
-    for bid_month, bid_month_dates in BID_MONTHS_DT.items():
-        if (d >= bid_month_dates[0]) and (d <= bid_month_dates[1]):
-            return bid_month
-    return None
-
-
 def skey_from_user():
     """Prompts user to input CCS URL and extracts the SKEY
 